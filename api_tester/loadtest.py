@@ -0,0 +1,336 @@
+"""
+Load generator for the webserver.
+
+Each virtual user opens a chat with `/chat/new`, asks a few questions on it with
+`/agent/invoke` (or `/agent/stream`), then starts a new chat, until its share of the
+requests is done. The questions are replayed from a CSV file with a `question`
+column, or a JSONL file with a `question`, `message` or `title` field per line.
+
+The latency percentiles, throughput and error rates of each endpoint are written to
+a JSON file, which can be compared with the one of a previous run:
+
+    python api_tester/loadtest.py --users 20 --requests 200 --output results.json
+    python api_tester/loadtest.py --users 20 --requests 200 --compare results.json
+
+See the README for running the webserver offline, with the stub LLM and the
+in-process vector store.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import statistics
+import time
+from collections import defaultdict
+from datetime import datetime
+from itertools import cycle
+from pathlib import Path
+from uuid import uuid4
+
+import httpx
+
+from plum_chatbot.utils.git import git_commit
+
+DEFAULT_QUESTIONS = Path(__file__).parents[1] / "evaluation" / "data" / "golden_set.csv"
+
+
+def load_questions(path: Path) -> list[str]:
+    """
+    Read the questions of a CSV file (`question` column) or of a JSONL file
+    (`question`, `message` or `title` field).
+    """
+    if path.suffix == ".jsonl":
+        questions = []
+        for line in path.read_text(encoding="utf-8").splitlines():
+            if line.strip():
+                record = json.loads(line)
+                questions.append(
+                    record.get("question") or record.get("message") or record["title"]
+                )
+    else:
+        with path.open(encoding="utf-8", newline="") as f:
+            questions = [row["question"] for row in csv.DictReader(f)]
+    if not questions:
+        raise ValueError(f"No questions in {path}")
+    return questions
+
+
+def percentile(values: list[float], q: float) -> float:
+    """
+    Percentile of the values, with linear interpolation between the closest ranks.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def latency_stats(latencies_ms: list[float]) -> dict[str, float]:
+    return {
+        "mean": statistics.fmean(latencies_ms) if latencies_ms else 0.0,
+        "p50": percentile(latencies_ms, 50),
+        "p95": percentile(latencies_ms, 95),
+        "p99": percentile(latencies_ms, 99),
+        "max": max(latencies_ms, default=0.0),
+    }
+
+
+class RequestRecorder:
+    """
+    Requests to the API, with their latencies and errors recorded by endpoint.
+    """
+
+    def __init__(self, base_url: str, timeout: float, stream: bool = False):
+        """
+        :param base_url: Base URL of the API.
+        :param timeout: Request timeout, in seconds.
+        :param stream: Whether the agent requests are streamed.
+        """
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.stream = stream
+        # Latencies in seconds and errors, by endpoint
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def _request(
+        self, client: httpx.AsyncClient, endpoint: str, path: str, body: dict
+    ) -> dict | None:
+        start = time.perf_counter()
+        try:
+            # The body is read whole: the latency of a stream is the time to its end
+            response = await client.post(path, json=body)
+            if response.status_code != 200:
+                self.errors[endpoint][f"http_{response.status_code}"] += 1
+                return None
+            if self.stream and endpoint == "agent":
+                payload = None
+                for line in response.text.splitlines():
+                    if line.startswith("data: {"):
+                        event = json.loads(line.removeprefix("data: "))
+                        if event["type"] == "error":
+                            raise RuntimeError(event["content"])
+                        payload = event["content"]
+            else:
+                payload = response.json()
+        except Exception as e:
+            self.errors[endpoint][type(e).__name__] += 1
+            return None
+        self.latencies[endpoint].append(time.perf_counter() - start)
+        return payload
+
+    def summary(self, duration: float) -> dict:
+        endpoints = {}
+        for endpoint in sorted(set(self.latencies) | set(self.errors)):
+            latencies = [latency * 1000 for latency in self.latencies[endpoint]]
+            errors = sum(self.errors[endpoint].values())
+            total = len(latencies) + errors
+            endpoints[endpoint] = {
+                "requests": total,
+                "errors": dict(self.errors[endpoint]),
+                "error_rate": errors / total if total else 0.0,
+                "throughput_rps": len(latencies) / duration if duration else 0.0,
+                "latency_ms": latency_stats(latencies),
+            }
+        return {"duration_s": duration, "endpoints": endpoints}
+
+
+class LoadTest(RequestRecorder):
+    """
+    Virtual users sharing a request budget and an HTTP connection pool.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        questions: list[str],
+        users: int,
+        requests: int,
+        turns: int,
+        agent: str | None,
+        stream: bool,
+        think_time: float,
+        timeout: float,
+    ):
+        super().__init__(base_url, timeout, stream)
+        self.questions = cycle(questions)
+        self.users = users
+        self.turns = turns
+        self.agent = agent
+        self.think_time = think_time
+        # Remaining questions to ask, shared by all the users
+        self.remaining = requests
+
+    @property
+    def _agent_path(self) -> str:
+        prefix = f"/agent/{self.agent}" if self.agent else "/agent"
+        return f"{prefix}/stream" if self.stream else f"{prefix}/invoke"
+
+    def _take(self) -> bool:
+        if self.remaining <= 0:
+            return False
+        self.remaining -= 1
+        return True
+
+    async def _user(self, client: httpx.AsyncClient):
+        user_id = str(uuid4())
+        chat_id, asked = None, 0
+        while self._take():
+            if chat_id is None or asked == self.turns:
+                chat = await self._request(
+                    client, "chat_new", "/chat/new", {"user_id": user_id}
+                )
+                if chat is None:
+                    # The question is lost: the run ends even if no chat can be created
+                    await asyncio.sleep(max(self.think_time, 0.1))
+                    continue
+                chat_id, asked = chat["chat_id"], 0
+            await self._request(
+                client,
+                "agent",
+                self._agent_path,
+                {
+                    "message": next(self.questions),
+                    "chat_id": chat_id,
+                    "user_id": user_id,
+                },
+            )
+            asked += 1
+            if self.think_time:
+                await asyncio.sleep(self.think_time)
+
+    async def run(self) -> dict:
+        limits = httpx.Limits(
+            max_connections=self.users, max_keepalive_connections=self.users
+        )
+        async with httpx.AsyncClient(
+            base_url=self.base_url, timeout=self.timeout, limits=limits
+        ) as client:
+            start = time.perf_counter()
+            await asyncio.gather(*(self._user(client) for _ in range(self.users)))
+            duration = time.perf_counter() - start
+        return self.summary(duration)
+
+
+def compare(current: dict, baseline: dict) -> list[str]:
+    """
+    Lines comparing the latency percentiles, throughput and error rate of each endpoint.
+    """
+    lines = [
+        f"Compared with {baseline.get('commit') or '?'} ({baseline.get('timestamp', '?')})"
+    ]
+    for endpoint, stats in current["endpoints"].items():
+        base = baseline["endpoints"].get(endpoint)
+        if base is None:
+            lines.append(f"{endpoint}: not in the baseline")
+            continue
+        lines.append(f"{endpoint}:")
+        for key in ("p50", "p95", "p99"):
+            now, before = stats["latency_ms"][key], base["latency_ms"][key]
+            change = (now - before) / before * 100 if before else 0.0
+            lines.append(f"  {key:>4}: {before:9.1f} -> {now:9.1f} ms ({change:+.1f}%)")
+        lines.append(
+            f"  rps : {base['throughput_rps']:9.2f} -> {stats['throughput_rps']:9.2f}"
+        )
+        lines.append(f"  errs: {base['error_rate']:9.2%} -> {stats['error_rate']:9.2%}")
+    return lines
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Load test the PLUM chatbot webserver."
+    )
+    parser.add_argument(
+        "--url", default="http://localhost:8000/api", help="Base URL of the API."
+    )
+    parser.add_argument(
+        "--questions",
+        type=Path,
+        default=DEFAULT_QUESTIONS,
+        help="CSV (question column) or JSONL file of the questions to replay.",
+    )
+    parser.add_argument(
+        "--users", type=int, default=10, help="Concurrent virtual users."
+    )
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=100,
+        help="Total questions asked, by all the users.",
+    )
+    parser.add_argument(
+        "--turns", type=int, default=1, help="Questions asked per chat."
+    )
+    parser.add_argument(
+        "--agent", default=None, help="Agent id, the default agent if unset."
+    )
+    parser.add_argument("--stream", action="store_true", help="Use /agent/stream.")
+    parser.add_argument(
+        "--think-time",
+        type=float,
+        default=0.0,
+        help="Seconds between two questions of a user.",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=120.0, help="Request timeout, in seconds."
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="JSON file the results are written to.",
+    )
+    parser.add_argument(
+        "--compare", type=Path, default=None, help="JSON results of a previous run."
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    load_test = LoadTest(
+        base_url=args.url,
+        questions=load_questions(args.questions),
+        users=args.users,
+        requests=args.requests,
+        turns=args.turns,
+        agent=args.agent,
+        stream=args.stream,
+        think_time=args.think_time,
+        timeout=args.timeout,
+    )
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "users": args.users,
+            "requests": args.requests,
+            "turns": args.turns,
+            "agent": args.agent,
+            "stream": args.stream,
+            "questions": str(args.questions),
+        },
+        **asyncio.run(load_test.run()),
+    }
+
+    for endpoint, stats in results["endpoints"].items():
+        latency = stats["latency_ms"]
+        print(
+            f"{endpoint}: {stats['requests']} requests, {stats['error_rate']:.2%} errors, "
+            f"{stats['throughput_rps']:.2f} rps, p50 {latency['p50']:.1f} ms, "
+            f"p95 {latency['p95']:.1f} ms, p99 {latency['p99']:.1f} ms"
+        )
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        print("\n".join(compare(results, baseline)))
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
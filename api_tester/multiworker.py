@@ -0,0 +1,287 @@
+"""
+Check that a chat can be served by several webserver workers.
+
+The webserver is started with `--workers 2` (or `--workers N`), with the environment of
+this script, and a few chats are run concurrently, each of their turns on a new
+connection, so that the turns of a chat land on different workers, as told by the
+`X-Worker-Pid` header of the answers. The test fails if a request fails, or if an answer
+does not continue its chat: the answer must come from the same thread, and the latest
+checkpoint of the thread in Postgres must hold every question of the chat. A worker
+answering from an outdated state would have saved a checkpoint missing the turns it
+did not see.
+
+It needs the state the workers share, e.g. with Postgres running:
+
+    CHECKPOINTER_BACKEND=postgres SHARED_STORE_URL=sqlite:///logs/shared_state.db \\
+    FAQ_AGENT_MODEL=stub HISTORY_SUMMARY_MODEL=stub ENCODER_BACKEND=hash \\
+    VECTOR_BACKEND=memory VECTOR_SEED_DIR=data/extractions \\
+    python api_tester/multiworker.py --workers 2
+
+With `--url`, the chats are run against a webserver already started instead, with the
+checkpointer of `CHECKPOINTER_POSTGRES_URL`. `tests/test_multiworker.py` runs this
+check under pytest.
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from uuid import uuid4
+
+import httpx
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from loadtest import DEFAULT_QUESTIONS, load_questions
+
+from plum_chatbot.configs.settings import Settings
+
+ROOT = Path(__file__).parents[1]
+WORKER_PID_HEADER = "x-worker-pid"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "WORKERS": str(workers),
+        # As set by the entrypoint, for the metrics of the workers
+        "PROMETHEUS_MULTIPROC_DIR": tempfile.mkdtemp(prefix="plum-metrics-"),
+    }
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "plum_chatbot.webserver.webserver:app",
+            "--app-dir",
+            str(ROOT / "src"),
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+        ],
+        cwd=ROOT,
+        env=env,
+    )
+
+
+async def wait_ready(base_url: str, timeout: float, server: subprocess.Popen | None):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url, timeout=5) as client:
+        while time.monotonic() < deadline:
+            if server is not None and server.poll() is not None:
+                raise RuntimeError(
+                    f"The webserver exited with code {server.returncode}"
+                )
+            try:
+                if (await client.get("/plum_chatbot/ready")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(1)
+    raise TimeoutError(f"The webserver was not ready after {timeout:.0f} s")
+
+
+class MultiWorkerCheck:
+    """
+    Chats run concurrently, one turn at a time, on connections which are never reused.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        questions: list[str],
+        chats: int,
+        turns: int,
+        agent: str | None,
+        timeout: float,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.questions = questions
+        self.chats = chats
+        self.turns = turns
+        self.agent = agent
+        self.timeout = timeout
+        self.failures: list[str] = []
+        # Workers which answered each chat, and the questions it was answered
+        self.workers: dict[str, set[str]] = defaultdict(set)
+        self.answered: dict[str, int] = {}
+
+    @property
+    def _agent_path(self) -> str:
+        return f"/agent/{self.agent}/invoke" if self.agent else "/agent/invoke"
+
+    async def _post(self, path: str, body: dict) -> tuple[dict, str | None]:
+        """
+        :return: The answer, and the pid of the worker which served it.
+        """
+        # A new connection per request: the kernel picks the worker accepting it
+        async with httpx.AsyncClient(
+            base_url=self.base_url, timeout=self.timeout
+        ) as client:
+            response = await client.post(path, json=body)
+        response.raise_for_status()
+        return response.json(), response.headers.get(WORKER_PID_HEADER)
+
+    async def _chat(self, index: int):
+        user_id = str(uuid4())
+        try:
+            chat, _ = await self._post("/chat/new", {"user_id": user_id})
+        except Exception as e:
+            self.failures.append(f"chat {index}: /chat/new failed: {e!r}")
+            return
+        chat_id = chat["chat_id"]
+        self.answered[chat_id] = 0
+        for turn in range(1, self.turns + 1):
+            question = self.questions[(index * self.turns + turn) % len(self.questions)]
+            try:
+                answer, pid = await self._post(
+                    self._agent_path,
+                    {"message": question, "chat_id": chat_id, "user_id": user_id},
+                )
+            except Exception as e:
+                self.failures.append(f"chat {index} turn {turn}: {e!r}")
+                return
+            self.answered[chat_id] = turn
+            if answer.get("thread_id") != chat_id:
+                self.failures.append(
+                    f"chat {index} turn {turn}: answered on thread {answer.get('thread_id')}"
+                )
+            if pid is not None:
+                self.workers[chat_id].add(pid)
+
+    async def check_history(self, postgres_url: str):
+        """
+        Check that the latest checkpoint of each chat holds every question answered.
+
+        :param postgres_url: The database of the checkpointer of the webserver.
+        """
+        async with AsyncPostgresSaver.from_conn_string(postgres_url) as saver:
+            for chat_id, answered in self.answered.items():
+                checkpoint = await saver.aget_tuple(
+                    {"configurable": {"thread_id": chat_id}}
+                )
+                messages = (
+                    checkpoint.checkpoint["channel_values"].get("messages", [])
+                    if checkpoint is not None
+                    else []
+                )
+                questions = sum(
+                    isinstance(message, HumanMessage) for message in messages
+                )
+                if questions != answered:
+                    self.failures.append(
+                        f"chat {chat_id}: {questions} questions checkpointed, "
+                        f"{answered} answered"
+                    )
+
+    async def run(self, postgres_url: str) -> bool:
+        """
+        :param postgres_url: The database of the checkpointer of the webserver.
+        """
+        await asyncio.gather(*(self._chat(index) for index in range(self.chats)))
+        await self.check_history(postgres_url)
+        answered_by = set().union(*self.workers.values())
+        spanning = sum(len(pids) > 1 for pids in self.workers.values())
+        print(
+            f"{self.chats} chats of {self.turns} turns: {len(self.failures)} failures, "
+            f"{len(answered_by)} workers answered, {spanning} chats spanned several workers"
+        )
+        for failure in self.failures:
+            print(f"FAIL {failure}")
+        if not self.workers:
+            print(
+                f"FAIL no {WORKER_PID_HEADER} header, is the webserver run with WORKERS > 1?"
+            )
+            return False
+        if not spanning:
+            print("FAIL no chat was served by several workers, run more chats or turns")
+            return False
+        return not self.failures
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Run chats across several workers of the PLUM chatbot webserver."
+    )
+    parser.add_argument(
+        "--url",
+        default=None,
+        help="Base URL of a running webserver, e.g. http://localhost:8000/api. "
+        "By default a webserver is started with --workers.",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=2, help="Workers of the webserver started."
+    )
+    parser.add_argument("--chats", type=int, default=4, help="Concurrent chats.")
+    parser.add_argument(
+        "--turns",
+        type=int,
+        default=6,
+        help="Questions per chat, at most HISTORY_KEEP_TURNS + HISTORY_SUMMARIZE_EVERY - 1 "
+        "for the checkpointed questions to be checked: the older ones are summarized.",
+    )
+    parser.add_argument(
+        "--questions",
+        type=Path,
+        default=DEFAULT_QUESTIONS,
+        help="CSV file with a `question` column, or JSONL file.",
+    )
+    parser.add_argument(
+        "--agent", default=None, help="Agent to invoke, the default agent if omitted."
+    )
+    parser.add_argument(
+        "--startup-timeout",
+        type=float,
+        default=180.0,
+        help="Seconds to wait for the webserver to be ready.",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=120.0, help="Request timeout, in seconds."
+    )
+    return parser.parse_args()
+
+
+async def run(args: argparse.Namespace) -> bool:
+    server = None
+    base_url = args.url
+    if base_url is None:
+        port = free_port()
+        server = start_server(args.workers, port)
+        base_url = f"http://127.0.0.1:{port}/api"
+    try:
+        await wait_ready(base_url, args.startup_timeout, server)
+        check = MultiWorkerCheck(
+            base_url=base_url,
+            questions=load_questions(args.questions),
+            chats=args.chats,
+            turns=args.turns,
+            agent=args.agent,
+            timeout=args.timeout,
+        )
+        return await check.run(Settings().CHECKPOINTER_POSTGRES_URL)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+
+def main():
+    sys.exit(0 if asyncio.run(run(parse_args())) else 1)
+
+
+if __name__ == "__main__":
+    main()
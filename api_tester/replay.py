@@ -0,0 +1,220 @@
+"""
+Replay a workload recorded by the webserver request log (`REQUEST_LOG_PATH`).
+
+Each recorded chat is recreated with `/chat/new`, then its questions are asked again on
+`/agent/{agent}/invoke`, in order, at the pace they were recorded at: `--speed 2`
+replays twice as fast, `--speed 0` as fast as possible. The questions of a chat wait
+for the previous answer, as the user did.
+
+The latency distribution of the replay is written to a JSON file, next to the one of
+the recording, and can be compared with a replay against another build:
+
+    python api_tester/replay.py logs/requests.jsonl --speed 4 --output v1.json
+    python api_tester/replay.py logs/requests.jsonl --speed 4 --compare v1.json
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from uuid import uuid4
+
+import httpx
+from loadtest import RequestRecorder, compare, latency_stats
+
+from plum_chatbot.utils.git import git_commit
+
+
+def load_records(paths: list[Path], include_errors: bool = False) -> list[dict]:
+    """
+    Read the `/agent/invoke` records of request log files, rotated ones included,
+    in the order they were recorded.
+    """
+    records = []
+    for path in paths:
+        for line in path.read_text(encoding="utf-8").splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record["endpoint"] == "invoke" and (
+                include_errors or record["status"] == 200
+            ):
+                records.append(record)
+    if not records:
+        raise ValueError(f"No request to replay in {', '.join(map(str, paths))}")
+    return sorted(records, key=lambda record: record["ts"])
+
+
+class Replay(RequestRecorder):
+    """
+    The recorded chats replayed concurrently, each one sequentially, on a schedule
+    derived from the recorded timestamps.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        records: list[dict],
+        speed: float,
+        max_connections: int,
+        timeout: float,
+    ):
+        super().__init__(base_url, timeout)
+        self.records = records
+        self.speed = speed
+        self.max_connections = max_connections
+        # How late the questions were sent compared to the schedule, in seconds
+        self.lags: list[float] = []
+
+    def _offset(self, record: dict) -> float:
+        if self.speed <= 0:
+            return 0.0
+        return (record["ts"] - self.records[0]["ts"]) / self.speed
+
+    async def _chat(self, client: httpx.AsyncClient, records: list[dict], start: float):
+        await asyncio.sleep(
+            max(self._offset(records[0]) - (time.perf_counter() - start), 0)
+        )
+        user_id = records[0].get("user_id") or str(uuid4())
+        chat = await self._request(
+            client, "chat_new", "/chat/new", {"user_id": user_id}
+        )
+        if chat is None:
+            return
+        for record in records:
+            delay = self._offset(record) - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif self.speed > 0:
+                self.lags.append(-delay)
+            await self._request(
+                client,
+                "agent",
+                f"/agent/{record['agent']}/invoke",
+                {
+                    "message": record["message"],
+                    "chat_id": chat["chat_id"],
+                    "user_id": user_id,
+                },
+            )
+
+    async def run(self) -> dict:
+        chats: dict[str, list[dict]] = defaultdict(list)
+        for record in self.records:
+            chats[record.get("chat_id") or str(uuid4())].append(record)
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+        )
+        async with httpx.AsyncClient(
+            base_url=self.base_url, timeout=self.timeout, limits=limits
+        ) as client:
+            start = time.perf_counter()
+            await asyncio.gather(
+                *(self._chat(client, records, start) for records in chats.values())
+            )
+            duration = time.perf_counter() - start
+        return {
+            **self.summary(duration),
+            "chats": len(chats),
+            "schedule_lag_ms": latency_stats([lag * 1000 for lag in self.lags]),
+        }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Replay a request log against the PLUM chatbot webserver."
+    )
+    parser.add_argument(
+        "logs", type=Path, nargs="+", help="Request log files, rotated ones included."
+    )
+    parser.add_argument(
+        "--url", default="http://localhost:8000/api", help="Base URL of the API."
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Pace of the replay relative to the recording, 0 for as fast as possible.",
+    )
+    parser.add_argument(
+        "--limit", type=int, default=None, help="Replay only the first N requests."
+    )
+    parser.add_argument(
+        "--include-errors",
+        action="store_true",
+        help="Also replay the requests that failed when recorded.",
+    )
+    parser.add_argument(
+        "--max-connections", type=int, default=100, help="HTTP connection pool size."
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=120.0, help="Request timeout, in seconds."
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="JSON file the results are written to.",
+    )
+    parser.add_argument(
+        "--compare", type=Path, default=None, help="JSON results of a previous replay."
+    )
+    args = parser.parse_args()
+    if args.limit is not None and args.limit < 1:
+        parser.error("--limit must be at least 1")
+    return args
+
+
+def main():
+    args = parse_args()
+    records = load_records(args.logs, args.include_errors)[: args.limit]
+    replay = Replay(
+        base_url=args.url,
+        records=records,
+        speed=args.speed,
+        max_connections=args.max_connections,
+        timeout=args.timeout,
+    )
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "logs": [str(path) for path in args.logs],
+            "requests": len(records),
+            "speed": args.speed,
+        },
+        "recorded": {
+            "duration_s": records[-1]["ts"] - records[0]["ts"],
+            "latency_ms": latency_stats([record["duration_ms"] for record in records]),
+        },
+        **asyncio.run(replay.run()),
+    }
+
+    recorded = results["recorded"]["latency_ms"]
+    print(
+        f"recorded: {len(records)} requests in {results['recorded']['duration_s']:.1f} s, "
+        f"p50 {recorded['p50']:.1f} ms, p95 {recorded['p95']:.1f} ms, "
+        f"p99 {recorded['p99']:.1f} ms"
+    )
+    for endpoint, stats in results["endpoints"].items():
+        latency = stats["latency_ms"]
+        print(
+            f"{endpoint}: {stats['requests']} requests, {stats['error_rate']:.2%} errors, "
+            f"{stats['throughput_rps']:.2f} rps, p50 {latency['p50']:.1f} ms, "
+            f"p95 {latency['p95']:.1f} ms, p99 {latency['p99']:.1f} ms"
+        )
+    print(f"schedule lag: p95 {results['schedule_lag_ms']['p95']:.1f} ms")
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        print("\n".join(compare(results, baseline)))
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,19 @@ set -e
 
 . ./.venv/bin/activate
 
+WORKERS="${WORKERS:-1}"
+if [ "$WORKERS" -gt 1 ]; then
+    # Metrics of the workers, aggregated by /metrics, from a clean directory
+    export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/plum-metrics}"
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
 if [ "$RUN_MODE" = "dev" ]; then
     echo "RUN_MODE=dev → doing nothing, keeping container alive..."
     fastapi dev src/plum_chatbot/webserver/webserver.py --app app --host 0.0.0.0 --port 8000
     exec tail -f /dev/null
 else
-    echo "RUN_MODE=$RUN_MODE → starting fastapi..."
-    exec fastapi run src/plum_chatbot/webserver/webserver.py --app app --host 0.0.0.0 --port 8000
+    echo "RUN_MODE=$RUN_MODE → starting fastapi with $WORKERS worker(s)..."
+    exec fastapi run src/plum_chatbot/webserver/webserver.py --app app --host 0.0.0.0 --port 8000 --workers "$WORKERS"
 fi
@@ -1,74 +1,98 @@
+from collections.abc import AsyncGenerator
 from typing import Any
 from uuid import UUID, uuid4
 
+import numpy as np
 from fastapi import HTTPException
 from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.runnables import RunnableConfig
 from langgraph.pregel import Pregel
 from langgraph.types import Command
 
-from plum_chatbot.agents.faq_agent import FaqAgent
-from plum_chatbot.schemas.schema import Agent, AgentInfo, ChatMessage, UserInput
-from plum_chatbot.utils.utils import langchain_to_chat_message, process_output
+from plum_chatbot.agents.callbacks import (
+    RequestLogCallbackHandler,
+    TracingCallbackHandler,
+    metrics_callback,
+)
+from plum_chatbot.agents.history import SUMMARY_MESSAGE_ID
+from plum_chatbot.agents.registry import AgentRegistry
+from plum_chatbot.agents.thread_status import ThreadStatus
+from plum_chatbot.configs.logger import bind_thread_id
+from plum_chatbot.configs.metrics import AGENT_RUNS_IN_FLIGHT
+from plum_chatbot.configs.request_log import request_log
+from plum_chatbot.configs.tracing import Span, tracer
+from plum_chatbot.di_containers.datasources_containers import (
+    get_answer_cache,
+    get_qdrant_datasource,
+    get_thread_status,
+)
+from plum_chatbot.schemas.schema import (
+    Agent,
+    AgentInfo,
+    ChatMessage,
+    StreamInput,
+    UserInput,
+)
+from plum_chatbot.utils.utils import (
+    convert_message_content_to_string,
+    langchain_to_chat_message,
+    process_output,
+)
 
 DEFAULT_AGENT = "faq"
 
 
-agents: dict[str, Agent] = {
-    # "chatbot": Agent(description="A simple chatbot.", graph=rag_agent),
-    # "rag": RagAgent(
-    #     name="rag_agent",
-    #     description="A RAG agent that retrieves information from a vector database.",
-    # )
-    "faq": FaqAgent(
+def _faq_agent() -> Agent:
+    # Imported lazily: building the agent initializes the LLM client
+    from plum_chatbot.agents.faq_agent import FaqAgent
+
+    return FaqAgent(
         name="faq_agent",
         description="A FAQ agent that answers frequently asked questions about the Plum portal.",
     )
-    
-    # "research-assistant": Agent(
-    #     description="A research assistant with web search and calculator.",
-    #     graph=research_assistant,
-    # ),
-    # "rag-assistant": Agent(
-    #     description="A RAG assistant with access to information in a database.",
-    #     graph=rag_assistant,
-    # ),
-    # "command-agent": Agent(description="A command agent.", graph=command_agent),
-    # "bg-task-agent": Agent(description="A background task agent.", graph=bg_task_agent),
-    # "langgraph-supervisor-agent": Agent(
-    #     description="A langgraph supervisor agent", graph=langgraph_supervisor_agent
-    # ),
-    # "interrupt-agent": Agent(
-    #     description="An agent the uses interrupts.", graph=interrupt_agent
-    # ),
-    # "knowledge-base-agent": Agent(
-    #     description="A retrieval-augmented generation agent using Amazon Bedrock Knowledge Base",
-    #     graph=kb_agent,
-    # ),
-}
+
+
+agents = AgentRegistry()
+# agents.register("chatbot", "A simple chatbot.", lambda: Agent(graph=rag_agent))
+# agents.register(
+#     "rag",
+#     "A RAG agent that retrieves information from a vector database.",
+#     lambda: RagAgent(name="rag_agent"),
+# )
+agents.register(
+    "faq",
+    "A FAQ agent that answers frequently asked questions about the Plum portal.",
+    _faq_agent,
+)
 
 
 def get_agent(agent_id: str) -> Pregel:
-    return agents[agent_id].graph
+    return agents.get(agent_id).graph
+
+
+async def aget_agent(agent_id: str) -> Pregel:
+    return (await agents.aget(agent_id)).graph
 
 
 def get_all_agent_info() -> list[AgentInfo]:
-    return [
-        AgentInfo(key=agent_id, description=agent.description)
-        for agent_id, agent in agents.items()
-    ]
+    return agents.info()
 
 
 async def _handle_input(
-    user_input: UserInput, agent: Pregel
-) -> tuple[dict[str, Any], str, str]:
+    user_input: UserInput, agent: Agent
+) -> tuple[dict[str, Any], str, str, bool | None]:
     """
     Parse user input and handle any required interrupt resumption.
-    Returns kwargs for agent invocation and the run_id.
+    Returns kwargs for agent invocation, the run_id, the thread_id and whether
+    the thread has no prior messages, None if unknown.
+
+    The thread status comes from the thread status registry: the thread state is only
+    loaded for the agents using interrupts, when the thread is unknown to the registry.
     """
     run_id: UUID = uuid4()
     thread_id: str = user_input.chat_id or str(uuid4())
     user_id: str = user_input.user_id or str(uuid4())
+    bind_thread_id(thread_id)
 
     configurable = {
         "thread_id": thread_id,
@@ -89,14 +113,20 @@ async def _handle_input(
         run_id=run_id,
     )
 
-    # Check for interrupts that need to be resumed
-    state = await agent.aget_state(config=config)
-    interrupted_tasks = [
-        task for task in state.tasks if hasattr(task, "interrupts") and task.interrupts
-    ]
+    thread_status = get_thread_status()
+    status = await thread_status.aget(thread_id)
+    if status is None and agent.uses_interrupts:
+        # Check for interrupts that need to be resumed
+        with tracer.start_as_current_span("thread.get_state"):
+            state = await agent.graph.aget_state(config=config)
+        status = ThreadStatus(
+            started=bool(state.values.get("messages")),
+            interrupted=any(getattr(task, "interrupts", None) for task in state.tasks),
+        )
+        await thread_status.aset(thread_id, status.started, status.interrupted)
 
     input: Command | dict[str, Any]
-    if interrupted_tasks:
+    if status is not None and status.interrupted:
         # assume user input is response to resume agent execution from interrupt
         input = Command(resume=user_input.message)
     else:
@@ -106,18 +136,143 @@ async def _handle_input(
         "input": input,
         "config": config,
     }
+    is_new_thread = None if status is None else not status.started
+
+    return kwargs, str(run_id), thread_id, is_new_thread
+
+
+def _is_first_turn(state: dict[str, Any]) -> bool:
+    """
+    Whether a final thread state holds a single question and its answer. A state whose
+    older turns were summarized may keep a single question, after the summary.
+    """
+    messages = state["messages"]
+    questions = sum(isinstance(message, HumanMessage) for message in messages)
+    summarized = any(message.id == SUMMARY_MESSAGE_ID for message in messages)
+    return questions == 1 and not summarized
+
 
-    return kwargs, str(run_id), thread_id
+def _run_config(config: RunnableConfig, span: Span) -> RunnableConfig:
+    """
+    Record the metrics of the LLM calls of the run, and trace its nodes, tools and
+    LLM calls below the given span. When the request is logged, its token usage and
+    retrieved documents are added to its record.
+    """
+    callbacks: list = [metrics_callback]
+    if span.is_recording:
+        callbacks.append(TracingCallbackHandler(span))
+    if (record := request_log.current()) is not None:
+        callbacks.append(RequestLogCallbackHandler(record))
+    return {**config, "callbacks": callbacks}
+
+
+async def _record_run_end(thread_id: str, interrupted: bool):
+    if interrupted:
+        await get_thread_status().amark_interrupted(thread_id)
+    else:
+        await get_thread_status().amark_completed(thread_id)
+
+
+async def _cached_answer(
+    user_input: UserInput,
+    agent_id: str,
+    agent: Pregel,
+    config: RunnableConfig,
+    embedding: np.ndarray,
+    is_new_thread: bool | None,
+) -> ChatMessage | None:
+    """
+    Look up a cached answer for the question and, on a hit, record the exchange
+    in the thread state so that follow-up questions keep their context.
+    For a thread unknown to the registry, the thread state is only loaded on a hit,
+    to check that the thread is actually new.
+    """
+    cached = await get_answer_cache().alookup(agent_id, user_input.message, embedding)
+    if cached is None:
+        return None
+    thread_id = config["configurable"]["thread_id"]
+    if is_new_thread is None:
+        with tracer.start_as_current_span("thread.get_state"):
+            state = await agent.aget_state(config=config)
+        if state.values.get("messages"):
+            await get_thread_status().amark_completed(thread_id)
+            return None
+    output, similarity = cached
+    await agent.aupdate_state(
+        config,
+        {
+            "messages": [
+                HumanMessage(content=user_input.message),
+                AIMessage(content=output.content),
+            ]
+        },
+        as_node="agent",
+    )
+    await get_thread_status().amark_completed(thread_id)
+    output.response_metadata = {
+        **output.response_metadata,
+        "answer_cache": {"hit": True, "similarity": similarity},
+    }
+    return output
+
+
+async def _try_answer_cache(
+    user_input: UserInput,
+    agent_id: str,
+    agent: Pregel,
+    config: RunnableConfig,
+    is_new_thread: bool | None,
+) -> tuple[np.ndarray | None, ChatMessage | None]:
+    """
+    Returns the embedding of the question, if it may be cacheable, and the cached answer,
+    if any. Only questions opening a thread are context-free, and thus cacheable: for
+    threads of unknown status, the answer is only stored if the run turns out to be the
+    first turn of the thread.
+    """
+    answer_cache = get_answer_cache()
+    if not answer_cache.enabled or is_new_thread is False:
+        return None, None
+    # The cache is optional: a failed version check skips it rather than the request
+    if not await answer_cache.sync_version(get_qdrant_datasource().acollection_version):
+        return None, None
+    with tracer.start_as_current_span("answer_cache.lookup") as span:
+        embedding = await get_qdrant_datasource().aembed_query(user_input.message)
+        output = await _cached_answer(
+            user_input, agent_id, agent, config, embedding, is_new_thread
+        )
+        span.set_attribute("answer_cache.hit", output is not None)
+    if output is not None and (record := request_log.current()) is not None:
+        record.cached = True
+    return embedding, output
 
 
 async def invoke_chatbot(user_input: UserInput, agent_id: str) -> ChatMessage:
-    agent: Pregel = get_agent(agent_id)
-    kwargs, run_id, thread_id = await _handle_input(user_input, agent)
-    response_events: list[tuple[str, Any]] = await agent.ainvoke(**kwargs, stream_mode=["updates", "values"])  # type: ignore # fmt: skip
+    with tracer.start_as_current_span("agent.get", {"agent.id": agent_id}):
+        agent_entry: Agent = await agents.aget(agent_id)
+    agent: Pregel = agent_entry.graph
+    kwargs, run_id, thread_id, is_new_thread = await _handle_input(
+        user_input, agent_entry
+    )
+
+    embedding, output = await _try_answer_cache(
+        user_input, agent_id, agent, kwargs["config"], is_new_thread
+    )
+    if output is not None:
+        output.run_id = str(run_id)
+        output.thread_id = str(thread_id)
+        return output
+
+    with (
+        tracer.start_as_current_span("agent.run", {"agent.id": agent_id}) as span,
+        AGENT_RUNS_IN_FLIGHT.labels(agent_id).track_inprogress(),
+    ):
+        kwargs["config"] = _run_config(kwargs["config"], span)
+        response_events: list[tuple[str, Any]] = await agent.ainvoke(**kwargs, stream_mode=["updates", "values"])  # type: ignore # fmt: skip
     response_type, response = response_events[-1]
     if response_type == "values":
         # Normal response, the agent completed successfully
-        output = process_output(response)
+        with tracer.start_as_current_span("process_output"):
+            output = process_output(response)
     elif response_type == "updates" and "__interrupt__" in response:
         # The last thing to occur was an interrupt
         # Return the value of the first interrupt as an AIMessage
@@ -126,7 +281,104 @@ async def invoke_chatbot(user_input: UserInput, agent_id: str) -> ChatMessage:
         )
     else:
         raise ValueError(f"Unexpected response type: {response_type}")
+    await _record_run_end(thread_id, interrupted=response_type != "values")
+
+    if embedding is not None and response_type == "values" and _is_first_turn(response):
+        await get_answer_cache().astore(agent_id, user_input.message, embedding, output)
 
     output.run_id = str(run_id)
     output.thread_id = str(thread_id)
     return output
+
+
+async def stream_chatbot(
+    user_input: StreamInput, agent_id: str
+) -> AsyncGenerator[tuple[str, Any], None]:
+    """
+    Run an agent and yield its events as they happen:
+    - `("token", str)`: a token of the LLM answer, if `stream_tokens` is set;
+    - `("tool_start", dict)` / `("tool_end", dict)`: the boundaries of each tool call;
+    - `("message", ChatMessage)`: the final answer, always the last event.
+    """
+    with tracer.start_as_current_span("agent.get", {"agent.id": agent_id}):
+        agent_entry: Agent = await agents.aget(agent_id)
+    agent: Pregel = agent_entry.graph
+    kwargs, run_id, thread_id, is_new_thread = await _handle_input(
+        user_input, agent_entry
+    )
+
+    embedding, output = await _try_answer_cache(
+        user_input, agent_id, agent, kwargs["config"], is_new_thread
+    )
+    if output is not None:
+        output.run_id = str(run_id)
+        output.thread_id = str(thread_id)
+        yield "message", output
+        return
+
+    final_state: dict[str, Any] | None = None
+    with (
+        tracer.start_as_current_span("agent.run", {"agent.id": agent_id}) as span,
+        AGENT_RUNS_IN_FLIGHT.labels(agent_id).track_inprogress(),
+    ):
+        kwargs["config"] = _run_config(kwargs["config"], span)
+        async for event in agent.astream_events(**kwargs, version="v2"):
+            match event["event"]:
+                case "on_chat_model_stream" if user_input.stream_tokens:
+                    if "skip_stream" in event.get("tags", []):
+                        continue
+                    content = convert_message_content_to_string(
+                        event["data"]["chunk"].content
+                    )
+                    if content:
+                        yield "token", content
+                case "on_tool_start":
+                    yield (
+                        "tool_start",
+                        {
+                            "id": event["run_id"],
+                            "name": event["name"],
+                            "args": event["data"].get("input"),
+                        },
+                    )
+                case "on_tool_end":
+                    tool_output = event["data"].get("output")
+                    yield (
+                        "tool_end",
+                        {
+                            "id": event["run_id"],
+                            "name": event["name"],
+                            "content": convert_message_content_to_string(
+                                getattr(tool_output, "content", str(tool_output))
+                            ),
+                            # Tokens and documents sent, for the retrieval tools
+                            "artifact": getattr(tool_output, "artifact", None),
+                        },
+                    )
+                case "on_chain_end" if not event.get("parent_ids"):
+                    # End of the root run: its output is the final graph state
+                    final_state = event["data"].get("output")
+
+    if isinstance(final_state, dict) and final_state.get("messages"):
+        with tracer.start_as_current_span("process_output"):
+            output = process_output(final_state)
+        await _record_run_end(thread_id, interrupted=False)
+        if embedding is not None and _is_first_turn(final_state):
+            await get_answer_cache().astore(
+                agent_id, user_input.message, embedding, output
+            )
+    else:
+        # The run stopped on an interrupt: return the value of the first one
+        with tracer.start_as_current_span("thread.get_state"):
+            state = await agent.aget_state(config=kwargs["config"])
+        interrupts = [
+            interrupt for task in state.tasks for interrupt in task.interrupts
+        ]
+        if not interrupts:
+            raise ValueError("The agent run ended without a final state.")
+        output = langchain_to_chat_message(AIMessage(content=interrupts[0].value))
+        await _record_run_end(thread_id, interrupted=True)
+
+    output.run_id = str(run_id)
+    output.thread_id = str(thread_id)
+    yield "message", output
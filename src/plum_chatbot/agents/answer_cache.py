@@ -0,0 +1,282 @@
+import bisect
+import hashlib
+import json
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from threading import Lock
+
+import numpy as np
+
+from plum_chatbot.datasources.shared_store import SharedStore
+from plum_chatbot.schemas.schema import ChatMessage
+
+# Upper bounds of the buckets of the best-similarity histogram
+SIMILARITY_BUCKETS: tuple[float, ...] = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.98, 1.0)
+
+
+class _AgentEntries:
+    """
+    Cached answers of one agent, with their normalized embeddings stacked in a matrix.
+    """
+
+    def __init__(self):
+        self.questions: list[str] = []
+        self.messages: list[ChatMessage] = []
+        self.created_at: list[float] = []
+        self.embeddings: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def append(self, question: str, embedding: np.ndarray, message: ChatMessage):
+        self.questions.append(question)
+        self.messages.append(message)
+        self.created_at.append(time.time())
+        row = embedding[np.newaxis, :]
+        self.embeddings = (
+            row if self.embeddings is None else np.vstack([self.embeddings, row])
+        )
+
+    def keep(self, mask: np.ndarray):
+        indices = np.flatnonzero(mask)
+        self.questions = [self.questions[i] for i in indices]
+        self.messages = [self.messages[i] for i in indices]
+        self.created_at = [self.created_at[i] for i in indices]
+        self.embeddings = self.embeddings[indices] if len(indices) else None
+
+
+class SemanticAnswerCache:
+    """
+    Cache of agent answers, keyed on the embedding of the question.
+
+    A new question is answered from the cache when its cosine similarity with a cached
+    question of the same agent is at least `threshold`. The cache is cleared whenever
+    the version of the vector collection changes, so a re-ingestion never serves
+    answers built on outdated documents.
+
+    The embeddings are searched in process memory. With a shared store, the answers
+    are also stored there, keyed on the exact (normalized) question and the collection
+    version, so that a question answered by one worker is a hit on the others.
+    """
+
+    enabled: bool
+    threshold: float
+    max_size: int
+    ttl_seconds: float
+    version_check_interval: float
+    collection_version: str | None
+    shared_store: SharedStore | None
+    hits: int
+    shared_hits: int
+    misses: int
+    invalidations: int
+    similarity_histogram: list[int]
+    logger: logging.Logger
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        threshold: float = 0.95,
+        max_size: int = 512,
+        ttl_seconds: float = 24 * 60 * 60,
+        version_check_interval: float = 60,
+        shared_store: SharedStore | None = None,
+    ):
+        """
+        Initialize the answer cache.
+
+        :param enabled: Whether the cache is used at all.
+        :param threshold: Minimum cosine similarity for a cache hit.
+        :param max_size: Maximum number of answers kept per agent.
+        :param ttl_seconds: Time to live of an answer, in seconds.
+        :param version_check_interval: Minimum delay between two checks of the collection version.
+        :param shared_store: The store shared by the workers, used if it is shared.
+        """
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.version_check_interval = version_check_interval
+        self.collection_version = None
+        self.shared_store = (
+            shared_store if shared_store is not None and shared_store.shared else None
+        )
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # One extra bucket for similarities above the last bound (rounding errors)
+        self.similarity_histogram = [0] * (len(SIMILARITY_BUCKETS) + 1)
+        self.logger = logging.getLogger(__name__)
+
+        self._entries: dict[str, _AgentEntries] = {}
+        self._lock = Lock()
+        self._last_version_check = 0.0
+        self._version_synced = False
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def lookup(
+        self, agent_id: str, embedding: np.ndarray
+    ) -> tuple[ChatMessage, float] | None:
+        """
+        Find the cached answer of the most similar question.
+
+        :param agent_id: The agent the question is addressed to.
+        :param embedding: The embedding of the question.
+        :return: A copy of the cached answer and its similarity, or None on a miss.
+        """
+        if not self.enabled:
+            return None
+        query = self._normalize(embedding)
+        with self._lock:
+            entries = self._entries.get(agent_id)
+            if entries is not None and len(entries):
+                entries.keep(
+                    time.time() - np.array(entries.created_at) <= self.ttl_seconds
+                )
+            if entries is None or not len(entries):
+                self.misses += 1
+                return None
+
+            similarities = entries.embeddings @ query
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            self.similarity_histogram[
+                bisect.bisect_left(SIMILARITY_BUCKETS, similarity)
+            ] += 1
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entries.messages[best].model_copy(deep=True), similarity
+
+    def store(
+        self, agent_id: str, question: str, embedding: np.ndarray, message: ChatMessage
+    ):
+        """
+        Cache the answer to a question.
+
+        :param agent_id: The agent which answered the question.
+        :param question: The question.
+        :param embedding: The embedding of the question.
+        :param message: The answer of the agent.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            entries = self._entries.setdefault(agent_id, _AgentEntries())
+            entries.append(
+                question, self._normalize(embedding), message.model_copy(deep=True)
+            )
+            if len(entries) > self.max_size:
+                mask = np.ones(len(entries), dtype=bool)
+                mask[: len(entries) - self.max_size] = False
+                entries.keep(mask)
+
+    def _shared_key(self, agent_id: str, question: str) -> str:
+        normalized = " ".join(question.lower().split())
+        digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        return f"answer:{self.collection_version}:{agent_id}:{digest}"
+
+    async def alookup(
+        self, agent_id: str, question: str, embedding: np.ndarray
+    ) -> tuple[ChatMessage, float] | None:
+        """
+        Find the cached answer of the most similar question in process memory, then
+        of the same question in the shared store. A shared hit is cached in memory.
+
+        :param agent_id: The agent the question is addressed to.
+        :param question: The question.
+        :param embedding: The embedding of the question.
+        :return: A copy of the cached answer and its similarity, or None on a miss.
+        """
+        cached = self.lookup(agent_id, embedding)
+        if cached is not None or self.shared_store is None:
+            return cached
+        value = await self.shared_store.get(self._shared_key(agent_id, question))
+        if value is None:
+            return None
+        # Validated when it was stored: the tool calls do not round-trip the validation
+        message = ChatMessage.model_construct(**json.loads(value))
+        with self._lock:
+            # Counted as a miss of the memory tier above
+            self.misses -= 1
+            self.shared_hits += 1
+        self.store(agent_id, question, embedding, message)
+        return message, 1.0
+
+    async def astore(
+        self, agent_id: str, question: str, embedding: np.ndarray, message: ChatMessage
+    ):
+        """
+        Cache the answer to a question, in process memory and in the shared store.
+        """
+        self.store(agent_id, question, embedding, message)
+        if self.enabled and self.shared_store is not None:
+            await self.shared_store.set(
+                self._shared_key(agent_id, question),
+                message.model_dump_json(),
+                self.ttl_seconds,
+            )
+
+    def invalidate(self):
+        """
+        Drop every cached answer.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+        self.logger.info("Answer cache invalidated.")
+
+    async def sync_version(self, get_version: Callable[[], Awaitable[str]]) -> bool:
+        """
+        Invalidate the cache if the version of the vector collection changed.
+        The version is fetched at most once every `version_check_interval` seconds.
+
+        :param get_version: Coroutine function returning the current collection version.
+        :return: Whether the version is known. If the last check failed, the cache must
+                 not be used until the next one: the cached answers may be outdated.
+        """
+        now = time.monotonic()
+        if now - self._last_version_check < self.version_check_interval:
+            return self._version_synced
+        self._last_version_check = now
+        try:
+            version = await get_version()
+        except Exception as e:
+            self.logger.warning(
+                "Collection version check failed (%s), answer cache skipped.", e
+            )
+            self._version_synced = False
+            return False
+        if self.collection_version is not None and version != self.collection_version:
+            self.invalidate()
+        self.collection_version = version
+        self._version_synced = True
+        return True
+
+    def stats(self) -> dict:
+        """
+        Hit rate and similarity distribution of the cache.
+        """
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            "size": sum(len(entries) for entries in self._entries.values()),
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "similarity_histogram": dict(
+                zip(
+                    [str(bound) for bound in SIMILARITY_BUCKETS] + ["+Inf"],
+                    self.similarity_histogram,
+                )
+            ),
+        }
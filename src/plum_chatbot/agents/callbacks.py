@@ -0,0 +1,221 @@
+import time
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from plum_chatbot.configs.metrics import LLM_CALL_DURATION, LLM_TOKENS
+from plum_chatbot.configs.request_log import RequestRecord
+from plum_chatbot.configs.tracing import Span
+
+
+def _usage(response: LLMResult) -> dict[str, int]:
+    """
+    Token usage of an LLM call, summed over its generations.
+    """
+    usage = {"input_tokens": 0, "output_tokens": 0}
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(
+                getattr(generation, "message", None), "usage_metadata", None
+            )
+            for key in usage:
+                usage[key] += (metadata or {}).get(key, 0)
+    return usage
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Open a span for each LangGraph node, tool call and LLM call of an agent run,
+    below the span of the run.
+    """
+
+    # Called in the event loop, the spans are timed where the run happens
+    run_inline = True
+
+    def __init__(self, root: Span):
+        """
+        :param root: The span the run is traced under.
+        """
+        self.root = root
+        self._spans: dict[UUID, Span] = {}
+        # Parents of all the runs, traced or not, to find the nearest traced ancestor
+        self._parents: dict[UUID, UUID | None] = {}
+
+    def _parent_span(self, parent_run_id: UUID | None) -> Span:
+        while parent_run_id is not None:
+            if (span := self._spans.get(parent_run_id)) is not None:
+                return span
+            parent_run_id = self._parents.get(parent_run_id)
+        return self.root
+
+    def _start(
+        self,
+        run_id: UUID,
+        parent_run_id: UUID | None,
+        name: str,
+        attributes: dict[str, Any] | None = None,
+    ):
+        self._parents[run_id] = parent_run_id
+        self._spans[run_id] = self.root.trace.start_span(
+            name, self._parent_span(parent_run_id), attributes
+        )
+
+    def _end(self, run_id: UUID, error: BaseException | None = None) -> Span | None:
+        self._parents.pop(run_id, None)
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            if error is not None:
+                span.record_exception(error)
+            span.end()
+        return span
+
+    def on_chain_start(
+        self,
+        serialized: dict[str, Any] | None,
+        inputs: dict[str, Any],
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        node = (metadata or {}).get("langgraph_node")
+        # Only the node itself, not the runnables it is made of
+        if node is not None and kwargs.get("name") == node:
+            self._start(
+                run_id,
+                parent_run_id,
+                f"node.{node}",
+                {"langgraph.step": (metadata or {}).get("langgraph_step")},
+            )
+        else:
+            self._parents[run_id] = parent_run_id
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_chain_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._end(run_id, error)
+
+    def on_tool_start(
+        self,
+        serialized: dict[str, Any] | None,
+        input_str: str,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name", "tool")
+        self._start(run_id, parent_run_id, f"tool.{name}")
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_tool_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._end(run_id, error)
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, Any] | None,
+        messages: list[list[Any]],
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        model = (metadata or {}).get("ls_model_name", "chat_model")
+        self._start(
+            run_id,
+            parent_run_id,
+            f"llm.{model}",
+            {"llm.messages": sum(len(batch) for batch in messages)},
+        )
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._end(run_id)
+        if span is not None:
+            usage = _usage(response)
+            span.set_attributes(
+                {
+                    "llm.input_tokens": usage["input_tokens"],
+                    "llm.output_tokens": usage["output_tokens"],
+                }
+            )
+
+    def on_llm_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._end(run_id, error)
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Record the latency and the token usage of each LLM call of the agent runs.
+    A single instance is shared by all the runs.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self._started: dict[UUID, tuple[str, float]] = {}
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, Any] | None,
+        messages: list[list[Any]],
+        *,
+        run_id: UUID,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        model = (metadata or {}).get("ls_model_name", "unknown")
+        self._started[run_id] = (model, time.perf_counter())
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        if (started := self._started.pop(run_id, None)) is None:
+            return
+        model, start = started
+        LLM_CALL_DURATION.labels(model).observe(time.perf_counter() - start)
+        for direction, tokens in _usage(response).items():
+            LLM_TOKENS.labels(model, direction.removesuffix("_tokens")).inc(tokens)
+
+    def on_llm_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._started.pop(run_id, None)
+
+
+class RequestLogCallbackHandler(BaseCallbackHandler):
+    """
+    Add the token usage of the LLM calls and the ids of the documents retrieved by
+    the tools of an agent run to the record of its request.
+    """
+
+    run_inline = True
+
+    def __init__(self, record: RequestRecord):
+        """
+        :param record: The record of the request the run answers.
+        """
+        self.record = record
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        usage = _usage(response)
+        self.record.add_usage(usage["input_tokens"], usage["output_tokens"])
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        # The retrieval tools report the documents they sent in their artifact
+        artifact = getattr(output, "artifact", None)
+        if isinstance(artifact, dict):
+            self.record.doc_ids.extend(artifact.get("doc_ids", []))
+
+
+metrics_callback = MetricsCallbackHandler()
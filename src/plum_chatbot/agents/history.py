@@ -0,0 +1,266 @@
+import logging
+from dataclasses import asdict, dataclass
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    AnyMessage,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from langchain_core.messages.utils import count_tokens_approximately, get_buffer_string
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+
+from plum_chatbot.configs.settings import Settings
+
+SUMMARY_MESSAGE_ID = "history-summary"
+COMPACTED_PREFIX = "[Output di "
+
+SUMMARY_PROMPT = """
+Riassumi in modo conciso la conversazione seguente tra un utente e l'assistente del portale Plum.
+Conserva le domande dell'utente, le risposte date, i dati specifici citati (nomi, codici,
+impostazioni) e le questioni rimaste aperte. Rispondi solo con il riassunto, in italiano.
+"""
+
+
+class HistoryCompactionConfig:
+    def __init__(
+        self,
+        keep_turns: int = 4,
+        summarize_every: int = 6,
+        tool_output_max_chars: int = 300,
+        summary_model: str = "openai:gpt-4.1-mini",
+    ):
+        """
+        :param keep_turns: Number of most recent turns kept verbatim.
+        :param summarize_every: Summarize the older turns once there are this many of them,
+                                0 disables the summarization.
+        :param tool_output_max_chars: Tool outputs of the older turns longer than this are
+                                      replaced by a reference.
+        :param summary_model: The model writing the summaries.
+        """
+        self.keep_turns = keep_turns
+        self.summarize_every = summarize_every
+        self.tool_output_max_chars = tool_output_max_chars
+        self.summary_model = summary_model
+
+    @classmethod
+    def from_settings(cls) -> "HistoryCompactionConfig":
+        settings = Settings()
+        return cls(
+            keep_turns=settings.HISTORY_KEEP_TURNS,
+            summarize_every=settings.HISTORY_SUMMARIZE_EVERY,
+            tool_output_max_chars=settings.HISTORY_TOOL_OUTPUT_MAX_CHARS,
+            summary_model=settings.HISTORY_SUMMARY_MODEL,
+        )
+
+
+@dataclass
+class HistoryMetrics:
+    runs: int = 0
+    compacted_tool_outputs: int = 0
+    summaries: int = 0
+    tokens_before: int = 0
+    tokens_after: int = 0
+    last_tokens_before: int = 0
+    last_tokens_after: int = 0
+
+    def record(self, before: int, after: int):
+        self.runs += 1
+        self.tokens_before += before
+        self.tokens_after += after
+        self.last_tokens_before = before
+        self.last_tokens_after = after
+
+    def as_dict(self) -> dict:
+        return {
+            **asdict(self),
+            "saved_ratio": (
+                1 - self.tokens_after / self.tokens_before
+                if self.tokens_before
+                else 0.0
+            ),
+        }
+
+
+class HistoryCompactor:
+    """
+    Pre-model hook of the ReAct agents, compacting the thread history before each LLM call.
+
+    The last `keep_turns` turns (a user message and everything up to the next one) are
+    kept verbatim. In the older turns, long tool outputs are replaced by a short reference
+    to the retrieved documents, and once `summarize_every` older turns piled up they are
+    replaced by a summary. The compaction is written to the thread state, so the
+    checkpoints shrink as well and the work is not redone at the next call.
+    """
+
+    name: str
+    config: HistoryCompactionConfig
+    metrics: HistoryMetrics
+    logger: logging.Logger
+
+    def __init__(self, name: str, config: HistoryCompactionConfig | None = None):
+        """
+        :param name: Name of the agent, for the logs.
+        :param config: The compaction configuration, defaults to the settings.
+        """
+        self.name = name
+        self.config = config or HistoryCompactionConfig.from_settings()
+        self.metrics = HistoryMetrics()
+        self.logger = logging.getLogger(__name__)
+        self._summary_llm: BaseChatModel | None = None
+
+    def as_hook(self) -> RunnableLambda:
+        return RunnableLambda(self.compact, afunc=self.acompact, name="compact_history")
+
+    @property
+    def summary_llm(self) -> BaseChatModel:
+        if self._summary_llm is None:
+            from plum_chatbot.agents.llm import init_llm
+
+            # Tagged so that the summary tokens are not streamed to the user
+            self._summary_llm = init_llm(
+                self.config.summary_model, temperature=0
+            ).with_config(tags=["skip_stream"])  # type: ignore[assignment]
+        return self._summary_llm  # type: ignore[return-value]
+
+    @staticmethod
+    def _split_turns(
+        messages: list[AnyMessage],
+    ) -> tuple[SystemMessage | None, list[list[AnyMessage]]]:
+        summary = None
+        turns: list[list[AnyMessage]] = []
+        for message in messages:
+            if message.id == SUMMARY_MESSAGE_ID and isinstance(message, SystemMessage):
+                summary = message
+            elif isinstance(message, HumanMessage) or not turns:
+                turns.append([message])
+            else:
+                turns[-1].append(message)
+        return summary, turns
+
+    def _compact_tool_output(self, message: ToolMessage) -> ToolMessage | None:
+        content = str(message.content)
+        if len(content) <= self.config.tool_output_max_chars or content.startswith(
+            COMPACTED_PREFIX
+        ):
+            return None
+        artifact = message.artifact if isinstance(message.artifact, dict) else {}
+        doc_ids = artifact.get("doc_ids")
+        reference = (
+            f"documenti {', '.join(doc_ids)}"
+            if doc_ids
+            else f"{len(content)} caratteri"
+        )
+        # Same id: the message is replaced in place in the thread state
+        return message.model_copy(
+            update={
+                "content": (
+                    f"{COMPACTED_PREFIX}{message.name} rimosso dalla cronologia: "
+                    f"{reference}]"
+                )
+            }
+        )
+
+    def _prepare(
+        self, messages: list[AnyMessage]
+    ) -> tuple[
+        SystemMessage | None,
+        list[list[AnyMessage]],
+        list[list[AnyMessage]],
+        list[ToolMessage],
+    ]:
+        summary, turns = self._split_turns(messages)
+        split = max(len(turns) - self.config.keep_turns, 0)
+        old_turns, recent_turns = turns[:split], turns[split:]
+        compacted = [
+            compacted_message
+            for turn in old_turns
+            for message in turn
+            if isinstance(message, ToolMessage)
+            and (compacted_message := self._compact_tool_output(message)) is not None
+        ]
+        return summary, old_turns, recent_turns, compacted
+
+    def _should_summarize(self, old_turns: list[list[AnyMessage]]) -> bool:
+        every = self.config.summarize_every
+        return every > 0 and len(old_turns) >= every
+
+    def _summary_input(
+        self, summary: SystemMessage | None, old_turns: list[list[AnyMessage]]
+    ) -> list[AnyMessage]:
+        transcript = get_buffer_string(
+            [message for turn in old_turns for message in turn],
+            human_prefix="Utente",
+            ai_prefix="Assistente",
+        )
+        if summary is not None:
+            transcript = f"{summary.content}\n\n{transcript}"
+        return [SystemMessage(content=SUMMARY_PROMPT), HumanMessage(content=transcript)]
+
+    def _update(
+        self,
+        messages: list[AnyMessage],
+        recent_turns: list[list[AnyMessage]],
+        compacted: list[ToolMessage],
+        new_summary: str | None,
+    ) -> dict:
+        before = count_tokens_approximately(messages)
+        if new_summary is not None:
+            summary_message = SystemMessage(
+                content=f"Riassunto della conversazione precedente:\n{new_summary}",
+                id=SUMMARY_MESSAGE_ID,
+            )
+            kept = [message for turn in recent_turns for message in turn]
+            after = count_tokens_approximately([summary_message, *kept])
+            self.metrics.summaries += 1
+            update = [RemoveMessage(id=REMOVE_ALL_MESSAGES), summary_message, *kept]
+        else:
+            by_id = {message.id: message for message in compacted}
+            after = count_tokens_approximately(
+                [by_id.get(message.id, message) for message in messages]
+            )
+            update = list(compacted)
+        self.metrics.compacted_tool_outputs += len(compacted)
+        self.metrics.record(before, after)
+        if before != after:
+            self.logger.info(
+                "History of %s compacted: %d -> %d tokens (%d tool outputs, %s)",
+                self.name,
+                before,
+                after,
+                len(compacted),
+                "summarized" if new_summary is not None else "not summarized",
+            )
+        # An empty update keeps the state as it is, and the LLM reads it whole
+        return {"messages": update}
+
+    def compact(self, state: dict, config: RunnableConfig) -> dict:
+        messages: list[AnyMessage] = state["messages"]
+        summary, old_turns, recent_turns, compacted = self._prepare(messages)
+        new_summary = None
+        if self._should_summarize(old_turns):
+            try:
+                response = self.summary_llm.invoke(
+                    self._summary_input(summary, old_turns), config
+                )
+                new_summary = str(response.content)
+            except Exception as e:
+                self.logger.error("History summarization failed: %s", e)
+        return self._update(messages, recent_turns, compacted, new_summary)
+
+    async def acompact(self, state: dict, config: RunnableConfig) -> dict:
+        messages: list[AnyMessage] = state["messages"]
+        summary, old_turns, recent_turns, compacted = self._prepare(messages)
+        new_summary = None
+        if self._should_summarize(old_turns):
+            try:
+                response = await self.summary_llm.ainvoke(
+                    self._summary_input(summary, old_turns), config
+                )
+                new_summary = str(response.content)
+            except Exception as e:
+                self.logger.error("History summarization failed: %s", e)
+        return self._update(messages, recent_turns, compacted, new_summary)
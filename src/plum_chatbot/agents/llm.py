@@ -0,0 +1,125 @@
+import asyncio
+import time
+from collections.abc import Sequence
+from typing import Any
+from uuid import uuid4
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel, LanguageModelInput
+from langchain_core.language_models.base import LangSmithParams
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from plum_chatbot.configs.settings import Settings
+
+STUB_MODEL = "stub"
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Offline chat model for the load tests, walking the ReAct loop without an LLM.
+
+    With tools bound, a user message is answered with a call to the first tool, passing
+    the message as its first argument; a tool output is answered with its beginning.
+    Without tools, e.g. for the history summaries, the last message is echoed.
+    Each call sleeps `latency_ms`, to simulate the LLM round trip.
+
+    The response metadata tell the process which answered and the user turns the
+    model was given, for the multi-worker test to check the conversation followed.
+    """
+
+    latency_ms: float = 0
+    answer_chars: int = 400
+    # Name and first argument of the bound tools
+    tools: list[tuple[str, str]] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return STUB_MODEL
+
+    def _get_ls_params(
+        self, stop: list[str] | None = None, **kwargs: Any
+    ) -> LangSmithParams:
+        params = super()._get_ls_params(stop=stop, **kwargs)
+        params["ls_model_name"] = STUB_MODEL
+        return params
+
+    def bind_tools(
+        self,
+        tools: Sequence[dict[str, Any] | type | BaseTool | Any],
+        **kwargs: Any,
+    ) -> Runnable[LanguageModelInput, BaseMessage]:
+        bound = []
+        for tool in tools:
+            function = convert_to_openai_tool(tool)["function"]
+            arguments = list(function.get("parameters", {}).get("properties", {}))
+            bound.append((function["name"], arguments[0] if arguments else "query"))
+        return self.model_copy(update={"tools": bound})
+
+    def _respond(self, messages: list[BaseMessage]) -> ChatResult:
+        last = messages[-1]
+        if isinstance(last, HumanMessage) and self.tools:
+            name, argument = self.tools[0]
+            message = AIMessage(
+                content="",
+                tool_calls=[
+                    {
+                        "name": name,
+                        "args": {argument: str(last.content)},
+                        "id": f"call_{uuid4().hex}",
+                    }
+                ],
+            )
+        else:
+            # A tool output, or the transcript to summarize
+            message = AIMessage(content=str(last.content)[: self.answer_chars])
+        input_tokens = count_tokens_approximately(messages)
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": count_tokens_approximately([message]),
+            "total_tokens": input_tokens + count_tokens_approximately([message]),
+        }
+        message.response_metadata = {"model_name": STUB_MODEL}
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latency_ms / 1000)
+        return self._respond(messages)
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self._respond(messages)
+
+
+def init_llm(model: str, **kwargs: Any) -> BaseChatModel:
+    """
+    Initialize a chat model from its `provider:name`, or the stub model for `stub`.
+
+    :param model: The model, e.g. `openai:gpt-4.1`, or `stub`.
+    :param kwargs: Arguments of `init_chat_model`, ignored by the stub model.
+    :return: The chat model.
+    """
+    if model == STUB_MODEL:
+        return StubChatModel(latency_ms=Settings().STUB_LLM_LATENCY_MS)
+    from langchain.chat_models import init_chat_model
+
+    return init_chat_model(model, **kwargs)
@@ -1,13 +1,19 @@
 from langchain.chat_models import init_chat_model
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import create_react_agent
 
-from plum_chatbot.agents.tools.vector_db import query_vector_db
+from plum_chatbot.agents.history import HistoryCompactionConfig, HistoryCompactor
+from plum_chatbot.agents.tools.vector_db import aquery_vector_db
+from plum_chatbot.di_containers.datasources_containers import get_checkpointer
 from plum_chatbot.schemas.schema import Agent
 
 
 class RagAgent(Agent):
-    def __init__(self, name: str = "rag_agent", description: str = ""):
+    def __init__(
+        self,
+        name: str = "rag_agent",
+        description: str = "",
+        history: HistoryCompactionConfig | None = None,
+    ):
         prompt = """
 Sei un assistente esperto del portale Plum, il sistema di comunicazione ufficiale del gestionale Lemon, progettato per supportare gli amministratori di condominio.
 
@@ -35,13 +41,16 @@ Se hai bisogno di ulteriori informazioni, chiedi chiarimenti all'utente prima di
             temperature=0.5,
         )
 
-        tools = [query_vector_db]
+        tools = [aquery_vector_db]
+
+        history_compactor = HistoryCompactor(name, history)
 
         graph = create_react_agent(
             llm,
             tools,
-            checkpointer=MemorySaver(),
+            checkpointer=get_checkpointer(),
             prompt=prompt,
+            pre_model_hook=history_compactor.as_hook(),
         )
         # Initialize the RAG agent
         # _initialize_rag_agent(prompt)
@@ -52,6 +61,7 @@ Se hai bisogno di ulteriori informazioni, chiedi chiarimenti all'utente prima di
             llm=llm,
             tools=tools,
             prompt=prompt,
+            history=history_compactor,
         )
 
     # def _initialize_rag_agent(self, prompt: str):
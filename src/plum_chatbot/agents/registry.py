@@ -0,0 +1,86 @@
+import asyncio
+import logging
+from collections.abc import Callable
+from threading import Lock
+
+from plum_chatbot.configs.startup import startup_report
+from plum_chatbot.schemas.schema import Agent, AgentInfo
+
+
+class AgentRegistry:
+    """
+    Registry of the available agents.
+
+    Agents are registered with a factory and built on first use, or ahead of time by
+    `awarm_up`, so that importing the registry does not pay for the LLM clients and
+    the graph compilations.
+    """
+
+    def __init__(self):
+        self._descriptions: dict[str, str] = {}
+        self._factories: dict[str, Callable[[], Agent]] = {}
+        self._agents: dict[str, Agent] = {}
+        self._lock = Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def register(self, key: str, description: str, factory: Callable[[], Agent]):
+        """
+        Register an agent.
+
+        :param key: The agent ID.
+        :param description: Description of the agent, available without building it.
+        :param factory: Callable building the agent.
+        """
+        self._descriptions[key] = description
+        self._factories[key] = factory
+
+    def keys(self) -> list[str]:
+        return list(self._factories)
+
+    def is_built(self, key: str) -> bool:
+        return key in self._agents
+
+    @property
+    def ready(self) -> bool:
+        return all(self.is_built(key) for key in self._factories)
+
+    def get(self, key: str) -> Agent:
+        """
+        Get an agent, building it if needed.
+
+        :param key: The agent ID.
+        :return: The agent.
+        :raises KeyError: If no agent is registered with this ID.
+        """
+        if (agent := self._agents.get(key)) is not None:
+            return agent
+        factory = self._factories[key]
+        with self._lock:
+            if key not in self._agents:
+                with startup_report.measure(f"agent:{key}"):
+                    self._agents[key] = factory()
+                self.logger.info("Agent %s built.", key)
+        return self._agents[key]
+
+    async def aget(self, key: str) -> Agent:
+        """
+        Get an agent, building it in a worker thread if needed.
+        """
+        if (agent := self._agents.get(key)) is not None:
+            return agent
+        if key not in self._factories:
+            raise KeyError(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def awarm_up(self):
+        """
+        Build every registered agent.
+        """
+        for key in self._factories:
+            await self.aget(key)
+
+    def info(self) -> list[AgentInfo]:
+        return [
+            AgentInfo(key=key, description=description)
+            for key, description in self._descriptions.items()
+        ]
@@ -0,0 +1,108 @@
+import json
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from threading import Lock
+
+from plum_chatbot.datasources.shared_store import SharedStore
+
+
+@dataclass
+class ThreadStatus:
+    # The thread has messages in its state
+    started: bool = False
+    # The last run of the thread stopped on an interrupt, to be resumed
+    interrupted: bool = False
+
+
+class ThreadStatusRegistry:
+    """
+    Bounded LRU of what is known about the recent threads, updated at the end of each run,
+    so that a request does not load the thread state just to find out whether the thread
+    is new or waits for an interrupt to be resumed.
+
+    Threads missing from the registry are unknown: created by another process, before a
+    restart, or evicted from the LRU. With a shared store, the statuses are read from and
+    written to the store, so that the runs of a thread on any worker see its last status.
+    """
+
+    max_size: int
+    store: SharedStore | None
+    ttl: float
+
+    def __init__(
+        self,
+        max_size: int = 10_000,
+        store: SharedStore | None = None,
+        ttl: float = 24 * 60 * 60,
+    ):
+        """
+        :param max_size: Maximum number of threads tracked in memory.
+        :param store: The store shared by the workers, used if it is shared.
+        :param ttl: Seconds the statuses are kept in the shared store.
+        """
+        self.max_size = max_size
+        self.store = store if store is not None and store.shared else None
+        self.ttl = ttl
+        self._threads: OrderedDict[str, ThreadStatus] = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def _key(thread_id: str) -> str:
+        return f"thread_status:{thread_id}"
+
+    def _set_local(self, thread_id: str, status: ThreadStatus):
+        with self._lock:
+            self._threads[thread_id] = status
+            self._threads.move_to_end(thread_id)
+            while len(self._threads) > self.max_size:
+                self._threads.popitem(last=False)
+
+    async def aget(self, thread_id: str) -> ThreadStatus | None:
+        """
+        :return: The status of the thread, or None if it is unknown.
+        """
+        if self.store is not None:
+            # Another worker may have run the thread since: the store is authoritative
+            value = await self.store.get(self._key(thread_id))
+            if value is None:
+                return None
+            status = ThreadStatus(**json.loads(value))
+            self._set_local(thread_id, status)
+            return status
+        with self._lock:
+            status = self._threads.get(thread_id)
+            if status is not None:
+                self._threads.move_to_end(thread_id)
+            return status
+
+    async def aset(self, thread_id: str, started: bool, interrupted: bool = False):
+        status = ThreadStatus(started=started, interrupted=interrupted)
+        self._set_local(thread_id, status)
+        if self.store is not None:
+            await self.store.set(
+                self._key(thread_id), json.dumps(asdict(status)), self.ttl
+            )
+
+    async def amark_completed(self, thread_id: str):
+        await self.aset(thread_id, started=True, interrupted=False)
+
+    async def amark_interrupted(self, thread_id: str):
+        await self.aset(thread_id, started=True, interrupted=True)
+
+    async def aforget(self, thread_id: str):
+        with self._lock:
+            self._threads.pop(thread_id, None)
+        if self.store is not None:
+            await self.store.delete(self._key(thread_id))
+
+    def stats(self) -> dict[str, int]:
+        """
+        Counters of the threads tracked in the memory of this process.
+        """
+        with self._lock:
+            return {
+                "size": len(self._threads),
+                "interrupted": sum(
+                    status.interrupted for status in self._threads.values()
+                ),
+            }
@@ -0,0 +1,140 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from plum_chatbot.configs.startup import startup_report
+from plum_chatbot.datasources.models.qdrant_models import QdrantDocument
+
+if TYPE_CHECKING:
+    from tiktoken import Encoding
+
+logger = logging.getLogger(__name__)
+
+_IMAGE_MARKUP_PATTERN = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_WHITESPACE_PATTERN = re.compile(r"[ \t]+")
+# Passages left with fewer tokens than this are dropped rather than truncated
+MIN_PASSAGE_TOKENS = 32
+
+
+@lru_cache(maxsize=4)
+def _encoding(model: str) -> "Encoding | None":
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # tiktoken missing, or its vocabulary not downloadable: estimate instead
+        logger.warning(
+            "No tokenizer for %s (%s), estimating 4 chars per token.", model, e
+        )
+        return None
+
+
+def load_tokenizer(model: str):
+    """
+    Load the tokenizer of a model ahead of the first request: the vocabulary may have
+    to be downloaded. Blocking: meant for a worker thread.
+    """
+    with startup_report.measure("model_load:tokenizer"):
+        _encoding(model)
+
+
+def count_tokens(text: str, model: str = "gpt-4.1") -> int:
+    """
+    Number of tokens of a text for the given model, estimated as 4 characters per
+    token when no tokenizer is available.
+    """
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str = "gpt-4.1") -> str:
+    """
+    Truncate a text to at most `max_tokens` tokens.
+    """
+    encoding = _encoding(model)
+    if encoding is None:
+        return text[: max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+def strip_images(text: str) -> str:
+    """
+    Remove the image markup, inline data URIs and image references alike.
+    """
+    text = _IMAGE_MARKUP_PATTERN.sub(" ", text)
+    return _WHITESPACE_PATTERN.sub(" ", text).strip()
+
+
+@dataclass
+class AssembledContext:
+    text: str
+    tokens: int
+    doc_ids: list[str] = field(default_factory=list)
+    dropped_ids: list[str] = field(default_factory=list)
+    truncated: bool = False
+
+    def artifact(self) -> dict:
+        return {
+            "tokens": self.tokens,
+            "doc_ids": self.doc_ids,
+            "dropped_ids": self.dropped_ids,
+            "truncated": self.truncated,
+        }
+
+
+def _format(doc: QdrantDocument, content: str) -> str:
+    return f"Source: {doc.metadata.source}\nContent: {content}"
+
+
+def assemble_context(
+    docs: list[QdrantDocument], token_budget: int, model: str = "gpt-4.1"
+) -> AssembledContext:
+    """
+    Build the tool output from the retrieved documents, in rank order, within a token budget.
+
+    Image markup is stripped, and documents whose content is a duplicate of, or contained
+    in, an already selected one are skipped. The first passage not fitting the remaining
+    budget is truncated, and the following ones dropped.
+
+    :param docs: The retrieved documents, best first.
+    :param token_budget: Maximum number of tokens of the assembled context.
+    :param model: The model the context is sent to, for the token counts.
+    :return: The assembled context.
+    """
+    separator_tokens = count_tokens("\n\n", model)
+    passages: list[str] = []
+    seen: list[str] = []
+    context = AssembledContext(text="", tokens=0)
+    for doc in docs:
+        content = strip_images(doc.content)
+        normalized = content.casefold()
+        if not normalized or any(normalized in other for other in seen):
+            continue
+        remaining = (
+            token_budget - context.tokens - (separator_tokens if passages else 0)
+        )
+        passage = _format(doc, content)
+        tokens = count_tokens(passage, model)
+        if tokens > remaining:
+            if remaining < MIN_PASSAGE_TOKENS or context.truncated:
+                context.dropped_ids.append(doc.id)
+                continue
+            passage = truncate_tokens(passage, remaining, model)
+            tokens = count_tokens(passage, model)
+            context.truncated = True
+        seen.append(normalized)
+        passages.append(passage)
+        context.doc_ids.append(doc.id)
+        context.tokens += tokens + (separator_tokens if len(passages) > 1 else 0)
+
+    context.text = "\n\n".join(passages)
+    return context
@@ -1,13 +1,40 @@
+import asyncio
+import logging
+
 from langchain_core.tools import tool
 
+from plum_chatbot.agents.tools.context import assemble_context
+from plum_chatbot.configs.settings import Settings
 from plum_chatbot.datasources.models.qdrant_models import QdrantDocument
 from plum_chatbot.di_containers.datasources_containers import get_qdrant_datasource
 
+logger = logging.getLogger(__name__)
+
+
+def _serialize(retrieved_docs: list[QdrantDocument]) -> tuple[str, dict]:
+    """
+    Assemble the retrieved documents within the context token budget.
 
-@tool
-def query_vector_db(
-    query: str, limit: int | str | None = 1
-) -> str: # tuple[str, list[QdrantDocument]]:
+    :return: The tool content, and the artifact reporting the tokens and documents sent.
+    """
+    settings = Settings()
+    context = assemble_context(
+        retrieved_docs,
+        token_budget=settings.CONTEXT_TOKEN_BUDGET,
+        model=settings.CONTEXT_TOKENIZER_MODEL,
+    )
+    logger.info(
+        "Retrieval context: %d tokens from %d documents%s, %d dropped",
+        context.tokens,
+        len(context.doc_ids),
+        " (truncated)" if context.truncated else "",
+        len(context.dropped_ids),
+    )
+    return context.text, context.artifact()
+
+
+@tool(response_format="content_and_artifact")
+def query_vector_db(query: str, limit: int | str | None = 1) -> tuple[str, dict]:
     """
     Tool to query the PLUM vector database.
     This tool uses the QdrantDatasource to perform similarity searches.
@@ -17,7 +44,7 @@ def query_vector_db(
         query (str): The query string to search for in the vector database.
         limit (int, optional): The maximum number of results to return. Defaults to 1.
     Returns:
-        tuple: A tuple containing the serialized results and the retrieved documents.
+        str: The retrieved documents, assembled within the context token budget.
     """
     limit = int(limit or 5)
     datasource = get_qdrant_datasource()
@@ -28,10 +55,61 @@ def query_vector_db(
     #     return datasource.query(query=query, limit=limit)
 
     retrieved_docs: list[QdrantDocument] = datasource.query(query=query, limit=limit)
-    serialized = "\n\n".join(
-        (f"Source: {doc.metadata.source}\nContent: {doc.content}") for doc in retrieved_docs
+    return _serialize(retrieved_docs)
+
+
+@tool("query_vector_db", response_format="content_and_artifact")
+async def aquery_vector_db(query: str, limit: int | str | None = 1) -> tuple[str, dict]:
+    """
+    Tool to query the PLUM vector database.
+    This tool uses the QdrantDatasource to perform similarity searches.
+    Use this only when you need to retrieve information from the vector database, not for general queries.
+
+    Args:
+        query (str): The query string to search for in the vector database.
+        limit (int, optional): The maximum number of results to return. Defaults to 1.
+    Returns:
+        str: The retrieved documents, assembled within the context token budget.
+    """
+    limit = int(limit or 5)
+    datasource = get_qdrant_datasource()
+    if datasource is None:
+        raise ValueError("QdrantDatasource is not available in the container.")
+
+    retrieved_docs: list[QdrantDocument] = await datasource.aquery(
+        query=query, limit=limit
+    )
+    # Tokenizing the documents is CPU-bound: off the event loop
+    return await asyncio.to_thread(_serialize, retrieved_docs)
+
+
+@tool("query_vector_db_multi", response_format="content_and_artifact")
+async def aquery_vector_db_multi(
+    queries: list[str], limit: int | str | None = 1
+) -> tuple[str, dict]:
+    """
+    Tool to query the PLUM vector database with several queries at once.
+    Prefer it to several calls of query_vector_db when a question covers more than one topic.
+
+    Args:
+        queries (list[str]): The query strings to search for in the vector database.
+        limit (int, optional): The maximum number of results to return per query. Defaults to 1.
+    Returns:
+        str: The retrieved documents without duplicates, assembled within the context
+            token budget.
+    """
+    limit = int(limit or 5)
+    datasource = get_qdrant_datasource()
+    if datasource is None:
+        raise ValueError("QdrantDatasource is not available in the container.")
+
+    results: list[list[QdrantDocument]] = await datasource.aquery_batch(
+        queries=queries, limit=limit
     )
-    return serialized#, retrieved_docs
+    retrieved_docs: dict[str, QdrantDocument] = {
+        doc.id: doc for docs in results for doc in docs
+    }
+    return await asyncio.to_thread(_serialize, list(retrieved_docs.values()))
 
 
 if __name__ == "__main__":
@@ -51,4 +129,9 @@ if __name__ == "__main__":
         # result = amultiply.invoke({"a": 3, "b": 4})
         print(result)
 
+        result = await aquery_vector_db.ainvoke(
+            {"query": "come cambio la mail?", "limit": 5}
+        )
+        print(result)
+
     asyncio.run(test_vector_db())
@@ -4,6 +4,14 @@ BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent
 
 DATA_DIR = BASE_DIR / "data"
 PDF_DIR = DATA_DIR / "pdfs"
+EXTRACTIONS_DIR = DATA_DIR / "extractions"
+IMAGES_DIR = DATA_DIR / "images"
+MODELS_DIR = DATA_DIR / "models"
+
+EVALUATION_DIR = BASE_DIR / "evaluation"
+EVALUATION_DATA_DIR = EVALUATION_DIR / "data"
+BASELINES_DIR = EVALUATION_DIR / "baselines"
+EVALUATION_RESULTS_DIR = EVALUATION_DIR / "results"
 
 LOGS_DIR = BASE_DIR / "logs"
 
@@ -1,41 +1,191 @@
+import atexit
+import copy
+import json
 import logging
 import os
+import queue
+from contextvars import ContextVar
+from datetime import UTC, datetime
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    TimedRotatingFileHandler,
+)
 
 from plum_chatbot.configs.folders import LOGS_DIR
+from plum_chatbot.configs.settings import Settings
+
+LOG_FORMATS = ("text", "json")
+LOG_ROTATIONS = ("size", "time")
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s -%(correlation)s %(message)s"
+
+# Correlation ids of the request being handled, added to its log records
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+thread_id_var: ContextVar[str | None] = ContextVar("thread_id", default=None)
+
+_listener: QueueListener | None = None
+
+
+def bind_thread_id(thread_id: str | None):
+    """
+    Tag the log records of the current request with the thread (chat) it belongs to.
+    """
+    thread_id_var.set(thread_id)
+
+
+class CorrelationFilter(logging.Filter):
+    """
+    Add the request and thread ids of the current context to the records. Runs in the
+    thread logging the record, where the context variables are set.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.thread_id = thread_id_var.get()
+        ids = [
+            f"{key}={value}"
+            for key, value in (
+                ("request", record.request_id),
+                ("thread", record.thread_id),
+            )
+            if value
+        ]
+        record.correlation = f" [{' '.join(ids)}]" if ids else ""
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format the records as JSON lines, with their correlation ids.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, UTC).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "thread_id": getattr(record, "thread_id", None),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    """
+    Queue handler deferring the formatting to the listener thread: only the message
+    arguments, which may change afterwards, and the traceback are rendered here.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _parse_levels(levels: str) -> dict[str, str]:
+    """
+    Parse per-logger levels, e.g. `plum_chatbot.agents=DEBUG,httpx=WARNING`.
+    """
+    parsed = {}
+    for entry in levels.split(","):
+        if entry.strip():
+            name, _, level = entry.partition("=")
+            parsed[name.strip()] = level.strip().upper()
+    return parsed
 
 
 def setup_global_logging() -> None:
     """
     Setup global logging configuration that applies to all loggers.
     This should be called once during application startup.
+
+    The loggers only enqueue their records: a background listener formats them and
+    writes them to the console and to `logs/application.log`, rotated by size or
+    time, so that logging never blocks the event loop on the disk. With several
+    workers, each one rotates its own file, `logs/application.<pid>.log`.
     """
+    settings = Settings()
+    if settings.LOG_FORMAT not in LOG_FORMATS:
+        raise ValueError(
+            f"Unknown log format {settings.LOG_FORMAT}, expected one of {LOG_FORMATS}"
+        )
+    if settings.LOG_FILE_ROTATION not in LOG_ROTATIONS:
+        raise ValueError(
+            f"Unknown log rotation {settings.LOG_FILE_ROTATION}, "
+            f"expected one of {LOG_ROTATIONS}"
+        )
     os.makedirs(LOGS_DIR, exist_ok=True)
 
     # Configure root logger
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
+    root_logger.setLevel(settings.LOG_LEVEL.upper())
+    for name, level in _parse_levels(settings.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
 
     # Remove any existing handlers to avoid duplicates
     for handler in root_logger.handlers[:]:
         root_logger.removeHandler(handler)
+    _stop_listener()
 
     # Create formatter
-    formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    formatter: logging.Formatter = (
+        JsonFormatter()
+        if settings.LOG_FORMAT == "json"
+        else logging.Formatter(TEXT_FORMAT)
     )
 
     # Add file handler
-    log_file = LOGS_DIR / "application.log"
-    file_handler = logging.FileHandler(log_file)
+    log_file = LOGS_DIR / (
+        f"application.{os.getpid()}.log" if settings.WORKERS > 1 else "application.log"
+    )
+    file_handler: logging.Handler
+    if settings.LOG_FILE_ROTATION == "time":
+        file_handler = TimedRotatingFileHandler(
+            log_file,
+            when=settings.LOG_FILE_ROTATE_WHEN,
+            backupCount=settings.LOG_FILE_BACKUPS,
+            encoding="utf-8",
+        )
+    else:
+        file_handler = RotatingFileHandler(
+            log_file,
+            maxBytes=settings.LOG_FILE_MAX_BYTES,
+            backupCount=settings.LOG_FILE_BACKUPS,
+            encoding="utf-8",
+        )
     file_handler.setFormatter(formatter)
-    file_handler.setLevel(logging.INFO)
-    root_logger.addHandler(file_handler)
 
     # Add console handler for development
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
-    console_handler.setLevel(logging.INFO)
-    root_logger.addHandler(console_handler)
+
+    # The records are tagged with the correlation ids before leaving the logging thread
+    log_queue: queue.Queue[logging.LogRecord] = queue.Queue(-1)
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(CorrelationFilter())
+    root_logger.addHandler(queue_handler)
+
+    global _listener
+    _listener = QueueListener(log_queue, file_handler, console_handler)
+    _listener.start()
 
     # Prevent propagation issues
     root_logger.propagate = False
@@ -47,3 +197,7 @@ def setup_logger(name: str) -> logging.Logger:
     Uses the global logging configuration set by setup_global_logging().
     """
     return logging.getLogger(name)
+
+
+# Flush the records still queued when the process exits
+atexit.register(_stop_listener)
@@ -0,0 +1,55 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# Latency buckets of the HTTP requests and agent runs, LLM answers take seconds
+REQUEST_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+# Latency buckets of the retrieval steps, encoding and vector search take milliseconds
+RETRIEVAL_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+HTTP_REQUESTS = Counter(
+    "plum_http_requests_total",
+    "HTTP requests, by route template and status code.",
+    ["method", "route", "status"],
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "plum_http_request_duration_seconds",
+    "HTTP request latency, by route template. Streams are timed until their last byte.",
+    ["method", "route"],
+    buckets=REQUEST_BUCKETS,
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "plum_http_requests_in_flight",
+    "HTTP requests being served.",
+    # Summed over the live workers, with PROMETHEUS_MULTIPROC_DIR
+    multiprocess_mode="livesum",
+)
+
+AGENT_RUNS_IN_FLIGHT = Gauge(
+    "plum_agent_runs_in_flight",
+    "Agent runs in progress, by agent.",
+    ["agent"],
+    multiprocess_mode="livesum",
+)
+LLM_TOKENS = Counter(
+    "plum_llm_tokens_total",
+    "Tokens of the LLM calls, by model and direction (input or output).",
+    ["model", "direction"],
+)
+LLM_CALL_DURATION = Histogram(
+    "plum_llm_call_duration_seconds",
+    "Latency of the LLM calls, by model.",
+    ["model"],
+    buckets=REQUEST_BUCKETS,
+)
+
+RETRIEVAL_DURATION = Histogram(
+    "plum_retrieval_duration_seconds",
+    "Latency of the retrieval steps: query encoding (encode) and vector search (search).",
+    ["step"],
+    buckets=RETRIEVAL_BUCKETS,
+)
+
+EVENT_LOOP_LAG = Histogram(
+    "plum_event_loop_lag_seconds",
+    "Delay of the event loop in running a task scheduled to wake up.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
@@ -0,0 +1,211 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from plum_chatbot.configs.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RequestRecord:
+    """
+    An entry of the request log: the input of an agent request, its timing, the token
+    usage of its LLM calls and the documents retrieved by its tools.
+    """
+
+    ts: float
+    endpoint: str
+    agent: str
+    message: str
+    chat_id: str | None = None
+    user_id: str | None = None
+    status: int = 200
+    duration_ms: float = 0.0
+    cached: bool = False
+    llm_calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    doc_ids: list[str] = field(default_factory=list)
+
+    def add_usage(self, input_tokens: int, output_tokens: int):
+        self.llm_calls += 1
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+
+
+_current_record: ContextVar[RequestRecord | None] = ContextVar(
+    "current_request_record", default=None
+)
+
+
+class RequestLog:
+    """
+    Record the agent requests to a rotating JSONL file, one compact line per request,
+    to be replayed by `api_tester/replay.py`.
+
+    The requests only enqueue their record: a background thread serializes and writes
+    them, so that the event loop never waits on the disk. When the queue is full the
+    records are dropped and counted, rather than slowing the requests down.
+    """
+
+    path: Path | None
+    max_bytes: int
+    backups: int
+
+    def __init__(
+        self,
+        path: Path | None,
+        max_bytes: int = 50 * 1024 * 1024,
+        backups: int = 5,
+        queue_size: int = 10_000,
+    ):
+        """
+        :param path: The log file, None to disable the log.
+        :param max_bytes: Size after which the file is rotated to `<path>.1`.
+        :param backups: Rotated files kept, `<path>.1` being the most recent.
+        :param queue_size: Records waiting to be written before new ones are dropped.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self._queue: queue.Queue[RequestRecord | None] = queue.Queue(queue_size)
+        self._writer: threading.Thread | None = None
+
+    @classmethod
+    def from_settings(cls) -> "RequestLog":
+        """
+        The log configured by the settings. With several workers, each one writes its
+        own file, `<name>.<pid><suffix>`, which the replay reads together.
+        """
+        settings = Settings()
+        path = Path(settings.REQUEST_LOG_PATH) if settings.REQUEST_LOG_PATH else None
+        if path is not None and settings.WORKERS > 1:
+            path = path.with_name(f"{path.stem}.{os.getpid()}{path.suffix}")
+        return cls(
+            path,
+            max_bytes=settings.REQUEST_LOG_MAX_BYTES,
+            backups=settings.REQUEST_LOG_BACKUPS,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    @staticmethod
+    def current() -> RequestRecord | None:
+        """
+        The record of the request being handled, if it is logged.
+        """
+        return _current_record.get()
+
+    def start(self):
+        if self.enabled and self._writer is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)  # type: ignore[union-attr]
+            self._writer = threading.Thread(
+                target=self._write_forever, name="request-log", daemon=True
+            )
+            self._writer.start()
+            logger.info("Recording the agent requests to %s", self.path)
+
+    def stop(self):
+        """
+        Write the pending records and stop the writer.
+        """
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+    @contextmanager
+    def track(
+        self,
+        endpoint: str,
+        agent: str,
+        message: str,
+        chat_id: str | None = None,
+        user_id: str | None = None,
+    ) -> Iterator[RequestRecord | None]:
+        """
+        Record a request: time the block, and make the record current within it so
+        that the agent run can add its token usage and retrieved documents.
+        The status is the one of the HTTP exception the block raises, 500 for others.
+        """
+        if not self.enabled or self._writer is None:
+            yield None
+            return
+        record = RequestRecord(
+            ts=time.time(),
+            endpoint=endpoint,
+            agent=agent,
+            message=message,
+            chat_id=chat_id,
+            user_id=user_id,
+        )
+        token = _current_record.set(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            # HTTPException carries the status of the response
+            record.status = getattr(e, "status_code", 500)
+            raise
+        finally:
+            record.duration_ms = round((time.perf_counter() - start) * 1000, 2)
+            _current_record.reset(token)
+            self._submit(record)
+
+    def _submit(self, record: RequestRecord):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(
+                    "Request log queue full, %d records dropped", self.dropped
+                )
+
+    def _rotate(self):
+        for index in range(self.backups - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{index}")  # type: ignore[union-attr]
+            if source.exists():
+                source.replace(self.path.with_name(f"{self.path.name}.{index + 1}"))  # type: ignore[union-attr]
+        if self.backups > 0:
+            self.path.replace(self.path.with_name(f"{self.path.name}.1"))  # type: ignore[union-attr]
+        else:
+            self.path.unlink()  # type: ignore[union-attr]
+
+    def _write_forever(self):
+        file = self.path.open("a", encoding="utf-8")  # type: ignore[union-attr]
+        try:
+            while (record := self._queue.get()) is not None:
+                try:
+                    file.write(
+                        json.dumps(
+                            asdict(record), ensure_ascii=False, separators=(",", ":")
+                        )
+                        + "\n"
+                    )
+                    # Flushed once the queue is drained, not for every record
+                    if self._queue.empty():
+                        file.flush()
+                    if file.tell() >= self.max_bytes:
+                        file.close()
+                        self._rotate()
+                        file = self.path.open("a", encoding="utf-8")  # type: ignore[union-attr]
+                except Exception as e:
+                    logger.error("Failed to write the request log: %s", e)
+        finally:
+            file.close()
+
+
+request_log = RequestLog.from_settings()
@@ -22,12 +22,103 @@ class Settings:
             "QDRANT__SERVICE__READ_ONLY_API_KEY", ""
         )
         self.QDRANT_API_KEY: str = os.getenv("QDRANT__SERVICE__API_KEY", "")
-        self.QDRANT_HOST: str = "qdrant" # os.getenv("QDRANT__SERVICE__HOST")
+        self.QDRANT_HOST: str = "qdrant"  # os.getenv("QDRANT__SERVICE__HOST")
         self.QDRANT_HTTP_PORT: str = os.getenv("QDRANT__SERVICE__HTTP_PORT", "")
         self.QDRANT_COLLECTION_NAME: str = os.getenv(
             "QDRANT__SERVICE__COLLECTION_NAME", ""
         )
         self.QDRANT_URL: str = f"http://{self.QDRANT_HOST}:{self.QDRANT_HTTP_PORT}"
+        self.QDRANT_ENCODE_WORKERS: int = int(os.getenv("QDRANT_ENCODE_WORKERS", "2"))
+        # Micro-batching of concurrent query encodes, a batch size of 1 disables it
+        self.ENCODE_BATCH_SIZE: int = int(os.getenv("ENCODE_BATCH_SIZE", "16"))
+        self.ENCODE_BATCH_WAIT_MS: float = float(os.getenv("ENCODE_BATCH_WAIT_MS", "5"))
+        # dense, or hybrid (dense + BM25 fused with RRF, needs a collection
+        # indexed by the ingestion pipeline with the bm25 sparse vector)
+        self.QDRANT_SEARCH_MODE: str = os.getenv("QDRANT_SEARCH_MODE", "dense")
+        self.QDRANT_PREFETCH_LIMIT: int = int(os.getenv("QDRANT_PREFETCH_LIMIT", "20"))
+
+        # --- VECTOR BACKEND --- #
+        # qdrant, or memory to answer the searches in process from a snapshot
+        self.VECTOR_BACKEND: str = os.getenv("VECTOR_BACKEND", "qdrant")
+        # Empty to keep the snapshot in memory only
+        self.VECTOR_SNAPSHOT_PATH: str = os.getenv("VECTOR_SNAPSHOT_PATH", "")
+        self.VECTOR_REFRESH_INTERVAL: float = float(
+            os.getenv("VECTOR_REFRESH_INTERVAL", "60")
+        )
+        # Directory of Markdown extractions the memory backend is built from when
+        # neither Qdrant nor the snapshot are available, e.g. data/extractions offline
+        self.VECTOR_SEED_DIR: str = os.getenv("VECTOR_SEED_DIR", "")
+
+        # --- EMBEDDING MODEL --- #
+        # torch, onnx or onnx-int8 (the last two need the `onnx` extra),
+        # or hash for offline load tests, without any model
+        self.ENCODER_BACKEND: str = os.getenv("ENCODER_BACKEND", "torch")
+        # Intra-op threads per model, 0 for the runtime default (all the cores):
+        # with several workers per node, keep workers * threads <= cores
+        self.ENCODER_THREADS: int = int(os.getenv("ENCODER_THREADS", "0"))
+        self.ENCODER_QUANTIZATION_CONFIG: str = os.getenv(
+            "ENCODER_QUANTIZATION_CONFIG", "avx2"
+        )
+
+        # --- AGENT MODELS --- #
+        # "stub" for the offline stub model of the load tests
+        self.FAQ_AGENT_MODEL: str = os.getenv("FAQ_AGENT_MODEL", "openai:gpt-4.1")
+        # Simulated latency of each call of the stub model
+        self.STUB_LLM_LATENCY_MS: float = float(os.getenv("STUB_LLM_LATENCY_MS", "0"))
+        # Grader of the answers of the evaluation runs (plum-eval answers)
+        self.EVAL_JUDGE_MODEL: str = os.getenv(
+            "EVAL_JUDGE_MODEL", "openai:gpt-4.1-mini"
+        )
+
+        # --- RETRIEVAL CONTEXT --- #
+        # Maximum tokens of the documents returned by a query_vector_db call
+        self.CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+        self.CONTEXT_TOKENIZER_MODEL: str = os.getenv(
+            "CONTEXT_TOKENIZER_MODEL", "gpt-4.1"
+        )
+
+        # --- HISTORY COMPACTION --- #
+        # Defaults of the agents, which can override them
+        self.HISTORY_KEEP_TURNS: int = int(os.getenv("HISTORY_KEEP_TURNS", "4"))
+        # 0 disables the summarization of the older turns
+        self.HISTORY_SUMMARIZE_EVERY: int = int(
+            os.getenv("HISTORY_SUMMARIZE_EVERY", "6")
+        )
+        self.HISTORY_TOOL_OUTPUT_MAX_CHARS: int = int(
+            os.getenv("HISTORY_TOOL_OUTPUT_MAX_CHARS", "300")
+        )
+        self.HISTORY_SUMMARY_MODEL: str = os.getenv(
+            "HISTORY_SUMMARY_MODEL", "openai:gpt-4.1-mini"
+        )
+
+        # --- EMBEDDING CACHE --- #
+        self.EMBEDDING_CACHE_SIZE: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+        self.EMBEDDING_CACHE_TTL: float = float(
+            os.getenv("EMBEDDING_CACHE_TTL", str(24 * 60 * 60))
+        )
+        # Empty to keep the cache in memory only
+        self.EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH", "")
+
+        # --- ANSWER CACHE --- #
+        self.ANSWER_CACHE_ENABLED: bool = (
+            os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+        )
+        self.ANSWER_CACHE_THRESHOLD: float = float(
+            os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")
+        )
+        self.ANSWER_CACHE_SIZE: int = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+        self.ANSWER_CACHE_TTL: float = float(
+            os.getenv("ANSWER_CACHE_TTL", str(24 * 60 * 60))
+        )
+        self.ANSWER_CACHE_VERSION_CHECK_INTERVAL: float = float(
+            os.getenv("ANSWER_CACHE_VERSION_CHECK_INTERVAL", "60")
+        )
+
+        # --- THREAD STATUS --- #
+        # Threads whose status (started, interrupted) is tracked in memory
+        self.THREAD_STATUS_CACHE_SIZE: int = int(
+            os.getenv("THREAD_STATUS_CACHE_SIZE", "10000")
+        )
 
         # --- POSTGRES --- #
         self.POSTGRES_USER: str = os.getenv("POSTGRES_USER", "postgres")
@@ -36,6 +127,95 @@ class Settings:
         self.POSTGRES_SERVER: str = os.getenv("POSTGRES_SERVER", "server")
         self.POSTGRES_PORT: str = os.getenv("POSTGRES_PORT", "5432")
         self.POSTGRES_URL: str = f"postgresql+psycopg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
+        self.POSTGRES_POOL_SIZE: int = int(os.getenv("POSTGRES_POOL_SIZE", "10"))
+        self.POSTGRES_MAX_OVERFLOW: int = int(os.getenv("POSTGRES_MAX_OVERFLOW", "10"))
+        self.POSTGRES_POOL_TIMEOUT: float = float(
+            os.getenv("POSTGRES_POOL_TIMEOUT", "30")
+        )
+        self.POSTGRES_POOL_RECYCLE: int = int(
+            os.getenv("POSTGRES_POOL_RECYCLE", "1800")
+        )
+
+        # --- CHECKPOINTER --- #
+        # "memory" or "postgres"
+        self.CHECKPOINTER_BACKEND: str = os.getenv("CHECKPOINTER_BACKEND", "postgres")
+        self.CHECKPOINTER_POSTGRES_URL: str = f"postgresql://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
+        self.CHECKPOINTER_POOL_MIN_SIZE: int = int(
+            os.getenv("CHECKPOINTER_POOL_MIN_SIZE", "1")
+        )
+        self.CHECKPOINTER_POOL_MAX_SIZE: int = int(
+            os.getenv("CHECKPOINTER_POOL_MAX_SIZE", "10")
+        )
+        self.CHECKPOINTER_HOT_CACHE_SIZE: int = int(
+            os.getenv("CHECKPOINTER_HOT_CACHE_SIZE", "256")
+        )
+        # Threads of open chats without activity for this long are evicted too,
+        # 0 to only evict the threads of closed chats
+        self.CHECKPOINTER_IDLE_TTL: float = float(
+            os.getenv("CHECKPOINTER_IDLE_TTL", "0")
+        )
+        self.CHECKPOINTER_SWEEP_INTERVAL: float = float(
+            os.getenv("CHECKPOINTER_SWEEP_INTERVAL", str(10 * 60))
+        )
+
+        # --- DEPLOYMENT --- #
+        # Webserver worker processes started by entrypoint.sh; above 1 requires the
+        # postgres checkpointer and a shared store
+        self.WORKERS: int = int(os.getenv("WORKERS", "1"))
+        # State shared by the workers (thread statuses, latest checkpoints, cached
+        # answers, rate-limit counters): "memory://" (this process only),
+        # "sqlite:///<path>" (the workers of one host) or "redis://host:port/db"
+        self.SHARED_STORE_URL: str = os.getenv("SHARED_STORE_URL", "memory://")
+        # Seconds the thread statuses and latest checkpoint ids are kept in the shared store
+        self.SHARED_STATE_TTL: float = float(
+            os.getenv("SHARED_STATE_TTL", str(24 * 60 * 60))
+        )
+
+        # --- RATE LIMIT --- #
+        # Agent requests allowed per client and window, 0 disables the limit
+        self.RATE_LIMIT_REQUESTS: int = int(os.getenv("RATE_LIMIT_REQUESTS", "0"))
+        self.RATE_LIMIT_WINDOW: float = float(os.getenv("RATE_LIMIT_WINDOW", "60"))
+
+        # --- TRACING --- #
+        # "none", "log" (a JSON line per request) or "otlp" (requires the `tracing` extra)
+        self.TRACING_EXPORTER: str = os.getenv("TRACING_EXPORTER", "none")
+        self.TRACING_OTLP_ENDPOINT: str = os.getenv(
+            "TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces"
+        )
+        # Attach the timings of each request to the response metadata
+        self.TRACING_DEBUG: bool = os.getenv("TRACING_DEBUG", "false").lower() == "true"
+
+        # --- MONITORING --- #
+        # Seconds the result of the dependency health probes is reused for
+        self.HEALTH_CACHE_TTL: float = float(os.getenv("HEALTH_CACHE_TTL", "5"))
+        self.HEALTH_PROBE_TIMEOUT: float = float(os.getenv("HEALTH_PROBE_TIMEOUT", "2"))
+        # Seconds between two event loop lag measurements, 0 disables them
+        self.EVENT_LOOP_LAG_INTERVAL: float = float(
+            os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.5")
+        )
+
+        # --- LOGGING --- #
+        self.LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+        # Per-logger levels, e.g. "plum_chatbot.agents=DEBUG,httpx=WARNING"
+        self.LOG_LEVELS: str = os.getenv("LOG_LEVELS", "")
+        # "text" or "json" (a JSON object per line, with the correlation ids)
+        self.LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text")
+        # Rotation of logs/application.log: "size" or "time"
+        self.LOG_FILE_ROTATION: str = os.getenv("LOG_FILE_ROTATION", "size")
+        self.LOG_FILE_MAX_BYTES: int = int(
+            os.getenv("LOG_FILE_MAX_BYTES", str(10 * 1024 * 1024))
+        )
+        # When the time rotation happens, see logging.handlers.TimedRotatingFileHandler
+        self.LOG_FILE_ROTATE_WHEN: str = os.getenv("LOG_FILE_ROTATE_WHEN", "midnight")
+        self.LOG_FILE_BACKUPS: int = int(os.getenv("LOG_FILE_BACKUPS", "7"))
+
+        # --- REQUEST LOG --- #
+        # JSONL file the /agent/invoke requests are recorded to, for replays; empty disables it
+        self.REQUEST_LOG_PATH: str = os.getenv("REQUEST_LOG_PATH", "")
+        self.REQUEST_LOG_MAX_BYTES: int = int(
+            os.getenv("REQUEST_LOG_MAX_BYTES", str(50 * 1024 * 1024))
+        )
+        self.REQUEST_LOG_BACKUPS: int = int(os.getenv("REQUEST_LOG_BACKUPS", "5"))
 
         # --- LANGSMITH --- #
         self.LANGSMITH_API_KEY: str = os.getenv("LANGSMITH_API_KEY", "")
@@ -0,0 +1,55 @@
+import logging
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from threading import Lock
+
+
+class StartupReport:
+    """
+    Durations of the startup phases of the application (imports, model loads,
+    client connections, agent builds), in seconds.
+    """
+
+    def __init__(self):
+        self.phases: dict[str, float] = {}
+        self.started_at = time.perf_counter()
+        self._lock = Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def record(self, phase: str, seconds: float):
+        """
+        Record the duration of a startup phase.
+
+        :param phase: Name of the phase, e.g. `import` or `connect:qdrant`.
+        :param seconds: Duration of the phase.
+        """
+        with self._lock:
+            self.phases[phase] = round(seconds, 4)
+
+    @contextmanager
+    def measure(self, phase: str) -> Iterator[None]:
+        """
+        Measure the duration of the enclosed block as a startup phase.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - started)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "phases": dict(self.phases),
+                "since_start": round(time.perf_counter() - self.started_at, 4),
+            }
+
+    def log(self):
+        report = ", ".join(
+            f"{phase}={seconds:.3f}s" for phase, seconds in self.phases.items()
+        )
+        self.logger.info("Startup report: %s", report)
+
+
+startup_report = StartupReport()
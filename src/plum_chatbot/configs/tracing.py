@@ -0,0 +1,306 @@
+import json
+import logging
+import os
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+from plum_chatbot.configs.settings import Settings
+
+TRACING_EXPORTERS = ("none", "log", "otlp")
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """
+    A timed operation of a request, named and attributed after the OpenTelemetry spans.
+    """
+
+    def __init__(
+        self,
+        trace: "Trace",
+        name: str,
+        parent: "Span | None" = None,
+        attributes: dict[str, Any] | None = None,
+    ):
+        self.trace = trace
+        self.name = name
+        self.parent = parent
+        self.span_id = os.urandom(8).hex()
+        self.attributes: dict[str, Any] = dict(attributes or {})
+        self.error: str | None = None
+        self.start = time.perf_counter()
+        self.end_time: float | None = None
+
+    @property
+    def is_recording(self) -> bool:
+        return True
+
+    @property
+    def duration(self) -> float:
+        return (self.end_time or time.perf_counter()) - self.start
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: dict[str, Any]):
+        self.attributes.update(attributes)
+
+    def record_exception(self, exception: BaseException):
+        self.error = f"{type(exception).__name__}: {exception}"
+
+    def end(self):
+        if self.end_time is None:
+            self.end_time = time.perf_counter()
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "start_ms": round((self.start - self.trace.start) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+            **({"attributes": self.attributes} if self.attributes else {}),
+            **({"error": self.error} if self.error else {}),
+        }
+
+
+class _NoOpSpan:
+    """
+    Span returned when tracing is disabled: every operation is a no-op.
+    """
+
+    trace = None
+    is_recording = False
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, attributes: dict[str, Any]):
+        pass
+
+    def record_exception(self, exception: BaseException):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = _NoOpSpan()
+
+
+class Trace:
+    """
+    The spans of a request, rooted in the span that started it.
+    """
+
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.start = time.perf_counter()
+        # Wall clock of the start, the spans only measure relative perf counter times
+        self.start_ns = time.time_ns()
+        self.spans: list[Span] = []
+
+    def start_span(
+        self,
+        name: str,
+        parent: Span | None = None,
+        attributes: dict[str, Any] | None = None,
+    ) -> Span:
+        span = Span(self, name, parent, attributes)
+        self.spans.append(span)
+        return span
+
+    def time_ns(self, perf_time: float) -> int:
+        return self.start_ns + int((perf_time - self.start) * 1e9)
+
+    def breakdown(self) -> dict:
+        """
+        Timings of the spans of the trace, in milliseconds from the start of the request.
+        """
+        return {
+            "trace_id": self.trace_id,
+            "total_ms": round(self.spans[0].duration * 1000, 3) if self.spans else 0.0,
+            "spans": [span.as_dict() for span in self.spans],
+        }
+
+
+class LogExporter:
+    """
+    Export each trace as a JSON line of the `plum_chatbot.traces` logger.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger("plum_chatbot.traces")
+
+    def export(self, trace: Trace):
+        self.logger.info(json.dumps(trace.breakdown(), default=str))
+
+    def shutdown(self):
+        pass
+
+
+class OtlpExporter:
+    """
+    Export the traces to an OpenTelemetry collector, over OTLP/HTTP.
+    Requires the `tracing` extra.
+    """
+
+    def __init__(self, endpoint: str, service_name: str = "plum-chatbot"):
+        """
+        :param endpoint: The OTLP/HTTP traces endpoint, e.g. `http://localhost:4318/v1/traces`.
+        :param service_name: The service name of the exported spans.
+        """
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+        self.provider = TracerProvider(
+            resource=Resource.create({"service.name": service_name})
+        )
+        self.provider.add_span_processor(
+            BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint))
+        )
+        self.tracer = self.provider.get_tracer("plum_chatbot")
+
+    def export(self, trace: Trace):
+        from opentelemetry import trace as otel_trace
+        from opentelemetry.trace import Status, StatusCode
+
+        # Parents start before their children, so they are always exported first
+        exported: dict[str, Any] = {}
+        for span in trace.spans:
+            parent = exported.get(span.parent.span_id) if span.parent else None
+            otel_span = self.tracer.start_span(
+                span.name,
+                context=otel_trace.set_span_in_context(parent) if parent else None,
+                attributes={
+                    key: value
+                    if isinstance(value, (str, bool, int, float))
+                    else str(value)
+                    for key, value in span.attributes.items()
+                },
+                start_time=trace.time_ns(span.start),
+            )
+            if span.error:
+                otel_span.set_status(Status(StatusCode.ERROR, span.error))
+            otel_span.end(end_time=trace.time_ns(span.start + span.duration))
+            exported[span.span_id] = otel_span
+
+    def shutdown(self):
+        self.provider.shutdown()
+
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    Per-request span instrumentation, with an OpenTelemetry-like interface.
+
+    The first span opened in a context starts a trace, exported when it ends; the
+    spans opened below it, in the same task or in tasks created from it, join the
+    trace. With no exporter and no debug timings, spans are no-ops.
+    """
+
+    exporter: LogExporter | OtlpExporter | None
+    debug: bool
+
+    def __init__(
+        self,
+        exporter: LogExporter | OtlpExporter | None = None,
+        debug: bool = False,
+    ):
+        """
+        :param exporter: Where the traces are exported, None to only keep them in memory.
+        :param debug: Attach the timings of each request to its response metadata.
+        """
+        self.exporter = exporter
+        self.debug = debug
+
+    @classmethod
+    def from_settings(cls) -> "Tracer":
+        settings = Settings()
+        if settings.TRACING_EXPORTER not in TRACING_EXPORTERS:
+            raise ValueError(
+                f"Unknown tracing exporter {settings.TRACING_EXPORTER}, "
+                f"expected one of {TRACING_EXPORTERS}"
+            )
+        exporter: LogExporter | OtlpExporter | None = None
+        if settings.TRACING_EXPORTER == "log":
+            exporter = LogExporter()
+        elif settings.TRACING_EXPORTER == "otlp":
+            try:
+                exporter = OtlpExporter(settings.TRACING_OTLP_ENDPOINT)
+            except ImportError as e:
+                logger.warning(
+                    "OpenTelemetry not installed (%s), exporting the traces to the log.",
+                    e,
+                )
+                exporter = LogExporter()
+        return cls(exporter=exporter, debug=settings.TRACING_DEBUG)
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None or self.debug
+
+    @staticmethod
+    def current_span() -> Span | None:
+        return _current_span.get()
+
+    def current_breakdown(self) -> dict | None:
+        """
+        Timings of the current request, if the debug timings are enabled.
+        """
+        span = _current_span.get()
+        return span.trace.breakdown() if self.debug and span is not None else None
+
+    @contextmanager
+    def start_as_current_span(
+        self, name: str, attributes: dict[str, Any] | None = None
+    ) -> Iterator[Span | _NoOpSpan]:
+        """
+        Time the enclosed block as a span, child of the current one.
+        """
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        parent = _current_span.get()
+        trace = parent.trace if parent is not None else Trace()
+        span = trace.start_span(name, parent, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            span.end()
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # A generator closed from another context, e.g. a dropped stream
+                _current_span.set(parent)
+            if parent is None:
+                self._export(trace)
+
+    def _export(self, trace: Trace):
+        if self.exporter is None:
+            return
+        try:
+            self.exporter.export(trace)
+        except Exception as e:
+            logger.error("Trace export failed: %s", e)
+
+    def shutdown(self):
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+
+tracer = Tracer.from_settings()
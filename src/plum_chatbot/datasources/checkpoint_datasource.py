@@ -0,0 +1,385 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterator, Sequence
+from datetime import datetime, timedelta
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    copy_checkpoint,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.memory import MemorySaver
+
+from plum_chatbot.datasources.base_datasource import BaseDatasource
+from plum_chatbot.datasources.parameters import CheckpointParameters
+from plum_chatbot.datasources.shared_store import SharedStore
+
+
+class HotCacheCheckpointSaver(BaseCheckpointSaver):
+    """
+    Checkpointer delegating to a backend saver, with an in-process LRU of the latest
+    checkpoint of the most recently active threads.
+
+    The cache is write-through: the checkpoint saved at the end of a run is what the
+    next run of the same thread reads first, so active threads skip a backend read.
+    Checkpoints with pending writes are never cached, and the backend can be swapped
+    once it is set up, since the agent graphs are compiled before the lifespan runs.
+
+    With a shared store, the id of the latest checkpoint of each thread is published
+    there, and a cached checkpoint is only used while it is still the latest one: a
+    thread which ran on another worker since, or has pending writes, is read from the
+    backend.
+    """
+
+    backend: BaseCheckpointSaver
+    max_size: int
+    store: SharedStore | None
+    ttl: float
+
+    def __init__(
+        self,
+        backend: BaseCheckpointSaver,
+        max_size: int = 256,
+        store: SharedStore | None = None,
+        ttl: float = 24 * 60 * 60,
+    ):
+        super().__init__(serde=backend.serde)
+        self.backend = backend
+        self.max_size = max_size
+        self.store = store if store is not None and store.shared else None
+        self.ttl = ttl
+        self._latest: OrderedDict[tuple[str, str], CheckpointTuple] = OrderedDict()
+
+    def set_backend(self, backend: BaseCheckpointSaver):
+        self.backend = backend
+        self.serde = backend.serde
+        self._latest.clear()
+
+    @property
+    def config_specs(self) -> list:
+        return self.backend.config_specs
+
+    @staticmethod
+    def _key(config: RunnableConfig) -> tuple[str, str]:
+        configurable = config["configurable"]
+        return str(configurable["thread_id"]), configurable.get("checkpoint_ns", "")
+
+    @staticmethod
+    def _store_key(key: tuple[str, str]) -> str:
+        return f"checkpoint:{key[0]}:{key[1]}"
+
+    async def _is_latest(self, key: tuple[str, str], checkpoint_id: str) -> bool:
+        if self.store is None:
+            return True
+        return await self.store.get(self._store_key(key)) == checkpoint_id
+
+    def _cache(self, key: tuple[str, str], checkpoint_tuple: CheckpointTuple):
+        if self.max_size <= 0:
+            return
+        self._latest[key] = checkpoint_tuple
+        self._latest.move_to_end(key)
+        while len(self._latest) > self.max_size:
+            self._latest.popitem(last=False)
+
+    def evict(self, thread_id: str):
+        """
+        Drop the cached checkpoints of a thread.
+        """
+        for key in [key for key in self._latest if key[0] == thread_id]:
+            del self._latest[key]
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        if get_checkpoint_id(config):
+            return await self.backend.aget_tuple(config)
+        key = self._key(config)
+        if (cached := self._latest.get(key)) is not None:
+            if await self._is_latest(key, cached.checkpoint["id"]):
+                self._latest.move_to_end(key)
+                return cached
+            self._latest.pop(key, None)
+        checkpoint_tuple = await self.backend.aget_tuple(config)
+        if checkpoint_tuple is not None and not checkpoint_tuple.pending_writes:
+            self._cache(key, checkpoint_tuple)
+        return checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        next_config = await self.backend.aput(
+            config, checkpoint, metadata, new_versions
+        )
+        key = self._key(config)
+        cached = self._latest.get(key)
+        # Puts may complete out of order: only keep the most recent checkpoint
+        if cached is None or checkpoint["id"] > cached.checkpoint["id"]:
+            parent_id = get_checkpoint_id(config)
+            self._cache(
+                key,
+                CheckpointTuple(
+                    config=next_config,
+                    checkpoint=copy_checkpoint(checkpoint),
+                    metadata=dict(metadata),  # type: ignore[arg-type]
+                    parent_config=(
+                        {
+                            "configurable": {
+                                "thread_id": key[0],
+                                "checkpoint_ns": key[1],
+                                "checkpoint_id": parent_id,
+                            }
+                        }
+                        if parent_id
+                        else None
+                    ),
+                    pending_writes=[],
+                ),
+            )
+            if self.store is not None:
+                await self.store.set(self._store_key(key), checkpoint["id"], self.ttl)
+        return next_config
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await self.backend.aput_writes(config, writes, task_id, task_path)
+        key = self._key(config)
+        cached = self._latest.get(key)
+        if cached is not None and cached.checkpoint["id"] == get_checkpoint_id(config):
+            del self._latest[key]
+        if self.store is not None:
+            # The other workers read the checkpoint and its writes from the backend
+            await self.store.delete(self._store_key(key))
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        async for checkpoint_tuple in self.backend.alist(
+            config, filter=filter, before=before, limit=limit
+        ):
+            yield checkpoint_tuple
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self.evict(str(thread_id))
+        await self.backend.adelete_thread(thread_id)
+        if self.store is not None:
+            await self.store.delete(self._store_key((str(thread_id), "")))
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return self.backend.get_tuple(config)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        self.evict(self._key(config)[0])
+        return self.backend.put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self.evict(self._key(config)[0])
+        self.backend.put_writes(config, writes, task_id, task_path)
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        return self.backend.list(config, filter=filter, before=before, limit=limit)
+
+    def delete_thread(self, thread_id: str) -> None:
+        self.evict(str(thread_id))
+        self.backend.delete_thread(thread_id)
+
+    def get_next_version(self, current: Any, channel: None) -> Any:
+        return self.backend.get_next_version(current, channel)
+
+
+class CheckpointDatasource(BaseDatasource):
+    """
+    Datasource holding the LangGraph checkpointer shared by the agents.
+
+    The `memory` backend keeps the threads in process memory. The `postgres` backend
+    stores them with `AsyncPostgresSaver` on a pooled async connection, and evicts
+    the threads of closed chats in a periodic sweep, and those of idle chats if
+    `idle_ttl` is set.
+    """
+
+    saver: HotCacheCheckpointSaver
+    backend: str
+    postgres_url: str
+    pool_min_size: int
+    pool_max_size: int
+    idle_ttl: float
+    sweep_interval: float
+    logger: logging.Logger
+
+    # Threads with checkpoints whose chat was closed, or has been idle since the cutoff
+    # when idle chats are evicted
+    EXPIRED_THREADS_QUERY = """
+        SELECT c.id::text AS thread_id
+        FROM chats c
+        LEFT JOIN chat_messages m ON m.chat_id = c.id
+        WHERE c.id::text IN (SELECT DISTINCT thread_id FROM checkpoints)
+        GROUP BY c.id
+        HAVING bool_or(c.is_closed)
+            OR (
+                %(evict_idle)s
+                AND COALESCE(max(m.timestamp), max(c.created_at)) < %(cutoff)s
+            )
+    """
+
+    def __init__(
+        self,
+        config: CheckpointParameters,
+        store: SharedStore | None = None,
+        store_ttl: float = 24 * 60 * 60,
+    ):
+        """
+        :param config: The checkpointer parameters.
+        :param store: The store shared by the workers, to check the hot cache against.
+        :param store_ttl: Seconds the id of the latest checkpoint of a thread is kept in
+                          the store: past it, the thread is read from the backend.
+        """
+        super().__init__(name="CheckpointDatasource")
+        self.backend = config.backend
+        self.postgres_url = config.postgres_url
+        self.pool_min_size = config.pool_min_size
+        self.pool_max_size = config.pool_max_size
+        self.idle_ttl = config.idle_ttl
+        self.sweep_interval = config.sweep_interval
+        self.saver = HotCacheCheckpointSaver(
+            MemorySaver(),
+            max_size=config.hot_cache_size,
+            store=store,
+            ttl=store_ttl,
+        )
+        self.logger = logging.getLogger(__name__)
+
+        self._pool = None
+        self._sweeper: asyncio.Task | None = None
+
+    async def setup(self):
+        """
+        Set up the configured checkpointer backend.
+        """
+        if self.backend == "postgres":
+            # Imported lazily: only needed with the postgres backend
+            from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+            from psycopg.rows import dict_row
+            from psycopg_pool import AsyncConnectionPool
+
+            self._pool = AsyncConnectionPool(
+                self.postgres_url,
+                min_size=self.pool_min_size,
+                max_size=self.pool_max_size,
+                kwargs={
+                    "autocommit": True,
+                    "prepare_threshold": 0,
+                    "row_factory": dict_row,
+                },
+                open=False,
+            )
+            await self._pool.open()
+            postgres_saver = AsyncPostgresSaver(self._pool)  # type: ignore[arg-type]
+            await postgres_saver.setup()
+            self.saver.set_backend(postgres_saver)
+            if self.sweep_interval > 0:
+                self._sweeper = asyncio.create_task(self._sweep_forever())
+        elif self.backend != "memory":
+            raise ValueError(f"Unknown checkpointer backend: {self.backend}")
+        self.logger.info("Checkpointer initialized with the %s backend.", self.backend)
+
+    async def shutdown(self):
+        """
+        Stop the sweeper and close the connection pool.
+        """
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+        if self._pool is not None:
+            await self._pool.close()
+        self.logger.info("Checkpointer shut down successfully.")
+
+    def pool_stats(self) -> dict[str, int] | None:
+        """
+        Connections of the postgres backend pool, by state, None with the memory backend.
+        """
+        if self._pool is None:
+            return None
+        stats = self._pool.get_stats()
+        size, available = stats.get("pool_size", 0), stats.get("pool_available", 0)
+        return {
+            "checked_out": size - available,
+            "idle": available,
+            "waiting": stats.get("requests_waiting", 0),
+            "max": self.pool_max_size,
+        }
+
+    async def evict_thread(self, thread_id: str):
+        """
+        Delete every checkpoint of a thread, e.g. when its chat is closed.
+
+        :param thread_id: The thread (chat) ID.
+        """
+        await self.saver.adelete_thread(thread_id)
+
+    async def sweep(self) -> int:
+        """
+        Delete the checkpoints of closed chats and, if `idle_ttl` is set, of open chats
+        idle for longer than `idle_ttl`: their history is still shown to the user, so they
+        are only evicted on request.
+
+        :return: The number of evicted threads.
+        """
+        if self._pool is None:
+            return 0
+        parameters = {
+            "evict_idle": self.idle_ttl > 0,
+            "cutoff": datetime.now() - timedelta(seconds=self.idle_ttl),
+        }
+        async with self._pool.connection() as connection:
+            rows = await (
+                await connection.execute(self.EXPIRED_THREADS_QUERY, parameters)
+            ).fetchall()
+        for row in rows:
+            await self.evict_thread(row["thread_id"])
+        if rows:
+            self.logger.info("Evicted the checkpoints of %d threads.", len(rows))
+        return len(rows)
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                self.logger.error("Checkpoint sweep failed: %s", e)
@@ -0,0 +1,191 @@
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a query string so that trivially different spellings share a cache entry.
+
+    :param query: The query string.
+    :return: The case-folded query with collapsed whitespace.
+    """
+    return " ".join(query.casefold().split())
+
+
+class EmbeddingCache:
+    """
+    Bounded cache of query embeddings, keyed on the normalized query text and the model name.
+
+    Entries are evicted in LRU order once `max_size` is reached, and expire after
+    `ttl_seconds`. An optional SQLite file keeps the entries across restarts, and can
+    be shared by the workers of a host.
+    The cache is thread-safe, as encodes run on the encoder executor.
+    """
+
+    model_name: str
+    max_size: int
+    ttl_seconds: float
+    disk_path: Path | None
+    hits: int
+    disk_hits: int
+    misses: int
+    logger: logging.Logger
+
+    def __init__(
+        self,
+        model_name: str,
+        max_size: int = 1024,
+        ttl_seconds: float = 24 * 60 * 60,
+        disk_path: Path | None = None,
+    ):
+        """
+        Initialize the embedding cache.
+
+        :param model_name: Name of the embedding model, part of every cache key.
+        :param max_size: Maximum number of entries kept in memory, 0 disables the cache.
+        :param ttl_seconds: Time to live of an entry, in seconds.
+        :param disk_path: Optional SQLite file used as a persistent second tier.
+        """
+        self.model_name = model_name
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.logger = logging.getLogger(__name__)
+
+        self._entries: OrderedDict[str, tuple[float, np.ndarray]] = OrderedDict()
+        self._lock = Lock()
+        self._disk: sqlite3.Connection | None = None
+        if disk_path is not None:
+            self._open_disk(disk_path)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def _open_disk(self, disk_path: Path):
+        disk_path.parent.mkdir(parents=True, exist_ok=True)
+        # WAL and a busy timeout, as the workers of a host may share the file
+        self._disk = sqlite3.connect(disk_path, timeout=5, check_same_thread=False)
+        self._disk.execute("PRAGMA journal_mode=WAL")
+        self._disk.execute("PRAGMA synchronous=NORMAL")
+        self._disk.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, query TEXT NOT NULL, created_at REAL NOT NULL, "
+            "vector BLOB NOT NULL, PRIMARY KEY (model, query))"
+        )
+        self._disk.execute(
+            "DELETE FROM embeddings WHERE created_at < ?",
+            (time.time() - self.ttl_seconds,),
+        )
+        self._disk.commit()
+        self.logger.info("Embedding cache disk tier opened at %s.", disk_path)
+
+    def _expired(self, created_at: float) -> bool:
+        return time.time() - created_at > self.ttl_seconds
+
+    def lookup(self, query: str) -> np.ndarray | None:
+        """
+        Look up a query in the in-memory tier only. Cheap enough to run on the event loop.
+
+        :param query: The query string.
+        :return: The cached embedding, or None.
+        """
+        if not self.enabled:
+            return None
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created_at, vector = entry
+            if self._expired(created_at):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def get(self, query: str) -> np.ndarray | None:
+        """
+        Look up a query in the in-memory tier, then in the disk tier.
+        A miss on both tiers is counted as a cache miss.
+
+        :param query: The query string.
+        :return: The cached embedding, or None.
+        """
+        if not self.enabled:
+            return None
+        vector = self.lookup(query)
+        if vector is not None:
+            return vector
+
+        key = normalize_query(query)
+        with self._lock:
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT created_at, vector FROM embeddings WHERE model = ? AND query = ?",
+                    (self.model_name, key),
+                ).fetchone()
+                if row is not None and not self._expired(row[0]):
+                    vector = np.frombuffer(row[1], dtype=np.float32)
+                    self._store(key, row[0], vector)
+                    self.disk_hits += 1
+                    return vector
+            self.misses += 1
+        return None
+
+    def put(self, query: str, vector: np.ndarray):
+        """
+        Store the embedding of a query in both tiers.
+
+        :param query: The query string.
+        :param vector: The query embedding.
+        """
+        if not self.enabled:
+            return
+        key = normalize_query(query)
+        vector = np.asarray(vector, dtype=np.float32)
+        created_at = time.time()
+        with self._lock:
+            self._store(key, created_at, vector)
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)",
+                    (self.model_name, key, created_at, vector.tobytes()),
+                )
+                self._disk.commit()
+
+    def _store(self, key: str, created_at: float, vector: np.ndarray):
+        self._entries[key] = (created_at, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        Hit/miss counters of the cache.
+        """
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._disk is not None:
+                self._disk.close()
+                self._disk = None
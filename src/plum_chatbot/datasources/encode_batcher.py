@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import Executor
+
+import numpy as np
+
+
+class EncodeBatcher:
+    """
+    Async micro-batcher for query encodes.
+
+    Concurrent callers are queued for at most `max_wait_ms`, or until `max_batch_size`
+    queries are pending, then encoded together with a single model pass on the encoder
+    executor, and each caller gets its own embedding back. A forward pass over a batch
+    costs little more than over a single query, so under concurrent load this trades
+    a few milliseconds of queueing for a much higher encode throughput.
+    """
+
+    encode_fn: Callable[[list[str]], list[np.ndarray]]
+    executor: Executor
+    max_batch_size: int
+    max_wait_ms: float
+    batches: int
+    items: int
+    logger: logging.Logger
+
+    def __init__(
+        self,
+        encode_fn: Callable[[list[str]], list[np.ndarray]],
+        executor: Executor,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5,
+        window: int = 1024,
+    ):
+        """
+        Initialize the batcher.
+
+        :param encode_fn: Blocking function encoding a list of queries, run on the executor.
+        :param executor: The encoder executor.
+        :param max_batch_size: Maximum number of queries per batch.
+        :param max_wait_ms: Maximum time a query waits for the batch to fill, in milliseconds.
+        :param window: Number of recent samples kept for the fill-rate and delay metrics.
+        """
+        self.encode_fn = encode_fn
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batches = 0
+        self.items = 0
+        self.logger = logging.getLogger(__name__)
+
+        self._pending: list[tuple[str, asyncio.Future, float]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self._fill_rates: deque[float] = deque(maxlen=window)
+        self._queue_delays_ms: deque[float] = deque(maxlen=window)
+
+    async def encode(self, query: str) -> np.ndarray:
+        """
+        Encode a query as part of the next batch.
+
+        :param query: The query string.
+        :return: The query embedding.
+        """
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future = loop.create_future()
+        self._pending.append((query, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[: self.max_batch_size]
+            del self._pending[: self.max_batch_size]
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            # Keep a reference until done, tasks are only weakly referenced by the loop
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[str, asyncio.Future, float]]):
+        started = time.perf_counter()
+        # Identical queries of a batch are encoded once
+        queries = list(dict.fromkeys(query for query, _, _ in batch))
+        self.batches += 1
+        self.items += len(batch)
+        self._fill_rates.append(len(batch) / self.max_batch_size)
+        self._queue_delays_ms.extend(
+            (started - enqueued_at) * 1000 for _, _, enqueued_at in batch
+        )
+
+        loop = asyncio.get_running_loop()
+        try:
+            embeddings = await loop.run_in_executor(
+                self.executor, self.encode_fn, queries
+            )
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        by_query = dict(zip(queries, embeddings))
+        for query, future, _ in batch:
+            # The caller may have been cancelled while waiting
+            if not future.done():
+                future.set_result(by_query[query])
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        Batching metrics over the recent batches.
+        """
+        fill_rates = list(self._fill_rates)
+        delays = np.array(self._queue_delays_ms or [0.0])
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "avg_fill_rate": sum(fill_rates) / len(fill_rates) if fill_rates else 0.0,
+            "queue_delay_ms_avg": float(delays.mean()),
+            "queue_delay_ms_p95": float(np.percentile(delays, 95)),
+            "queue_delay_ms_max": float(delays.max()),
+        }
@@ -0,0 +1,201 @@
+import logging
+import zlib
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from plum_chatbot.configs.folders import MODELS_DIR
+from plum_chatbot.datasources.sparse_encoder import tokenize
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+ENCODER_BACKENDS = ("torch", "onnx", "onnx-int8", "hash")
+
+
+class HashingModel:
+    """
+    Stand-in for a sentence-transformers model, for offline load tests: a text is
+    embedded as the signed feature hashing of its BM25 terms and their bigrams.
+    Lexical only, and incompatible with the collections indexed by a real model.
+    """
+
+    def __init__(self, dimension: int = 768):
+        """
+        :param dimension: The embedding dimension.
+        """
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def _embed(self, text: str) -> np.ndarray:
+        terms = tokenize(text)
+        embedding = np.zeros(self.dimension, dtype=np.float32)
+        for feature in terms + [f"{a} {b}" for a, b in zip(terms, terms[1:])]:
+            digest = zlib.crc32(feature.encode("utf-8"))
+            embedding[digest % self.dimension] += 1.0 if digest & 1 << 31 else -1.0
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def encode_query(self, queries: list[str], **kwargs) -> np.ndarray:
+        return np.stack([self._embed(query) for query in queries])
+
+    def encode_document(self, documents: list[str], **kwargs) -> np.ndarray:
+        return np.stack([self._embed(document) for document in documents])
+
+
+class QueryEncoder:
+    """
+    Sentence-transformers encoder with a selectable runtime.
+
+    - `torch`: the full-precision PyTorch model.
+    - `onnx`: the same model exported to ONNX and run with ONNX Runtime.
+    - `onnx-int8`: the ONNX model with dynamically quantized int8 weights, exported once
+      to `models_dir` and reused by the next loads. Smaller and faster on CPU, at the
+      cost of a slight drift of the embeddings: keep the collection indexed with the
+      same backend as the queries, or check the retrieval quality first.
+    - `hash`: no model at all, see `HashingModel`. Only meant for offline load tests.
+    """
+
+    model: "SentenceTransformer | HashingModel"
+    model_name: str
+    backend: str
+    threads: int
+    quantization_config: str
+    models_dir: Path
+    logger: logging.Logger
+
+    def __init__(
+        self,
+        model_name: str,
+        backend: str = "torch",
+        threads: int = 0,
+        quantization_config: str = "avx2",
+        models_dir: Path = MODELS_DIR,
+    ):
+        """
+        Initialize the encoder, without loading the model.
+
+        :param model_name: The sentence-transformers model name.
+        :param backend: One of `torch`, `onnx`, `onnx-int8`, `hash`.
+        :param threads: Intra-op threads of the runtime, 0 for the runtime default.
+        :param quantization_config: Target instruction set of the int8 quantization:
+                                    `arm64`, `avx2`, `avx512` or `avx512_vnni`.
+        :param models_dir: Directory of the exported quantized models.
+        """
+        if backend not in ENCODER_BACKENDS:
+            raise ValueError(
+                f"Unknown encoder backend: {backend}, expected one of {ENCODER_BACKENDS}"
+            )
+        self.model_name = model_name
+        self.backend = backend
+        self.threads = threads
+        self.quantization_config = quantization_config
+        self.models_dir = models_dir
+        self.logger = logging.getLogger(__name__)
+
+    def load(self):
+        """
+        Load the model with the configured backend. Blocking: meant for a worker thread.
+        """
+        if self.backend == "hash":
+            self.model = HashingModel()
+            self.logger.info("Hashing encoder loaded, for offline use only.")
+            return
+
+        # Imported lazily: importing sentence_transformers loads torch
+        from sentence_transformers import SentenceTransformer
+
+        if self.backend == "torch":
+            if self.threads > 0:
+                import torch
+
+                torch.set_num_threads(self.threads)
+            self.model = SentenceTransformer(self.model_name, device="cpu")
+        elif self.backend == "onnx":
+            self.model = SentenceTransformer(
+                self.model_name, backend="onnx", model_kwargs=self._onnx_kwargs()
+            )
+        else:
+            self.model = self._load_quantized()
+        self.logger.info(
+            "Embedding model %s loaded with the %s backend.",
+            self.model_name,
+            self.backend,
+        )
+
+    @property
+    def embedding_model(self) -> str:
+        """
+        The model the embeddings come from: `model_name`, except with the `hash` backend.
+        """
+        return "feature-hashing" if self.backend == "hash" else self.model_name
+
+    def _onnx_kwargs(self, file_name: str | None = None) -> dict:
+        kwargs: dict = {"provider": "CPUExecutionProvider"}
+        if file_name is not None:
+            kwargs["file_name"] = file_name
+        if self.threads > 0:
+            import onnxruntime
+
+            session_options = onnxruntime.SessionOptions()
+            session_options.intra_op_num_threads = self.threads
+            session_options.inter_op_num_threads = 1
+            kwargs["session_options"] = session_options
+        return kwargs
+
+    def _load_quantized(self) -> "SentenceTransformer":
+        from sentence_transformers import (
+            SentenceTransformer,
+            export_dynamic_quantized_onnx_model,
+        )
+
+        model_dir = self.models_dir / self.model_name.replace("/", "__")
+        file_name = f"onnx/model_qint8_{self.quantization_config}.onnx"
+        if not (model_dir / file_name).exists():
+            self.logger.info(
+                "Exporting the int8 %s model to %s...",
+                self.quantization_config,
+                model_dir,
+            )
+            model = SentenceTransformer(
+                self.model_name, backend="onnx", model_kwargs=self._onnx_kwargs()
+            )
+            model.save(str(model_dir))
+            export_dynamic_quantized_onnx_model(
+                model, self.quantization_config, str(model_dir)
+            )
+        return SentenceTransformer(
+            str(model_dir), backend="onnx", model_kwargs=self._onnx_kwargs(file_name)
+        )
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()  # type: ignore[return-value]
+
+    def encode_queries(self, queries: list[str]) -> np.ndarray:
+        """
+        Encode query strings.
+
+        :param queries: The query strings.
+        :return: The embeddings, one row per query.
+        """
+        return np.asarray(self.model.encode_query(queries, show_progress_bar=False))
+
+    def encode_documents(
+        self, documents: list[str], batch_size: int = 32
+    ) -> np.ndarray:
+        """
+        Encode document texts for indexing.
+
+        :param documents: The document texts.
+        :param batch_size: Number of texts per model pass.
+        :return: The embeddings, one row per document.
+        """
+        return np.asarray(
+            self.model.encode_document(
+                documents, batch_size=batch_size, show_progress_bar=False
+            )
+        )
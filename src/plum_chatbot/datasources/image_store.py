@@ -0,0 +1,110 @@
+import base64
+import binascii
+import hashlib
+import logging
+import re
+from pathlib import Path
+
+from plum_chatbot.configs.folders import IMAGES_DIR
+
+IMAGE_REF_PREFIX = "image://"
+
+_DATA_URI_PATTERN = re.compile(r"^data:(image/[\w.+-]+);base64,(.*)$", re.DOTALL)
+
+
+class ImageStore:
+    """
+    Content-addressed side-store for the images extracted from the documents.
+
+    Images are written once as `<sha256>.<ext>` files and referenced from the Qdrant
+    payload with short `image://<sha256>.<ext>` references, so search results do not
+    carry the base64 blobs around.
+    """
+
+    root: Path
+    logger: logging.Logger
+
+    def __init__(self, root: Path = IMAGES_DIR):
+        """
+        Initialize the image store.
+
+        :param root: Directory where the image files are stored.
+        """
+        self.root = root
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def is_ref(value: str) -> bool:
+        return value.startswith(IMAGE_REF_PREFIX)
+
+    def put(self, image: str) -> str:
+        """
+        Store an image given as a `data:` URI and return its reference.
+        Values which are not `data:` URIs (references, paths, URLs) are returned as-is.
+
+        :param image: The image data URI.
+        :return: The image reference.
+        """
+        match = _DATA_URI_PATTERN.match(image)
+        if match is None:
+            return image
+        mime_type, encoded = match.groups()
+        try:
+            data = base64.b64decode(encoded, validate=False)
+        except binascii.Error:
+            self.logger.warning("Invalid base64 image data, keeping it inline.")
+            return image
+
+        extension = mime_type.split("/", 1)[1].split("+", 1)[0]
+        name = f"{hashlib.sha256(data).hexdigest()}.{extension}"
+        path = self.root / name
+        if not path.exists():
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(path.suffix + ".tmp")
+            tmp_path.write_bytes(data)
+            tmp_path.replace(path)
+        return f"{IMAGE_REF_PREFIX}{name}"
+
+    def get(self, ref: str) -> str:
+        """
+        Resolve an image reference into a `data:` URI.
+        Values which are not references are returned as-is.
+
+        :param ref: The image reference.
+        :return: The image data URI.
+        """
+        if not self.is_ref(ref):
+            return ref
+        name = ref.removeprefix(IMAGE_REF_PREFIX)
+        path = self.root / Path(name).name
+        extension = path.suffix.lstrip(".") or "png"
+        encoded = base64.b64encode(path.read_bytes()).decode("ascii")
+        return f"data:image/{extension};base64,{encoded}"
+
+    def externalize(self, images: dict[int, str]) -> dict[int, str]:
+        """
+        Move every inline image of a document into the store.
+
+        :param images: Mapping of image indices to data URIs.
+        :return: Mapping of image indices to image references.
+        """
+        return {idx: self.put(image) for idx, image in images.items()}
+
+
+if __name__ == "__main__":
+    import asyncio
+
+    from plum_chatbot.di_containers.datasources_containers import (
+        get_qdrant_datasource,
+    )
+
+    async def migrate():
+        datasource = get_qdrant_datasource()
+        await datasource.setup()
+        try:
+            updated = await datasource.externalize_images(ImageStore())
+            print(f"Moved the images of {updated} points to {IMAGES_DIR}")
+        finally:
+            await datasource.shutdown()
+
+    asyncio.run(migrate())
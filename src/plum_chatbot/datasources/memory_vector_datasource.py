@@ -0,0 +1,400 @@
+import asyncio
+import hashlib
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+from qdrant_client import models
+
+from plum_chatbot.configs.metrics import RETRIEVAL_DURATION
+from plum_chatbot.configs.startup import startup_report
+from plum_chatbot.configs.tracing import tracer
+from plum_chatbot.datasources.models.qdrant_models import QdrantDocument
+from plum_chatbot.datasources.parameters import QdrantParameters
+from plum_chatbot.datasources.qdrant_datasource import SEARCH_PAYLOAD, QdrantDatasource
+from plum_chatbot.datasources.sparse_encoder import SPARSE_VECTOR_NAME
+
+# Ranking constant of the Reciprocal Rank Fusion, the same as Qdrant's
+RRF_K = 2
+
+
+def _select_payload(payload: dict, with_payload: models.PayloadSelector | bool) -> dict:
+    if with_payload is True or not isinstance(
+        with_payload, models.PayloadSelectorInclude
+    ):
+        return payload
+    selected: dict = {}
+    for path in with_payload.include:
+        keys = path.split(".")
+        source, target = payload, selected
+        for key in keys[:-1]:
+            if not isinstance(source.get(key), dict):
+                break
+            source = source[key]
+            target = target.setdefault(key, {})
+        else:
+            if keys[-1] in source:
+                target[keys[-1]] = source[keys[-1]]
+    return selected
+
+
+class InMemoryVectorDatasource(QdrantDatasource):
+    """
+    Vector datasource answering the searches in process, from a snapshot of the collection.
+
+    At setup the points are scrolled from Qdrant into a contiguous, L2-normalized NumPy
+    matrix, so a top-k search is a single matrix-vector product. The snapshot can be
+    saved to disk and memory-mapped, and is loaded from there when Qdrant is not
+    reachable; failing that, it can be built from the Markdown extractions, which
+    lets the load tests run offline. It is refreshed in the background when the
+    collection version changes.
+    Meant for small collections: everything but the searches (encoding, caching,
+    ingestion) is inherited from `QdrantDatasource`.
+    """
+
+    snapshot_path: Path | None
+    refresh_interval: float
+    seed_dir: Path | None
+    version: str
+    ids: list[str]
+    payloads: list[dict]
+    matrix: np.ndarray
+
+    def __init__(
+        self,
+        config: QdrantParameters,
+        snapshot_path: Path | None = None,
+        refresh_interval: float = 60,
+        seed_dir: Path | None = None,
+    ):
+        """
+        Initialize the datasource.
+
+        :param config: The Qdrant parameters.
+        :param snapshot_path: Optional directory where the snapshot is saved and memory-mapped from.
+        :param refresh_interval: Seconds between two collection version checks, 0 disables them.
+        :param seed_dir: Optional directory of Markdown extractions to build the snapshot
+                         from, when neither Qdrant nor the snapshot are available.
+        """
+        super().__init__(config)
+        self.name = "InMemoryVectorDatasource"
+        self.snapshot_path = snapshot_path
+        self.refresh_interval = refresh_interval
+        self.seed_dir = seed_dir
+        self.version = ""
+        self.ids = []
+        self.payloads = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self._postings: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+        self._refresher: asyncio.Task | None = None
+
+    async def setup(self):
+        """
+        Set up the encoder and the clients, then load the snapshot.
+        """
+        await super().setup()
+        with startup_report.measure("snapshot:vectors"):
+            try:
+                await self.refresh()
+            except Exception as e:
+                if self.snapshot_path is not None and self.snapshot_path.exists():
+                    self.logger.warning(
+                        "Qdrant not reachable (%s), loading the snapshot.", e
+                    )
+                    self.load_snapshot(self.snapshot_path)
+                elif self.seed_dir is not None:
+                    self.logger.warning(
+                        "Qdrant not reachable (%s), seeding from %s.", e, self.seed_dir
+                    )
+                    await asyncio.get_running_loop().run_in_executor(
+                        self.encoder_executor, self.seed, self.seed_dir
+                    )
+                else:
+                    raise
+        if self.refresh_interval > 0:
+            self._refresher = asyncio.create_task(self._refresh_forever())
+
+    async def shutdown(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+        await super().shutdown()
+
+    async def aping(self):
+        """
+        The searches only need the snapshot: Qdrant is just the source of its refreshes.
+        """
+        if not self.ids:
+            raise RuntimeError("The snapshot is empty")
+
+    async def acollection_version(self, batch_size: int = 1024) -> str:
+        """
+        Version of the snapshot the searches are answered from.
+        """
+        return self.version
+
+    async def refresh(self, batch_size: int = 256) -> bool:
+        """
+        Take a new snapshot of the collection if its version changed.
+
+        :param batch_size: Number of points fetched per scroll request.
+        :return: Whether a new snapshot was taken.
+        """
+        version = await super().acollection_version()
+        if version == self.version:
+            return False
+
+        points: list[models.Record] = []
+        offset = None
+        while True:
+            batch, offset = await self.async_client.scroll(
+                self.collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            points.extend(batch)
+            if offset is None:
+                break
+
+        ids, payloads, dense, sparse = [], [], [], []
+        for point in points:
+            vectors = (
+                point.vector if isinstance(point.vector, dict) else {"": point.vector}
+            )
+            ids.append(str(point.id))
+            payloads.append(point.payload or {})
+            dense.append(vectors.get(""))
+            sparse_vector = vectors.get(SPARSE_VECTOR_NAME)
+            sparse.append(
+                (list(sparse_vector.indices), list(sparse_vector.values))
+                if isinstance(sparse_vector, models.SparseVector)
+                else ([], [])
+            )
+        self._load(version, ids, payloads, np.asarray(dense, dtype=np.float32), sparse)
+        if self.snapshot_path is not None:
+            self.save_snapshot(self.snapshot_path, sparse)
+        self.logger.info(
+            "Snapshot of %d points taken, version %s.", len(ids), version[:8]
+        )
+        return True
+
+    async def _refresh_forever(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.logger.error("Snapshot refresh failed: %s", e)
+
+    def _load(
+        self,
+        version: str,
+        ids: list[str],
+        payloads: list[dict],
+        matrix: np.ndarray,
+        sparse: list[tuple[list[int], list[float]]],
+    ):
+        if matrix.size and not isinstance(matrix, np.memmap):
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms == 0, 1, norms)
+
+        # Inverted index of the sparse vectors, weighted with the same IDF as Qdrant
+        postings: dict[int, tuple[list[int], list[float]]] = {}
+        for row, (indices, values) in enumerate(sparse):
+            for index, value in zip(indices, values):
+                docs, weights = postings.setdefault(index, ([], []))
+                docs.append(row)
+                weights.append(value)
+        n = len(ids)
+        compiled = {}
+        for index, (docs, weights) in postings.items():
+            idf = math.log((n - len(docs) + 0.5) / (len(docs) + 0.5) + 1)
+            compiled[index] = (np.asarray(docs), np.asarray(weights) * idf)
+
+        # Swapped in one go, searches in flight keep the previous snapshot
+        self.ids, self.payloads, self.matrix, self._postings, self.version = (
+            ids,
+            payloads,
+            np.ascontiguousarray(matrix),
+            compiled,
+            version,
+        )
+
+    def seed(self, seed_dir: Path):
+        """
+        Build the snapshot from the Markdown extractions of a directory, chunked and
+        encoded as the ingestion pipeline does. Blocking: meant for a worker thread.
+        """
+        # Imported lazily: only needed offline
+        from plum_chatbot.ingestion.chunker import chunk_markdown
+
+        chunks = [
+            chunk
+            for markdown_path in sorted(seed_dir.glob("*.md"))
+            for chunk in chunk_markdown(markdown_path)
+        ]
+        if not chunks:
+            raise ValueError(f"No Markdown extractions to seed from in {seed_dir}")
+        contents = [chunk.content for chunk in chunks]
+        sparse = [
+            (list(vector.indices), list(vector.values))
+            for vector in self.embed_sparse_documents(contents)
+        ]
+        version = hashlib.sha256(
+            "".join(sorted(chunk.id for chunk in chunks)).encode("utf-8")
+        ).hexdigest()
+        self._load(
+            version,
+            [chunk.id for chunk in chunks],
+            [chunk.payload() for chunk in chunks],
+            self.embed_documents(contents).astype(np.float32),
+            sparse,
+        )
+        self.logger.info("Snapshot of %d chunks seeded from %s.", len(chunks), seed_dir)
+
+    def save_snapshot(
+        self, path: Path, sparse: list[tuple[list[int], list[float]]] | None = None
+    ):
+        """
+        Save the snapshot to a directory: the matrix as `.npy`, the rest as JSON.
+        """
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "vectors.npy", self.matrix)
+        (path / "points.json").write_text(
+            json.dumps(
+                {
+                    "version": self.version,
+                    "ids": self.ids,
+                    "payloads": self.payloads,
+                    "sparse": sparse or [],
+                },
+                ensure_ascii=False,
+            ),
+            encoding="utf-8",
+        )
+
+    def load_snapshot(self, path: Path):
+        """
+        Load a snapshot saved by `save_snapshot`, memory-mapping its matrix.
+        """
+        data = json.loads((path / "points.json").read_text(encoding="utf-8"))
+        matrix = np.load(path / "vectors.npy", mmap_mode="r")
+        sparse = [tuple(entry) for entry in data["sparse"]] or [([], [])] * len(
+            data["ids"]
+        )
+        self._load(data["version"], data["ids"], data["payloads"], matrix, sparse)  # type: ignore[arg-type]
+        self.logger.info("Snapshot of %d points loaded from %s.", len(self.ids), path)
+
+    def _dense_ranking(self, embedding: np.ndarray, limit: int) -> np.ndarray:
+        if not self.ids:
+            return np.zeros(0, dtype=int)
+        scores = self.matrix @ (embedding / (np.linalg.norm(embedding) or 1))
+        return self._top_k(scores, limit)
+
+    def _sparse_ranking(self, query: str, limit: int) -> np.ndarray:
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        query_vector = self.sparse_encoder.encode_query(query)
+        for index, value in zip(query_vector.indices, query_vector.values):
+            if (posting := self._postings.get(index)) is not None:
+                np.add.at(scores, posting[0], posting[1] * value)
+        matched = np.flatnonzero(scores)
+        return matched[self._top_k(scores[matched], limit)]
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, limit: int) -> np.ndarray:
+        if len(scores) > limit:
+            candidates = np.argpartition(-scores, limit)[:limit]
+        else:
+            candidates = np.arange(len(scores))
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+    def _search(
+        self,
+        query: str,
+        embedding: np.ndarray,
+        limit: int,
+        with_payload: models.PayloadSelector | bool,
+        search_mode: str | None,
+    ) -> list[QdrantDocument]:
+        if (search_mode or self.search_mode) == "hybrid":
+            fused: dict[int, float] = {}
+            for ranking in (
+                self._dense_ranking(embedding, self.prefetch_limit),
+                self._sparse_ranking(query, self.prefetch_limit),
+            ):
+                for rank, row in enumerate(ranking.tolist()):
+                    fused[row] = fused.get(row, 0.0) + 1 / (RRF_K + rank)
+            rows = sorted(fused, key=fused.__getitem__, reverse=True)[:limit]
+        else:
+            rows = self._dense_ranking(embedding, limit).tolist()
+        return [
+            QdrantDocument.model_validate(
+                _select_payload(self.payloads[row], with_payload)
+            )
+            for row in rows
+        ]
+
+    def query(
+        self,
+        query: str,
+        limit: int = 2,
+        with_payload: models.PayloadSelector | bool = SEARCH_PAYLOAD,
+        search_mode: str | None = None,
+        **kwargs,
+    ) -> list[QdrantDocument]:
+        return self._search(
+            query, self.embed_query(query), limit, with_payload, search_mode
+        )
+
+    async def aquery(
+        self,
+        query: str,
+        limit: int = 2,
+        with_payload: models.PayloadSelector | bool = SEARCH_PAYLOAD,
+        search_mode: str | None = None,
+        **kwargs,
+    ) -> list[QdrantDocument]:
+        """
+        Query the snapshot. Only the encoding leaves the event loop: the search
+        itself is a matrix-vector product over a few hundred rows.
+        """
+        embedding = await self.aembed_query(query)
+        with (
+            tracer.start_as_current_span("memory.search", {"memory.limit": limit}),
+            RETRIEVAL_DURATION.labels("search").time(),
+        ):
+            return self._search(query, embedding, limit, with_payload, search_mode)
+
+    def query_batch(
+        self,
+        queries: list[str],
+        limit: int = 2,
+        with_payload: models.PayloadSelector | bool = SEARCH_PAYLOAD,
+        search_mode: str | None = None,
+    ) -> list[list[QdrantDocument]]:
+        embeddings = self.embed_queries(queries) if queries else []
+        return [
+            self._search(query, embedding, limit, with_payload, search_mode)
+            for query, embedding in zip(queries, embeddings)
+        ]
+
+    async def aquery_batch(
+        self,
+        queries: list[str],
+        limit: int = 2,
+        with_payload: models.PayloadSelector | bool = SEARCH_PAYLOAD,
+        search_mode: str | None = None,
+    ) -> list[list[QdrantDocument]]:
+        embeddings = await self.aembed_queries(queries) if queries else []
+        with (
+            tracer.start_as_current_span(
+                "memory.search", {"memory.queries": len(queries)}
+            ),
+            RETRIEVAL_DURATION.labels("search").time(),
+        ):
+            return [
+                self._search(query, embedding, limit, with_payload, search_mode)
+                for query, embedding in zip(queries, embeddings)
+            ]
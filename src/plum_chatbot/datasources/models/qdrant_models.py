@@ -1,12 +1,15 @@
 from re import sub
 from pydantic import BaseModel, Field
 
+from plum_chatbot.datasources.image_store import ImageStore
+
 
 class QdrantDocumentMetadata(BaseModel):
     source: str = Field(..., description="Source file path of the document")
     title: str = Field(..., description="Title of the document")
     images: dict[int, str] = Field(
-        ..., description="Mapping of image indices to their file paths"
+        default_factory=dict,
+        description="Mapping of image indices to their references in the image store",
     )
 
 
@@ -21,13 +24,19 @@ class QdrantDocument(BaseModel):
         description="Metadata associated with the document, including source and images",
     )
 
-    def substitute_images(self) -> str:
+    def substitute_images(self, image_store: ImageStore | None = None) -> str:
         """
         Reconstruct the content by replacing image references with actual image paths.
+        Image references are resolved lazily through the image store, only for the
+        images actually present in the content. The document must have been fetched
+        with its `metadata.images` payload.
         """
+        image_store = image_store or ImageStore()
 
         def replace_with_image(match):
             idx = int(match.group(1))
-            return f"![Image]({self.metadata.images[idx]})"
+            if idx not in self.metadata.images:
+                return match.group(0)
+            return f"![Image]({image_store.get(self.metadata.images[idx])})"
 
         return sub(r"!\[Image\]\((\d+)\)", replace_with_image, self.content)
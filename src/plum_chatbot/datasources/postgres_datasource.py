@@ -1,12 +1,19 @@
 import logging
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from uuid import UUID
 
-from sqlalchemy import Engine, create_engine, text
+from sqlalchemy import select, text
 from sqlalchemy.engine.result import Result
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.orm.session import Session
 from sqlalchemy.schema import Table
+from sqlalchemy.sql.elements import ColumnElement
 
 from plum_chatbot.datasources.base_datasource import BaseDatasource
 from plum_chatbot.datasources.parameters import PostgresParameters
@@ -17,16 +24,28 @@ BaseTable = declarative_base(name="BaseTable")
 class PostgresDatasource(BaseDatasource):
     """
     Datasource for PostgreSQL database.
+
+    Uses an async engine with a connection pool: callers open a session per request
+    with `session()` and pass it to the CRUD helpers. Each helper runs in its own
+    transaction, so a session never holds a pooled connection while idle.
     """
 
-    engine: Engine
-    session: Session
+    engine: AsyncEngine
+    session_factory: async_sessionmaker[AsyncSession]
     db_url: str
+    pool_size: int
+    max_overflow: int
+    pool_timeout: float
+    pool_recycle: int
     logger: logging.Logger
 
     def __init__(self, config: PostgresParameters):
         super().__init__(name="PostgresDatasource")
         self.db_url = config.postgres_url
+        self.pool_size = config.pool_size
+        self.max_overflow = config.max_overflow
+        self.pool_timeout = config.pool_timeout
+        self.pool_recycle = config.pool_recycle
 
         self.logger = logging.getLogger(__name__)
 
@@ -34,48 +53,93 @@ class PostgresDatasource(BaseDatasource):
         """
         Initialize the PostgreSQL client and ensure the connection is established.
         """
-        self.engine = create_engine(self.db_url)
-        self.session: Session = sessionmaker(bind=self.engine)()
-        BaseTable.metadata.create_all(bind=self.engine)
+        self.engine = create_async_engine(
+            self.db_url,
+            pool_size=self.pool_size,
+            max_overflow=self.max_overflow,
+            pool_timeout=self.pool_timeout,
+            pool_recycle=self.pool_recycle,
+            pool_pre_ping=True,
+        )
+        self.session_factory = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with self.engine.begin() as connection:
+            await connection.run_sync(BaseTable.metadata.create_all)
         self.logger.info("PostgreSQL client initialized successfully.")
 
     async def shutdown(self):
         """
         Clean up the PostgreSQL client.
         """
-        self.session.close()
-        self.engine.dispose()
+        await self.engine.dispose()
         self.logger.info("PostgreSQL client shut down successfully.")
 
-    def query(self, query: str, params: tuple = (), **kwargs) -> Result:
+    async def aping(self):
+        """
+        Check the database is reachable, with a round trip on a pooled connection.
+        """
+        async with self.engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    def pool_stats(self) -> dict[str, int]:
+        """
+        Connections of the engine pool, by state, and the overflow connections among
+        the checked out ones. The queue pool does not expose its waiting requests.
+        """
+        pool = self.engine.pool
+        return {
+            "checked_out": pool.checkedout(),  # type: ignore[attr-defined]
+            "idle": pool.checkedin(),  # type: ignore[attr-defined]
+            # Negative while the pool is not full: the connections left before overflowing
+            "overflow": max(pool.overflow(), 0),  # type: ignore[attr-defined]
+            "max": self.pool_size + self.max_overflow,
+        }
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[AsyncSession]:
+        """
+        Open a new session on the connection pool.
+        """
+        async with self.session_factory() as session:
+            yield session
+
+    async def aquery(
+        self, query: str, session: AsyncSession, params: dict | None = None, **kwargs
+    ) -> Result:
         """
         Execute a query against the PostgreSQL database.
 
         :param query: The SQL query to execute.
+        :param session: The session to run the query in.
         :param params: Parameters for the SQL query.
         :return: Query results.
         """
-        # with self.session.begin():
-        result: Result = self.session.execute(text(query), params)
-        return result
+        try:
+            result: Result = await session.execute(text(query), params or {})
+            await session.commit()
+            return result
+        except Exception as e:
+            await session.rollback()
+            raise e
 
-    def insert(self, table: Table):
+    async def insert(self, session: AsyncSession, table: Table):
         """
         Insert a new record into the specified table.
 
+        :param session: The session to run the insert in.
         :param table: An instance of a SQLAlchemy model representing the table.
         """
         try:
-            self.session.add(table)
-            self.session.commit()
+            session.add(table)
+            await session.commit()
         except Exception as e:
-            self.session.rollback()
+            await session.rollback()
             raise e
 
-    def all(
+    async def all(
         self,
+        session: AsyncSession,
         table: BaseTable,  # type: ignore
-        condition: str | None = None,
+        condition: str | ColumnElement[bool] | None = None,
         order_by=None,
         limit=None,
         offset=None,
@@ -83,6 +147,7 @@ class PostgresDatasource(BaseDatasource):
         """
         Retrieve records from the specified table with optional filtering and sorting.
 
+        :param session: The session to run the query in.
         :param table: A SQLAlchemy model class representing the table.
         :param condition: Optional SQLAlchemy filter condition (where clause).
         :param order_by: Optional column or list of columns to order by.
@@ -90,10 +155,12 @@ class PostgresDatasource(BaseDatasource):
         :param offset: Optional offset for pagination.
         :return: List of records matching the criteria.
         """
-        query = self.session.query(table)
+        query = select(table)
 
         if condition is not None:
-            query = query.filter(text(condition))
+            query = query.where(
+                text(condition) if isinstance(condition, str) else condition
+            )
 
         if order_by is not None:
             if isinstance(order_by, list):
@@ -108,38 +175,52 @@ class PostgresDatasource(BaseDatasource):
         if offset is not None:
             query = query.offset(offset)
 
-        return query.all()
+        records = (await session.scalars(query)).all()
+        await session.commit()
+        return records
 
-    def find(self, table: BaseTable, id: UUID):  # type: ignore
+    async def find(self, session: AsyncSession, table: BaseTable, id: UUID):  # type: ignore
         """
         Find a record by its ID in the specified table.
 
+        :param session: The session to run the query in.
         :param table: An instance of a SQLAlchemy model representing the table.
         :param id: The ID of the record to find.
         :return: The record if found, otherwise None.
         """
-        return self.session.query(table).filter(table.id == id).first()
+        record = await session.get(table, id)
+        await session.commit()
+        return record
 
-    def update(self, record: BaseTable, **kwargs):  # type: ignore
+    async def update(self, session: AsyncSession, record: BaseTable, **kwargs):  # type: ignore
         """
         Update a record in the specified table.
 
+        :param session: The session the record belongs to.
         :param record: The record instance to update.
         :param kwargs: Fields to update.
         """
         if record:
-            for key, value in kwargs.items():
-                setattr(record, key, value)
-            self.session.commit()
+            try:
+                for key, value in kwargs.items():
+                    setattr(record, key, value)
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                raise e
         else:
             raise ValueError("Cannot update a null record.")
 
-    def delete(self, record: BaseTable):  # type: ignore
+    async def delete(self, session: AsyncSession, record: BaseTable):  # type: ignore
         """
         Delete a record from the specified table.
         """
         if record:
-            self.session.delete(record)
-            self.session.commit()
+            try:
+                await session.delete(record)
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                raise e
         else:
             raise ValueError("Cannot delete a null record.")
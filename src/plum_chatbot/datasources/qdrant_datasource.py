@@ -1,13 +1,35 @@
+import asyncio
+import hashlib
 import logging
+from concurrent.futures import Future, ThreadPoolExecutor
 
 # from langchain_ollama import OllamaEmbeddings
 # from langchain_qdrant import QdrantVectorStore
 import numpy as np
-from qdrant_client import QdrantClient
-from sentence_transformers import SentenceTransformer
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+from qdrant_client.http.models import QueryResponse
+
+from plum_chatbot.configs.metrics import RETRIEVAL_DURATION
+from plum_chatbot.configs.startup import startup_report
+from plum_chatbot.configs.tracing import tracer
 from plum_chatbot.datasources.base_datasource import BaseDatasource
+from plum_chatbot.datasources.embedding_cache import EmbeddingCache
+from plum_chatbot.datasources.encode_batcher import EncodeBatcher
+from plum_chatbot.datasources.encoders import QueryEncoder
+from plum_chatbot.datasources.image_store import ImageStore
 from plum_chatbot.datasources.models.qdrant_models import QdrantDocument
 from plum_chatbot.datasources.parameters import QdrantParameters
+from plum_chatbot.datasources.sparse_encoder import (
+    SPARSE_VECTOR_NAME,
+    BM25SparseEncoder,
+)
+
+# Payload returned by searches: image references are only needed when rendering
+SEARCH_PAYLOAD = models.PayloadSelectorInclude(
+    include=["id", "content", "metadata.source", "metadata.title"]
+)
+
+SEARCH_MODES = ("dense", "hybrid")
 
 
 class QdrantDatasource(BaseDatasource):
@@ -15,14 +37,25 @@ class QdrantDatasource(BaseDatasource):
     Datasource for Qdrant vector database.
     """
 
-    embeddings_model: SentenceTransformer
+    encoder: QueryEncoder
+    sparse_encoder: BM25SparseEncoder
+    model_loading: Future
     client: QdrantClient
+    async_client: AsyncQdrantClient
+    encoder_executor: ThreadPoolExecutor
+    embedding_cache: EmbeddingCache
+    encode_batcher: EncodeBatcher | None
     # vector_store: QdrantVectorStore
     embedding_model_name: str
     model_url: str
     qdrant_url: str
     api_key: str
     collection_name: str
+    encode_workers: int
+    encode_batch_size: int
+    encode_batch_wait_ms: float
+    search_mode: str
+    prefetch_limit: int
     logger: logging.Logger
 
     def __init__(self, config: QdrantParameters):
@@ -32,20 +65,49 @@ class QdrantDatasource(BaseDatasource):
         self.qdrant_url = config.qdrant_url
         self.api_key = config.api_key
         self.collection_name = config.collection_name
+        self.encode_workers = config.encode_workers
+        self.encode_batch_size = config.encode_batch_size
+        self.encode_batch_wait_ms = config.encode_batch_wait_ms
+        self.encode_batcher = None
+        self.encoder = QueryEncoder(
+            model_name=config.embedding_model_name,
+            backend=config.encoder_backend,
+            threads=config.encoder_threads,
+            quantization_config=config.quantization_config,
+        )
+        self.sparse_encoder = BM25SparseEncoder()
+        if config.search_mode not in SEARCH_MODES:
+            raise ValueError(
+                f"Unknown search mode: {config.search_mode}, expected one of {SEARCH_MODES}"
+            )
+        self.search_mode = config.search_mode
+        self.prefetch_limit = config.prefetch_limit
+        self.embedding_cache = EmbeddingCache(
+            model_name=f"{config.embedding_model_name}:{config.encoder_backend}",
+            max_size=config.embedding_cache_size,
+            ttl_seconds=config.embedding_cache_ttl,
+            disk_path=config.embedding_cache_path,
+        )
         self.logger = logging.getLogger(__name__)
 
     async def setup(self):
         """
         Initialize the Qdrant client and ensure the collection exists.
+        The embedding model is loaded in the background: see `model_ready`.
         """
         # self.embeddings = OllamaEmbeddings(
         #     model=self.embedding_model_name, base_url=self.model_url
         # )
-        self.embeddings_model = SentenceTransformer(self.embedding_model_name)
 
-        self.client = QdrantClient(
-            url=self.qdrant_url, api_key=self.api_key, https=True
-        )
+        self.start_encoder()
+
+        with startup_report.measure("connect:qdrant"):
+            self.client = QdrantClient(
+                url=self.qdrant_url, api_key=self.api_key, https=True
+            )
+            self.async_client = AsyncQdrantClient(
+                url=self.qdrant_url, api_key=self.api_key, https=True
+            )
 
         # self.vector_store = QdrantVectorStore(
         #     client=self.client,
@@ -60,27 +122,420 @@ class QdrantDatasource(BaseDatasource):
         """
         # self.vector_store._client.close()
         self.client.close()
+        await self.async_client.close()
+        self.stop_encoder()
         self.logger.info("Qdrant client shut down successfully.")
 
-    # async def aquery(self, query: str, limit: int = 10, **kwargs):
-    #     results = await self.vector_store.asimilarity_search(
-    #         query=query,
-    #         limit=limit,
-    #     )
-    #     return results
+    def start_encoder(self):
+        """
+        Start the encoder executor and load the embedding model in the background,
+        without connecting to Qdrant.
+        """
+        # Encoding is CPU-bound: keep it off the event loop, on a bounded pool
+        self.encoder_executor = ThreadPoolExecutor(
+            max_workers=self.encode_workers, thread_name_prefix="qdrant-encoder"
+        )
+        self.model_loading = self.encoder_executor.submit(self._load_model)
+        if self.encode_batch_size > 1:
+            self.encode_batcher = EncodeBatcher(
+                self.embed_queries,
+                self.encoder_executor,
+                max_batch_size=self.encode_batch_size,
+                max_wait_ms=self.encode_batch_wait_ms,
+            )
+
+    def stop_encoder(self):
+        self.encoder_executor.shutdown(wait=False, cancel_futures=True)
+        self.embedding_cache.close()
+
+    async def aping(self):
+        """
+        Check Qdrant is reachable and the collection exists.
+        """
+        if not await self.async_client.collection_exists(self.collection_name):
+            raise RuntimeError(f"Collection {self.collection_name} not found")
+
+    def _load_model(self):
+        with startup_report.measure("model_load:embeddings"):
+            self.encoder.load()
 
-    def query(self, query: str, limit: int = 2, **kwargs) -> list[QdrantDocument]:
+    @property
+    def model_ready(self) -> bool:
+        return self.model_loading.done() and self.model_loading.exception() is None
+
+    async def await_model(self):
+        """
+        Wait until the embedding model is loaded.
+        """
+        await asyncio.wrap_future(self.model_loading)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """
+        Encode a query string into its dense embedding, going through the embedding cache.
+
+        :param query: The query string to encode.
+        :return: The query embedding.
+        """
+        embeddings = self.embedding_cache.get(query)
+        if embeddings is None:
+            self.model_loading.result()
+            embeddings = self.encoder.encode_queries([query])[0]
+            self.embedding_cache.put(query, embeddings)
+        return embeddings
+
+    async def aembed_query(self, query: str) -> np.ndarray:
+        """
+        Encode a query string on the encoder executor, without blocking the event loop.
+        In-memory cache hits are answered directly on the loop, misses are micro-batched
+        with the concurrent encodes when the batcher is enabled.
+
+        :param query: The query string to encode.
+        :return: The query embedding.
+        """
+        with (
+            tracer.start_as_current_span("embedding.encode") as span,
+            RETRIEVAL_DURATION.labels("encode").time(),
+        ):
+            embeddings = self.embedding_cache.lookup(query)
+            span.set_attribute("embedding.cache_hit", embeddings is not None)
+            if embeddings is not None:
+                return embeddings
+            if self.encode_batcher is not None:
+                return await self.encode_batcher.encode(query)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.encoder_executor, self.embed_query, query
+            )
+
+    def embed_queries(self, queries: list[str]) -> list[np.ndarray]:
+        """
+        Encode several query strings with a single batched model pass.
+        Only the queries missing from the embedding cache are encoded.
+
+        :param queries: The query strings to encode.
+        :return: The query embeddings, in the same order.
+        """
+        embeddings: list[np.ndarray | None] = [
+            self.embedding_cache.get(query) for query in queries
+        ]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            self.model_loading.result()
+            encoded = self.encoder.encode_queries([queries[i] for i in missing])
+            for i, embedding in zip(missing, encoded):
+                embeddings[i] = embedding
+                self.embedding_cache.put(queries[i], embeddings[i])
+        return embeddings  # type: ignore[return-value]
+
+    async def aembed_queries(self, queries: list[str]) -> list[np.ndarray]:
+        """
+        Encode several query strings on the encoder executor, with a single batched model pass.
+
+        :param queries: The query strings to encode.
+        :return: The query embeddings, in the same order.
+        """
+        with (
+            tracer.start_as_current_span(
+                "embedding.encode", {"embedding.queries": len(queries)}
+            ) as span,
+            RETRIEVAL_DURATION.labels("encode").time(),
+        ):
+            cached = [self.embedding_cache.lookup(query) for query in queries]
+            span.set_attribute(
+                "embedding.cache_hit",
+                all(embedding is not None for embedding in cached),
+            )
+            if all(embedding is not None for embedding in cached):
+                return cached  # type: ignore[return-value]
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.encoder_executor, self.embed_queries, queries
+            )
+
+    def embed_documents(self, documents: list[str], batch_size: int = 32) -> np.ndarray:
+        """
+        Encode document chunks for indexing, bypassing the query embedding cache.
+
+        :param documents: The document texts to encode.
+        :param batch_size: Number of texts per model pass.
+        :return: The document embeddings, one row per text.
+        """
+        self.model_loading.result()
+        return self.encoder.encode_documents(documents, batch_size=batch_size)
+
+    def embed_sparse_documents(self, documents: list[str]) -> list[models.SparseVector]:
+        """
+        Encode document chunks into their BM25 sparse vectors, for indexing.
+
+        :param documents: The document texts to encode.
+        :return: The sparse vectors, one per text.
+        """
+        return [self.sparse_encoder.encode_document(document) for document in documents]
+
+    def ensure_collection(self) -> bool:
+        """
+        Create the collection if it does not exist, with the dense vector sized on the
+        embedding model and the BM25 sparse vector. The sparse vector is added to an
+        existing collection missing it.
+
+        :return: Whether the collection was created.
+        """
+        if self.client.collection_exists(self.collection_name):
+            info = self.client.get_collection(self.collection_name)
+            if SPARSE_VECTOR_NAME not in (info.config.params.sparse_vectors or {}):
+                self.client.update_collection(
+                    self.collection_name,
+                    sparse_vectors_config={
+                        SPARSE_VECTOR_NAME: self.sparse_encoder.vector_params()
+                    },
+                )
+                self.logger.info(
+                    "Sparse vector %s added to %s.",
+                    SPARSE_VECTOR_NAME,
+                    self.collection_name,
+                )
+            return False
+        self.model_loading.result()
+        self.client.create_collection(
+            self.collection_name,
+            vectors_config=models.VectorParams(
+                size=self.encoder.dimension,
+                distance=models.Distance.COSINE,
+            ),
+            sparse_vectors_config={
+                SPARSE_VECTOR_NAME: self.sparse_encoder.vector_params()
+            },
+        )
+        self.logger.info("Collection %s created.", self.collection_name)
+        return True
+
+    def query(
+        self,
+        query: str,
+        limit: int = 2,
+        with_payload: models.PayloadSelector | bool = SEARCH_PAYLOAD,
+        search_mode: str | None = None,
+        **kwargs,
+    ) -> list[QdrantDocument]:
         # results = self.vector_store.similarity_search(
         #     query=query,
         #     limit=limit,
         # )
-        embeddings: np.ndarray = np.array(
-            self.embeddings_model.encode_query(query, show_progress_bar=False)
-        )
+        embeddings: np.ndarray = self.embed_query(query)
         qresults = self.client.query_points(
-            self.collection_name, query=embeddings, limit=limit
+            self.collection_name,
+            **self._search_request(query, embeddings, limit, with_payload, search_mode),
+        )
+        return self._to_documents(qresults)
+
+    async def aquery(
+        self,
+        query: str,
+        limit: int = 2,
+        with_payload: models.PayloadSelector | bool = SEARCH_PAYLOAD,
+        search_mode: str | None = None,
+        **kwargs,
+    ) -> list[QdrantDocument]:
+        """
+        Asynchronously query the collection.
+        The query is encoded on the encoder executor and searched with the async client.
+
+        :param query: The query string to search for.
+        :param limit: The maximum number of documents to return.
+        :param with_payload: The payload fields to return, `True` for the full payload
+                             (needed to render the images of the documents).
+        :param search_mode: `dense` or `hybrid`, defaults to the configured mode.
+        :return: The retrieved documents.
+        """
+        embeddings: np.ndarray = await self.aembed_query(query)
+        with (
+            tracer.start_as_current_span(
+                "qdrant.query_points", {"qdrant.limit": limit}
+            ),
+            RETRIEVAL_DURATION.labels("search").time(),
+        ):
+            qresults = await self.async_client.query_points(
+                self.collection_name,
+                **self._search_request(
+                    query, embeddings, limit, with_payload, search_mode
+                ),
+            )
+        return self._to_documents(qresults)
+
+    def query_batch(
+        self,
+        queries: list[str],
+        limit: int = 2,
+        with_payload: models.PayloadSelector | bool = SEARCH_PAYLOAD,
+        search_mode: str | None = None,
+    ) -> list[list[QdrantDocument]]:
+        """
+        Query the collection with several queries: one embedding pass, one Qdrant round trip.
+
+        :param queries: The query strings to search for.
+        :param limit: The maximum number of documents to return per query.
+        :param with_payload: The payload fields to return.
+        :param search_mode: `dense` or `hybrid`, defaults to the configured mode.
+        :return: The retrieved documents of each query, in the same order.
+        """
+        if not queries:
+            return []
+        qresults = self.client.query_batch_points(
+            self.collection_name,
+            requests=self._batch_requests(
+                queries, self.embed_queries(queries), limit, with_payload, search_mode
+            ),
         )
-        results = [
+        return [self._to_documents(qresult) for qresult in qresults]
+
+    async def aquery_batch(
+        self,
+        queries: list[str],
+        limit: int = 2,
+        with_payload: models.PayloadSelector | bool = SEARCH_PAYLOAD,
+        search_mode: str | None = None,
+    ) -> list[list[QdrantDocument]]:
+        """
+        Asynchronously query the collection with several queries:
+        one embedding pass, one Qdrant round trip.
+
+        :param queries: The query strings to search for.
+        :param limit: The maximum number of documents to return per query.
+        :param with_payload: The payload fields to return.
+        :param search_mode: `dense` or `hybrid`, defaults to the configured mode.
+        :return: The retrieved documents of each query, in the same order.
+        """
+        if not queries:
+            return []
+        embeddings = await self.aembed_queries(queries)
+        with (
+            tracer.start_as_current_span(
+                "qdrant.query_batch_points", {"qdrant.queries": len(queries)}
+            ),
+            RETRIEVAL_DURATION.labels("search").time(),
+        ):
+            qresults = await self.async_client.query_batch_points(
+                self.collection_name,
+                requests=self._batch_requests(
+                    queries, embeddings, limit, with_payload, search_mode
+                ),
+            )
+        return [self._to_documents(qresult) for qresult in qresults]
+
+    def _search_request(
+        self,
+        query: str,
+        embedding: np.ndarray,
+        limit: int,
+        with_payload: models.PayloadSelector | bool,
+        search_mode: str | None = None,
+    ) -> dict:
+        """
+        Arguments of a `query_points` call, or of a `QueryRequest` of a batch.
+        The hybrid mode prefetches the dense and the BM25 candidates and fuses them
+        with Reciprocal Rank Fusion, in the same request.
+        """
+        if (search_mode or self.search_mode) == "hybrid":
+            return {
+                "prefetch": [
+                    models.Prefetch(
+                        query=embedding.tolist(), limit=self.prefetch_limit
+                    ),
+                    models.Prefetch(
+                        query=self.sparse_encoder.encode_query(query),
+                        using=SPARSE_VECTOR_NAME,
+                        limit=self.prefetch_limit,
+                    ),
+                ],
+                "query": models.FusionQuery(fusion=models.Fusion.RRF),
+                "limit": limit,
+                "with_payload": with_payload,
+            }
+        return {
+            "query": embedding.tolist(),
+            "limit": limit,
+            "with_payload": with_payload,
+        }
+
+    def _batch_requests(
+        self,
+        queries: list[str],
+        embeddings: list[np.ndarray],
+        limit: int,
+        with_payload: models.PayloadSelector | bool,
+        search_mode: str | None = None,
+    ) -> list[models.QueryRequest]:
+        return [
+            models.QueryRequest(
+                **self._search_request(
+                    query, embedding, limit, with_payload, search_mode
+                )
+            )
+            for query, embedding in zip(queries, embeddings)
+        ]
+
+    async def acollection_version(self, batch_size: int = 1024) -> str:
+        """
+        Compute a fingerprint of the collection from the ids of its points.
+        Any re-ingestion adding, removing or re-creating points changes the fingerprint.
+
+        :param batch_size: Number of ids fetched per scroll request.
+        :return: The collection version.
+        """
+        ids: list[str] = []
+        offset = None
+        while True:
+            points, offset = await self.async_client.scroll(
+                self.collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False,
+            )
+            ids.extend(str(point.id) for point in points)
+            if offset is None:
+                break
+        return hashlib.sha1("\n".join(sorted(ids)).encode()).hexdigest()
+
+    async def externalize_images(
+        self, image_store: ImageStore, batch_size: int = 32
+    ) -> int:
+        """
+        Move the inline images of the stored points into the image store,
+        replacing them with short references in the payload.
+
+        :param image_store: The image store to write the images to.
+        :param batch_size: Number of points fetched per scroll request.
+        :return: The number of updated points.
+        """
+        updated = 0
+        offset = None
+        while True:
+            points, offset = await self.async_client.scroll(
+                self.collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            for point in points:
+                metadata = dict((point.payload or {}).get("metadata") or {})
+                images: dict = metadata.get("images") or {}
+                if all(ImageStore.is_ref(image) for image in images.values()):
+                    continue
+                metadata["images"] = image_store.externalize(images)
+                await self.async_client.set_payload(
+                    self.collection_name,
+                    payload={"metadata": metadata},
+                    points=[point.id],
+                )
+                updated += 1
+            if offset is None:
+                break
+        return updated
+
+    @staticmethod
+    def _to_documents(qresults: QueryResponse) -> list[QdrantDocument]:
+        return [
             QdrantDocument.model_validate(qr.payload) for qr in qresults.points or []
         ]
-        return results
@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from threading import Lock
+
+from plum_chatbot.datasources.base_datasource import BaseDatasource
+
+# Writes between two purges of the expired keys, for the stores without expiry of their own
+PURGE_EVERY = 1000
+
+# Increment a counter and set its expiry on creation, in one step: a client failing
+# between the two would otherwise leave a counter which never expires
+REDIS_INCR_SCRIPT = """
+local count = redis.call('INCR', KEYS[1])
+if count == 1 then
+    redis.call('PEXPIRE', KEYS[1], ARGV[1])
+end
+return count
+"""
+
+
+class SharedStore(BaseDatasource):
+    """
+    Key-value store of the state the webserver workers share: the thread statuses,
+    the latest checkpoint of each thread, the cached answers and the rate-limit counters.
+
+    The values are strings, with an optional time to live in seconds. `shared` tells
+    whether the store is visible to other processes: when it is not, the components
+    keep their state in process memory only, as with a single worker.
+    """
+
+    shared: bool = True
+
+    async def setup(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def get(self, key: str) -> str | None:
+        """
+        :return: The value of the key, or None if it is missing or expired.
+        """
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    async def set(self, key: str, value: str, ttl: float | None = None):
+        """
+        :param ttl: Seconds after which the key expires, None to keep it.
+        """
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    async def delete(self, key: str):
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    async def incr(self, key: str, ttl: float) -> int:
+        """
+        Atomically increment a counter, created with the given time to live.
+
+        :return: The value of the counter after the increment.
+        """
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    async def aping(self):
+        """
+        Check the store is reachable.
+        """
+        await self.get("ping")
+
+
+class MemoryStore(SharedStore):
+    """
+    Store in process memory, not shared: the default, for a single worker.
+    """
+
+    shared = False
+
+    def __init__(self):
+        super().__init__(name="MemoryStore")
+        self._values: dict[str, tuple[str, float | None]] = {}
+        self._writes = 0
+
+    def _write(self, key: str, value: str, expires_at: float | None):
+        self._values[key] = (value, expires_at)
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            now = time.time()
+            for expired in [
+                k for k, (_, at) in self._values.items() if at is not None and at <= now
+            ]:
+                del self._values[expired]
+
+    async def get(self, key: str) -> str | None:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._values[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: str, ttl: float | None = None):
+        self._write(key, value, time.time() + ttl if ttl is not None else None)
+
+    async def delete(self, key: str):
+        self._values.pop(key, None)
+
+    async def incr(self, key: str, ttl: float) -> int:
+        entry = self._values.get(key)
+        if entry is None or (entry[1] is not None and entry[1] <= time.time()):
+            entry = ("0", time.time() + ttl)
+        count = int(entry[0]) + 1
+        self._write(key, str(count), entry[1])
+        return count
+
+
+class SqliteStore(SharedStore):
+    """
+    Store in a SQLite file, shared by the workers of one host: the local stand-in
+    for Redis, e.g. `sqlite:///data/shared_state.db`. The queries run in a thread,
+    on a single connection in WAL mode.
+    """
+
+    path: Path
+    logger: logging.Logger
+
+    def __init__(self, url: str):
+        """
+        :param url: `sqlite:///<path>`, relative to the working directory, or
+                    `sqlite:////<absolute path>`.
+        """
+        super().__init__(name="SqliteStore")
+        self.path = Path(url.removeprefix("sqlite:///"))
+        self.logger = logging.getLogger(__name__)
+        self._connection: sqlite3.Connection | None = None
+        self._lock = Lock()
+        self._writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(
+            self.path, timeout=5, isolation_level=None, check_same_thread=False
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS shared_state ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+        return connection
+
+    def _execute(self, query: str, parameters: tuple = ()) -> list[tuple]:
+        with self._lock:
+            if self._connection is None:
+                self._connection = self._connect()
+            rows = self._connection.execute(query, parameters).fetchall()
+            if not query.startswith("SELECT"):
+                self._writes += 1
+                if self._writes % PURGE_EVERY == 0:
+                    self._connection.execute(
+                        "DELETE FROM shared_state WHERE expires_at <= ?", (time.time(),)
+                    )
+            return rows
+
+    async def _run(self, query: str, parameters: tuple = ()) -> list[tuple]:
+        return await asyncio.to_thread(self._execute, query, parameters)
+
+    async def setup(self):
+        await self._run(
+            "DELETE FROM shared_state WHERE expires_at <= ?", (time.time(),)
+        )
+        self.logger.info("Shared state stored in %s", self.path)
+
+    async def shutdown(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    async def get(self, key: str) -> str | None:
+        rows = await self._run(
+            "SELECT value FROM shared_state WHERE key = ?"
+            " AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        )
+        return rows[0][0] if rows else None
+
+    async def set(self, key: str, value: str, ttl: float | None = None):
+        await self._run(
+            "INSERT OR REPLACE INTO shared_state VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl if ttl is not None else None),
+        )
+
+    async def delete(self, key: str):
+        await self._run("DELETE FROM shared_state WHERE key = ?", (key,))
+
+    async def incr(self, key: str, ttl: float) -> int:
+        now = time.time()
+        # A single statement, atomic across the processes sharing the file
+        rows = await self._run(
+            "INSERT INTO shared_state VALUES (?, '1', ?) ON CONFLICT (key) DO UPDATE SET"
+            " value = CASE WHEN expires_at <= ? THEN 1 ELSE CAST(value AS INTEGER) + 1 END,"
+            " expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at"
+            " ELSE expires_at END"
+            " RETURNING value",
+            (key, now + ttl, now, now),
+        )
+        return int(rows[0][0])
+
+
+class RedisStore(SharedStore):
+    """
+    Store in Redis, or any server speaking its protocol (Valkey, KeyDB, Dragonfly),
+    shared by the workers of every host. Requires the `redis` extra.
+    """
+
+    url: str
+    logger: logging.Logger
+
+    def __init__(self, url: str):
+        """
+        :param url: `redis://[:password@]host[:port][/db]`.
+        """
+        super().__init__(name="RedisStore")
+        self.url = url
+        self.logger = logging.getLogger(__name__)
+        self._client = None
+        self._incr = None
+
+    async def setup(self):
+        # Imported lazily: only needed with a Redis shared store
+        from redis.asyncio import Redis
+
+        self._client = Redis.from_url(self.url, decode_responses=True)
+        await self._client.ping()
+        self._incr = self._client.register_script(REDIS_INCR_SCRIPT)
+        self.logger.info("Shared state stored in Redis.")
+
+    async def shutdown(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._incr = None
+
+    async def get(self, key: str) -> str | None:
+        return await self._client.get(key)  # type: ignore[union-attr]
+
+    async def set(self, key: str, value: str, ttl: float | None = None):
+        await self._client.set(  # type: ignore[union-attr]
+            key, value, px=int(ttl * 1000) if ttl is not None else None
+        )
+
+    async def delete(self, key: str):
+        await self._client.delete(key)  # type: ignore[union-attr]
+
+    async def incr(self, key: str, ttl: float) -> int:
+        # A script, run atomically by the server: PEXPIRE NX would need Redis 7
+        count = await self._incr(keys=[key], args=[int(ttl * 1000)])  # type: ignore[misc]
+        return int(count)
+
+    async def aping(self):
+        await self._client.ping()  # type: ignore[union-attr]
@@ -0,0 +1,112 @@
+import re
+import unicodedata
+import zlib
+from collections import Counter
+
+from qdrant_client import models
+
+SPARSE_VECTOR_NAME = "bm25"
+
+_IMAGE_PATTERN = re.compile(r"!\[Image\]\([^)]*\)")
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+ITALIAN_STOPWORDS = frozenset(
+    """
+    a ad al allo ai agli all alla alle con col coi da dal dallo dai dagli dall dalla
+    dalle di del dello dei degli dell della delle in nel nello nei negli nell nella
+    nelle su sul sullo sui sugli sull sulla sulle per tra fra il lo la i gli le l un
+    uno una e ed o od ma se anche come che chi cui non piu quale quali quanto quanta
+    questo questa questi queste quello quella quelli quelle ci vi si ne mi ti lui lei
+    loro noi voi io tu essere e sono sei siamo siete era erano sara stato stata stati
+    avere ha hai ho hanno abbiamo avete aveva avevano puo possono deve devono cosa
+    cosi dove quando perche poi gia ancora solo tutto tutti tutta tutte molto ogni
+    qui li la nostro nostra vostro vostra suo sua suoi sue mio mia tuo tua
+    """.split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split a text into BM25 terms: accents stripped, lowercased, image markup and Italian
+    stopwords removed. Numbers are kept, as codes such as `TD 896` or `123` are
+    precisely what the dense model tends to miss.
+
+    :param text: The text to tokenize.
+    :return: The terms, in order.
+    """
+    text = _IMAGE_PATTERN.sub(" ", text)
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    return [
+        token
+        for token in _TOKEN_PATTERN.findall(text)
+        if token not in ITALIAN_STOPWORDS and (len(token) > 1 or token.isdigit())
+    ]
+
+
+def _term_index(term: str) -> int:
+    return zlib.crc32(term.encode("utf-8"))
+
+
+class BM25SparseEncoder:
+    """
+    Sparse encoder of the BM25 term weights.
+
+    Documents get the BM25 term-frequency component, and queries a unit weight per term.
+    The inverse document frequency is left to Qdrant, through the `IDF` modifier of the
+    sparse vector, so that it follows the collection without re-encoding the documents.
+    Terms are hashed to their CRC32, no vocabulary is needed.
+    """
+
+    k1: float
+    b: float
+    avg_doc_length: float
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, avg_doc_length: float = 48):
+        """
+        Initialize the encoder.
+
+        :param k1: Term-frequency saturation.
+        :param b: Document length normalization.
+        :param avg_doc_length: Average number of terms of a chunk of the corpus.
+        """
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = avg_doc_length
+
+    @staticmethod
+    def vector_params() -> models.SparseVectorParams:
+        return models.SparseVectorParams(modifier=models.Modifier.IDF)
+
+    @staticmethod
+    def _to_vector(weights: dict[int, float]) -> models.SparseVector:
+        indices = sorted(weights)
+        return models.SparseVector(
+            indices=indices, values=[weights[index] for index in indices]
+        )
+
+    def encode_document(self, text: str) -> models.SparseVector:
+        """
+        Encode a document chunk for indexing.
+
+        :param text: The chunk text.
+        :return: The sparse vector of the BM25 term-frequency weights.
+        """
+        terms = tokenize(text)
+        length_norm = 1 - self.b + self.b * len(terms) / self.avg_doc_length
+        weights: dict[int, float] = {}
+        for term, tf in Counter(terms).items():
+            index = _term_index(term)
+            weights[index] = weights.get(index, 0.0) + tf * (self.k1 + 1) / (
+                tf + self.k1 * length_norm
+            )
+        return self._to_vector(weights)
+
+    def encode_query(self, text: str) -> models.SparseVector:
+        """
+        Encode a query.
+
+        :param text: The query text.
+        :return: The sparse vector of the query terms.
+        """
+        return self._to_vector({_term_index(term): 1.0 for term in set(tokenize(text))})
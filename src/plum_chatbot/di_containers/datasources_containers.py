@@ -1,29 +1,129 @@
+from collections.abc import AsyncIterator
+from pathlib import Path
+
 from dependency_injector import containers, providers
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from plum_chatbot.agents.answer_cache import SemanticAnswerCache
+from plum_chatbot.agents.thread_status import ThreadStatusRegistry
 from plum_chatbot.configs.settings import Settings
-from plum_chatbot.datasources.parameters import PostgresParameters, QdrantParameters
+from plum_chatbot.datasources.checkpoint_datasource import (
+    CheckpointDatasource,
+    HotCacheCheckpointSaver,
+)
+from plum_chatbot.datasources.memory_vector_datasource import (
+    InMemoryVectorDatasource,
+)
+from plum_chatbot.datasources.parameters import (
+    CheckpointParameters,
+    PostgresParameters,
+    QdrantParameters,
+)
 from plum_chatbot.datasources.postgres_datasource import PostgresDatasource
 from plum_chatbot.datasources.qdrant_datasource import QdrantDatasource
+from plum_chatbot.datasources.shared_store import (
+    MemoryStore,
+    RedisStore,
+    SharedStore,
+    SqliteStore,
+)
 
 
 class Container(containers.DeclarativeContainer):
     config = providers.Configuration()
     settings = Settings()
 
-    qdrant = providers.Singleton(
-        QdrantDatasource,
-        config=QdrantParameters(
-            embedding_model_name="multi-qa-mpnet-base-cos-v1",
-            model_url="host.docker.internal",
-            qdrant_url=settings.QDRANT_URL,
-            api_key=settings.QDRANT_API_KEY,
-            collection_name=settings.QDRANT_COLLECTION_NAME,
+    qdrant_parameters = QdrantParameters(
+        embedding_model_name="multi-qa-mpnet-base-cos-v1",
+        model_url="host.docker.internal",
+        qdrant_url=settings.QDRANT_URL,
+        api_key=settings.QDRANT_API_KEY,
+        collection_name=settings.QDRANT_COLLECTION_NAME,
+        encode_workers=settings.QDRANT_ENCODE_WORKERS,
+        encode_batch_size=settings.ENCODE_BATCH_SIZE,
+        encode_batch_wait_ms=settings.ENCODE_BATCH_WAIT_MS,
+        embedding_cache_size=settings.EMBEDDING_CACHE_SIZE,
+        embedding_cache_ttl=settings.EMBEDDING_CACHE_TTL,
+        embedding_cache_path=(
+            Path(settings.EMBEDDING_CACHE_PATH)
+            if settings.EMBEDDING_CACHE_PATH
+            else None
+        ),
+        encoder_backend=settings.ENCODER_BACKEND,
+        encoder_threads=settings.ENCODER_THREADS,
+        quantization_config=settings.ENCODER_QUANTIZATION_CONFIG,
+        search_mode=settings.QDRANT_SEARCH_MODE,
+        prefetch_limit=settings.QDRANT_PREFETCH_LIMIT,
+    )
+
+    # Vector searches answered by the Qdrant server, or in process from a snapshot
+    qdrant = providers.Selector(
+        providers.Object(settings.VECTOR_BACKEND),
+        qdrant=providers.Singleton(QdrantDatasource, config=qdrant_parameters),
+        memory=providers.Singleton(
+            InMemoryVectorDatasource,
+            config=qdrant_parameters,
+            snapshot_path=(
+                Path(settings.VECTOR_SNAPSHOT_PATH)
+                if settings.VECTOR_SNAPSHOT_PATH
+                else None
+            ),
+            refresh_interval=settings.VECTOR_REFRESH_INTERVAL,
+            seed_dir=Path(settings.VECTOR_SEED_DIR)
+            if settings.VECTOR_SEED_DIR
+            else None,
         ),
     )
 
     postgres = providers.Singleton(
         PostgresDatasource,
-        config=PostgresParameters(postgres_url=settings.POSTGRES_URL),
+        config=PostgresParameters(
+            postgres_url=settings.POSTGRES_URL,
+            pool_size=settings.POSTGRES_POOL_SIZE,
+            max_overflow=settings.POSTGRES_MAX_OVERFLOW,
+            pool_timeout=settings.POSTGRES_POOL_TIMEOUT,
+            pool_recycle=settings.POSTGRES_POOL_RECYCLE,
+        ),
+    )
+
+    # State shared by the webserver workers, selected by the scheme of its URL
+    shared_store = providers.Selector(
+        providers.Object(settings.SHARED_STORE_URL.partition("://")[0]),
+        memory=providers.Singleton(MemoryStore),
+        sqlite=providers.Singleton(SqliteStore, url=settings.SHARED_STORE_URL),
+        redis=providers.Singleton(RedisStore, url=settings.SHARED_STORE_URL),
+    )
+
+    checkpointer = providers.Singleton(
+        CheckpointDatasource,
+        config=CheckpointParameters(
+            backend=settings.CHECKPOINTER_BACKEND,
+            postgres_url=settings.CHECKPOINTER_POSTGRES_URL,
+            pool_min_size=settings.CHECKPOINTER_POOL_MIN_SIZE,
+            pool_max_size=settings.CHECKPOINTER_POOL_MAX_SIZE,
+            hot_cache_size=settings.CHECKPOINTER_HOT_CACHE_SIZE,
+            idle_ttl=settings.CHECKPOINTER_IDLE_TTL,
+            sweep_interval=settings.CHECKPOINTER_SWEEP_INTERVAL,
+        ),
+        store=shared_store,
+        store_ttl=settings.SHARED_STATE_TTL,
+    )
+
+    answer_cache = providers.Singleton(
+        SemanticAnswerCache,
+        enabled=settings.ANSWER_CACHE_ENABLED,
+        threshold=settings.ANSWER_CACHE_THRESHOLD,
+        max_size=settings.ANSWER_CACHE_SIZE,
+        ttl_seconds=settings.ANSWER_CACHE_TTL,
+        version_check_interval=settings.ANSWER_CACHE_VERSION_CHECK_INTERVAL,
+        shared_store=shared_store,
+    )
+
+    thread_status = providers.Singleton(
+        ThreadStatusRegistry,
+        max_size=settings.THREAD_STATUS_CACHE_SIZE,
+        store=shared_store,
+        ttl=settings.SHARED_STATE_TTL,
     )
 
     # repository = providers.Singleton(Repository, datasource=datasource)
@@ -35,10 +135,41 @@ container = Container()
 
 # Wrapper functions to avoid FastAPI's automatic parameter detection
 def get_qdrant_datasource() -> QdrantDatasource:
-    """Get QdrantDatasource instance from container."""
+    """Get the vector datasource from container: QdrantDatasource or InMemoryVectorDatasource."""
     return container.qdrant()
 
 
 def get_postgres_datasource() -> PostgresDatasource:
     """Get PostgresDatasource instance from container."""
     return container.postgres()
+
+
+async def get_postgres_session() -> AsyncIterator[AsyncSession]:
+    """Open a PostgreSQL session for the duration of a request."""
+    async with container.postgres().session() as session:
+        yield session
+
+
+def get_checkpoint_datasource() -> CheckpointDatasource:
+    """Get CheckpointDatasource instance from container."""
+    return container.checkpointer()
+
+
+def get_checkpointer() -> HotCacheCheckpointSaver:
+    """Get the LangGraph checkpointer shared by the agents."""
+    return container.checkpointer().saver
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Get SemanticAnswerCache instance from container."""
+    return container.answer_cache()
+
+
+def get_thread_status() -> ThreadStatusRegistry:
+    """Get ThreadStatusRegistry instance from container."""
+    return container.thread_status()
+
+
+def get_shared_store() -> SharedStore:
+    """Get the store shared by the workers: MemoryStore, SqliteStore or RedisStore."""
+    return container.shared_store()
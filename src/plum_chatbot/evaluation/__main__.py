@@ -0,0 +1,3 @@
+from plum_chatbot.evaluation.cli import main
+
+main()
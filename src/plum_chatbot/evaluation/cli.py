@@ -0,0 +1,326 @@
+import argparse
+import asyncio
+import copy
+import json
+import logging
+import sys
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+
+from plum_chatbot.configs.folders import (
+    BASELINES_DIR,
+    EVALUATION_RESULTS_DIR,
+    EXTRACTIONS_DIR,
+)
+from plum_chatbot.configs.logger import setup_global_logging
+from plum_chatbot.configs.settings import Settings
+from plum_chatbot.datasources.encoders import ENCODER_BACKENDS
+from plum_chatbot.datasources.memory_vector_datasource import InMemoryVectorDatasource
+from plum_chatbot.datasources.qdrant_datasource import SEARCH_MODES
+from plum_chatbot.di_containers.datasources_containers import Container, container
+from plum_chatbot.evaluation.datasets import DATASETS
+from plum_chatbot.evaluation.retrieval import RetrievalBenchmark, compare
+from plum_chatbot.utils.git import git_commit
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_BASELINE_PATH = BASELINES_DIR / "retrieval.json"
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="plum-eval", description="Evaluate the PLUM chatbot offline."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    retrieval = commands.add_parser(
+        "retrieval",
+        help="Retrieval quality and latency over the golden sets, on the in-process vector store.",
+    )
+    retrieval.add_argument(
+        "--dataset",
+        choices=list(DATASETS),
+        action="append",
+        help="Golden sets to evaluate, all of them by default",
+    )
+    retrieval.add_argument(
+        "--extractions-dir",
+        type=Path,
+        default=EXTRACTIONS_DIR,
+        help="Markdown extractions the vector store is seeded from",
+    )
+    retrieval.add_argument(
+        "--snapshot",
+        type=Path,
+        default=None,
+        help="Snapshot of the collection to load instead of seeding from the extractions",
+    )
+    retrieval.add_argument(
+        "--encoder-backend",
+        choices=list(ENCODER_BACKENDS),
+        default=None,
+        help="Encoder backend, by default the one of the baseline, or ENCODER_BACKEND "
+        "without baseline or with --update-baseline",
+    )
+    retrieval.add_argument(
+        "--search-mode",
+        choices=SEARCH_MODES,
+        action="append",
+        help="Search modes to evaluate, all of them by default",
+    )
+    retrieval.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10])
+    retrieval.add_argument(
+        "--repeat", type=int, default=5, help="Timed runs of each encoding and search"
+    )
+    retrieval.add_argument(
+        "--output", type=Path, default=None, help="JSON file the results are written to"
+    )
+    retrieval.add_argument(
+        "--baseline",
+        type=Path,
+        default=RETRIEVAL_BASELINE_PATH,
+        help="JSON results to compare with, exiting with 1 on a regression and with 2 "
+        "if they were measured with another configuration",
+    )
+    retrieval.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Write the results to the baseline instead of comparing with it",
+    )
+    retrieval.add_argument(
+        "--quality-tolerance",
+        type=float,
+        default=0.02,
+        help="Absolute drop of a recall, hit rate or MRR tolerated",
+    )
+    retrieval.add_argument(
+        "--compare-latency",
+        action="store_true",
+        help="Also compare the latencies, and record them with --update-baseline: "
+        "only for a baseline measured on this machine",
+    )
+    retrieval.add_argument(
+        "--latency-tolerance",
+        type=float,
+        default=0.25,
+        help="Relative increase of a latency percentile tolerated, with --compare-latency",
+    )
+
+    answers = commands.add_parser(
+        "answers",
+        help="Answer a golden set with an agent and grade the answers with an LLM judge.",
+    )
+    answers.add_argument("--dataset", choices=list(DATASETS), default="generated")
+    answers.add_argument(
+        "--agent",
+        default=None,
+        help="Agent answering the questions, the default agent if unset",
+    )
+    answers.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="JSONL checkpoint of the results, resumed if it exists "
+        "(evaluation/results/<dataset>-<agent>.jsonl by default)",
+    )
+    answers.add_argument(
+        "--fresh", action="store_true", help="Discard the checkpoint of a previous run"
+    )
+    answers.add_argument(
+        "--concurrency", type=int, default=4, help="Questions answered at the same time"
+    )
+    answers.add_argument(
+        "--judge-concurrency",
+        type=int,
+        default=4,
+        help="Answers graded at the same time",
+    )
+    answers.add_argument(
+        "--judge-model",
+        default=None,
+        help="Model grading the answers, EVAL_JUDGE_MODEL by default",
+    )
+    answers.add_argument("--no-judge", action="store_true", help="Only answer")
+    answers.add_argument(
+        "--max-retries",
+        type=int,
+        default=5,
+        help="Retries on rate limits and transient errors",
+    )
+    answers.add_argument(
+        "--answer-cache",
+        action="store_true",
+        help="Keep the semantic answer cache, disabled by default so each question is answered",
+    )
+    return parser.parse_args(argv)
+
+
+def build_vector_store(args: argparse.Namespace) -> InMemoryVectorDatasource:
+    config = copy.copy(Container.qdrant_parameters)
+    if args.encoder_backend is not None:
+        config.encoder_backend = args.encoder_backend
+    # Latencies of the encoder itself: no embedding cached on disk by previous runs
+    config.embedding_cache_path = None
+    datasource = InMemoryVectorDatasource(config, refresh_interval=0)
+    datasource.start_encoder()
+    datasource.model_loading.result()
+    if args.snapshot is not None:
+        datasource.load_snapshot(args.snapshot)
+    else:
+        datasource.seed(args.extractions_dir)
+    return datasource
+
+
+def retrieval(args: argparse.Namespace) -> int:
+    datasets = {name: DATASETS[name]() for name in args.dataset or list(DATASETS)}
+    search_modes = args.search_mode or list(SEARCH_MODES)
+    baseline = None
+    if not args.update_baseline and args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if args.encoder_backend is None:
+            # Measured with the encoder of the baseline, to be comparable with it
+            args.encoder_backend = baseline.get("config", {}).get("encoder_backend")
+    datasource = build_vector_store(args)
+    try:
+        benchmark = RetrievalBenchmark(
+            datasource, ks=args.k, search_modes=search_modes, repeat=args.repeat
+        )
+        results = {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            # Only runs with the same encoder are compared, the golden sets, search
+            # modes and cut-offs are matched by name
+            "config": {
+                "encoder_backend": datasource.encoder.backend,
+                "embedding_model": datasource.encoder.embedding_model,
+                "prefetch_limit": datasource.prefetch_limit,
+            },
+            "corpus": {"chunks": len(datasource.ids), "version": datasource.version},
+            **benchmark.run(datasets),
+        }
+    finally:
+        datasource.stop_encoder()
+
+    for name, dataset in results["datasets"].items():
+        for mode, quality in dataset["modes"].items():
+            metrics = ", ".join(
+                f"{metric} {value:.3f}" for metric, value in quality.items()
+            )
+            print(f"{name}/{mode} ({dataset['questions']} questions): {metrics}")
+    latency = results["latency_ms"]
+    print(f"encode: {latency['encode']}")
+    for mode, stats in latency["search"].items():
+        print(f"search/{mode}: {stats}")
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"Results written to {args.output}")
+    if args.update_baseline:
+        # The latencies depend on the machine: not recorded in a baseline shared by default
+        baseline = (
+            results
+            if args.compare_latency
+            else {key: value for key, value in results.items() if key != "latency_ms"}
+        )
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(baseline, indent=2), encoding="utf-8")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if baseline is None:
+        logger.warning("No baseline at %s, nothing to compare with.", args.baseline)
+        return 0
+    try:
+        lines, regressions = compare(
+            results,
+            baseline,
+            quality_tolerance=args.quality_tolerance,
+            latency_tolerance=args.latency_tolerance,
+            compare_latency=args.compare_latency,
+        )
+    except ValueError as e:
+        print(e)
+        return 2
+    print("\n".join(lines))
+    if regressions:
+        print("Regressions:\n  " + "\n  ".join(regressions))
+        return 1
+    return 0
+
+
+@asynccontextmanager
+async def agent_dependencies():
+    """
+    Set up the datasources the agents need, as the webserver does at startup.
+    """
+    container.init_resources()
+    # The thread statuses, checkpoints and cached answers are kept in the shared store
+    datasources = [
+        container.qdrant(),
+        container.shared_store(),
+        container.checkpointer(),
+    ]
+    # The checkpoint sweep of the postgres backend joins the chat tables
+    if container.checkpointer().backend == "postgres":
+        datasources.insert(1, container.postgres())
+    for datasource in datasources:
+        await datasource.setup()
+    try:
+        await container.qdrant().await_model()
+        yield
+    finally:
+        await asyncio.gather(*(datasource.shutdown() for datasource in datasources))
+        container.shutdown_resources()
+
+
+async def evaluate_answers(args: argparse.Namespace) -> dict:
+    # Imported lazily: the retrieval benchmark does not need the agents
+    from plum_chatbot.agents.agents import DEFAULT_AGENT
+    from plum_chatbot.agents.llm import init_llm
+    from plum_chatbot.evaluation.runner import (
+        Checkpoint,
+        EvaluationRunner,
+        summarize,
+    )
+
+    agent_id = args.agent or DEFAULT_AGENT
+    output = args.output or EVALUATION_RESULTS_DIR / f"{args.dataset}-{agent_id}.jsonl"
+    if args.fresh:
+        output.unlink(missing_ok=True)
+    judge = None
+    if not args.no_judge:
+        judge = init_llm(args.judge_model or Settings().EVAL_JUDGE_MODEL, temperature=0)
+    async with agent_dependencies():
+        if not args.answer_cache:
+            container.answer_cache().enabled = False
+        runner = EvaluationRunner(
+            agent_id,
+            Checkpoint(output),
+            judge=judge,
+            concurrency=args.concurrency,
+            judge_concurrency=args.judge_concurrency,
+            max_retries=args.max_retries,
+        )
+        results = await runner.run(DATASETS[args.dataset]())
+    summary = summarize(results)
+    logger.info("Results in %s", output)
+    return summary
+
+
+def answers(args: argparse.Namespace) -> int:
+    summary = asyncio.run(evaluate_answers(args))
+    print(json.dumps(summary, indent=2))
+    return 1 if summary["errors"] else 0
+
+
+COMMANDS = {"retrieval": retrieval, "answers": answers}
+
+
+def main(argv: list[str] | None = None):
+    setup_global_logging()
+    args = parse_args(argv)
+    sys.exit(COMMANDS[args.command](args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import csv
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from plum_chatbot.configs.folders import EVALUATION_DATA_DIR, EXTRACTIONS_DIR
+
+GOLDEN_SET_PATH = EVALUATION_DATA_DIR / "golden_set.csv"
+GOLDEN_SET_SOURCES_PATH = EVALUATION_DATA_DIR / "golden_set_sources.csv"
+GENERATED_GOLDEN_SET_PATH = EVALUATION_DATA_DIR / "generated_golden_set.csv"
+
+HEADING_PATTERN = re.compile(r"^#+\s*(?:\d+\.\s*)?(.+?)\s*$", re.MULTILINE)
+
+
+@dataclass
+class GoldenQuestion:
+    """
+    A question of a golden set, with the extractions its answer comes from.
+    `sources` are file names of the extractions, i.e. the `metadata.title` of the chunks.
+    """
+
+    id: str
+    question: str
+    answer: str
+    sources: list[str] = field(default_factory=list)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^\w]+", " ", text.lower()).split())
+
+
+def extraction_headings(extractions_dir: Path = EXTRACTIONS_DIR) -> dict[str, str]:
+    """
+    Map the normalized first heading of each extraction to its file name.
+    """
+    headings = {}
+    for markdown_path in sorted(extractions_dir.glob("*.md")):
+        match = HEADING_PATTERN.search(markdown_path.read_text(encoding="utf-8"))
+        if match is not None:
+            headings[_normalize(match.group(1))] = markdown_path.name
+    return headings
+
+
+def load_golden_set(
+    path: Path = GOLDEN_SET_PATH, sources_path: Path = GOLDEN_SET_SOURCES_PATH
+) -> list[GoldenQuestion]:
+    """
+    Load the hand-written golden set, labelled with the sources of `sources_path`
+    (`id` and `;`-separated `sources` columns). Unlabelled questions have no sources.
+    """
+    sources = {}
+    if sources_path.exists():
+        with sources_path.open(encoding="utf-8", newline="") as f:
+            sources = {
+                row["id"]: [source for source in row["sources"].split(";") if source]
+                for row in csv.DictReader(f)
+            }
+    with path.open(encoding="utf-8", newline="") as f:
+        return [
+            GoldenQuestion(
+                id=row["id"],
+                question=row["question"],
+                answer=row["answer"],
+                sources=sources.get(row["id"], []),
+            )
+            for row in csv.DictReader(f)
+        ]
+
+
+def load_generated_golden_set(
+    path: Path = GENERATED_GOLDEN_SET_PATH, extractions_dir: Path = EXTRACTIONS_DIR
+) -> list[GoldenQuestion]:
+    """
+    Load the generated golden set, whose `content_used` column is the heading of the
+    extraction a question was generated from.
+    """
+    headings = extraction_headings(extractions_dir)
+    with path.open(encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    questions = []
+    for row in rows:
+        content_used = _normalize(row["content_used"])
+        sources = [
+            name
+            for heading, name in headings.items()
+            if heading == content_used
+            or content_used in heading
+            or heading in content_used
+        ]
+        questions.append(
+            GoldenQuestion(
+                id=row["id"],
+                question=row["question"],
+                answer=row["answer"],
+                sources=sources,
+            )
+        )
+    return questions
+
+
+DATASETS = {
+    "golden": load_golden_set,
+    "generated": load_generated_golden_set,
+}
@@ -0,0 +1,215 @@
+import logging
+import time
+from collections.abc import Sequence
+
+import numpy as np
+
+from plum_chatbot.datasources.memory_vector_datasource import InMemoryVectorDatasource
+from plum_chatbot.datasources.qdrant_datasource import SEARCH_MODES, SEARCH_PAYLOAD
+from plum_chatbot.evaluation.datasets import GoldenQuestion
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 95, 99)
+
+
+def _percentiles(latencies: list[float]) -> dict[str, float]:
+    """
+    Percentiles of latencies in seconds, in milliseconds.
+    """
+    if not latencies:
+        return {f"p{q}": 0.0 for q in PERCENTILES}
+    values = np.percentile(np.asarray(latencies) * 1000, PERCENTILES)
+    return {f"p{q}": round(float(value), 3) for q, value in zip(PERCENTILES, values)}
+
+
+class RetrievalBenchmark:
+    """
+    Quality and latency of the retrieval over golden sets, against the in-process
+    vector store: no Qdrant server nor network round trip, so that the numbers only
+    move with the encoder, the chunking and the search code.
+
+    A question is relevant to the chunks of its source extractions. The quality is
+    measured per search mode with the recall@k (share of the source extractions among
+    the distinct extractions of the top k chunks), the hit rate@k (at least one of
+    them) and the MRR of the first relevant chunk within the largest cut-off.
+    """
+
+    datasource: InMemoryVectorDatasource
+    ks: tuple[int, ...]
+    search_modes: tuple[str, ...]
+    repeat: int
+
+    def __init__(
+        self,
+        datasource: InMemoryVectorDatasource,
+        ks: Sequence[int] = (1, 3, 5, 10),
+        search_modes: Sequence[str] = SEARCH_MODES,
+        repeat: int = 5,
+    ):
+        """
+        :param datasource: The vector store, already loaded and with its encoder started.
+        :param ks: The cut-offs of the recall and of the hit rate.
+        :param search_modes: The search modes to evaluate, `dense` and/or `hybrid`.
+        :param repeat: Timed runs of each encoding and search, for the latencies.
+        """
+        self.datasource = datasource
+        self.ks = tuple(sorted(ks))
+        self.search_modes = tuple(search_modes)
+        self.repeat = repeat
+
+    def _encode(self, question: str) -> tuple[np.ndarray, list[float]]:
+        # The encoder itself, not the embedding cache in front of it
+        latencies = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            embedding = self.datasource.encoder.encode_queries([question])[0]
+            latencies.append(time.perf_counter() - start)
+        return embedding, latencies
+
+    def _search(
+        self, question: str, embedding: np.ndarray, search_mode: str
+    ) -> tuple[list[str], list[float]]:
+        latencies, documents = [], []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            documents = self.datasource._search(
+                question, embedding, self.ks[-1], SEARCH_PAYLOAD, search_mode
+            )
+            latencies.append(time.perf_counter() - start)
+        return [document.metadata.title for document in documents], latencies
+
+    def _quality(self, rankings: list[tuple[list[str], list[str]]]) -> dict[str, float]:
+        quality: dict[str, float] = {}
+        for k in self.ks:
+            recalls, hits = [], []
+            for titles, sources in rankings:
+                found = set(titles[:k]) & set(sources)
+                recalls.append(len(found) / len(sources))
+                hits.append(1.0 if found else 0.0)
+            quality[f"recall@{k}"] = round(float(np.mean(recalls)), 4)
+            quality[f"hit_rate@{k}"] = round(float(np.mean(hits)), 4)
+        reciprocal_ranks = [
+            next(
+                (1 / rank for rank, title in enumerate(titles, 1) if title in sources),
+                0.0,
+            )
+            for titles, sources in rankings
+        ]
+        quality[f"mrr@{self.ks[-1]}"] = round(float(np.mean(reciprocal_ranks)), 4)
+        return quality
+
+    def run(self, datasets: dict[str, list[GoldenQuestion]]) -> dict:
+        """
+        Run the benchmark over golden sets. The questions without sources are skipped.
+
+        :param datasets: The questions of each golden set, by name.
+        :return: The quality by golden set and search mode, and the latency percentiles
+                 in milliseconds of the encoding and of the search in each mode.
+        """
+        encode_latencies: list[float] = []
+        search_latencies: dict[str, list[float]] = {
+            mode: [] for mode in self.search_modes
+        }
+        results = {}
+        for name, questions in datasets.items():
+            labelled = [question for question in questions if question.sources]
+            rankings: dict[str, list[tuple[list[str], list[str]]]] = {
+                mode: [] for mode in self.search_modes
+            }
+            for question in labelled:
+                embedding, latencies = self._encode(question.question)
+                encode_latencies.extend(latencies)
+                for mode in self.search_modes:
+                    titles, latencies = self._search(question.question, embedding, mode)
+                    search_latencies[mode].extend(latencies)
+                    rankings[mode].append((titles, question.sources))
+            results[name] = {
+                "questions": len(labelled),
+                "skipped": len(questions) - len(labelled),
+                "modes": {
+                    mode: self._quality(rankings[mode]) if labelled else {}
+                    for mode in self.search_modes
+                },
+            }
+            logger.info("%s: %d questions evaluated", name, len(labelled))
+        return {
+            "datasets": results,
+            "latency_ms": {
+                "encode": _percentiles(encode_latencies),
+                "search": {
+                    mode: _percentiles(latencies)
+                    for mode, latencies in search_latencies.items()
+                },
+            },
+        }
+
+
+def compare(
+    current: dict,
+    baseline: dict,
+    quality_tolerance: float = 0.02,
+    latency_tolerance: float = 0.25,
+    latency_floor_ms: float = 0.5,
+    compare_latency: bool = False,
+) -> tuple[list[str], list[str]]:
+    """
+    Compare benchmark results with a baseline.
+
+    :param current: The results of this run.
+    :param baseline: The results of the baseline run.
+    :param quality_tolerance: Absolute drop of a quality metric tolerated.
+    :param latency_tolerance: Relative increase of a latency percentile tolerated.
+    :param latency_floor_ms: Increases below this many milliseconds are noise, not regressions.
+    :param compare_latency: Whether to compare the latencies too, only meaningful if the
+                            baseline was measured on the same machine and recorded them.
+    :return: The report lines, and the regressions among them.
+    :raises ValueError: If the results were not measured with the configuration of the
+                        baseline, e.g. another encoder: they cannot be compared.
+    """
+    if current["config"] != baseline.get("config"):
+        raise ValueError(
+            f"Configuration differs from the baseline, not compared: "
+            f"{baseline.get('config')} -> {current['config']}"
+        )
+    lines = [
+        f"Compared with {baseline.get('commit') or '?'} ({baseline.get('timestamp', '?')})"
+    ]
+    regressions: list[str] = []
+
+    for name, dataset in current["datasets"].items():
+        base_dataset = baseline["datasets"].get(name)
+        if base_dataset is None:
+            lines.append(f"{name}: not in the baseline")
+            continue
+        for mode, quality in dataset["modes"].items():
+            base_quality = base_dataset["modes"].get(mode, {})
+            for metric, value in quality.items():
+                if (before := base_quality.get(metric)) is None:
+                    continue
+                line = f"{name}/{mode} {metric}: {before:.4f} -> {value:.4f}"
+                lines.append(line)
+                if before - value > quality_tolerance:
+                    regressions.append(line)
+
+    if not compare_latency or "latency_ms" not in baseline:
+        return lines, regressions
+    latencies = {"encode": current["latency_ms"]["encode"]} | {
+        f"search/{mode}": stats
+        for mode, stats in current["latency_ms"]["search"].items()
+    }
+    base_latencies = {"encode": baseline["latency_ms"]["encode"]} | {
+        f"search/{mode}": stats
+        for mode, stats in baseline["latency_ms"]["search"].items()
+    }
+    for step, stats in latencies.items():
+        if (base_stats := base_latencies.get(step)) is None:
+            continue
+        for key, now in stats.items():
+            before = base_stats[key]
+            change = (now - before) / before if before else 0.0
+            line = f"{step} {key}: {before:.3f} -> {now:.3f} ms ({change:+.1%})"
+            lines.append(line)
+            if change > latency_tolerance and now - before > latency_floor_ms:
+                regressions.append(line)
+    return lines, regressions
@@ -0,0 +1,297 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import TypeVar
+from uuid import uuid4
+
+from langchain_core.language_models import BaseChatModel
+
+from plum_chatbot.agents.agents import invoke_chatbot
+from plum_chatbot.evaluation.datasets import GoldenQuestion
+from plum_chatbot.schemas.schema import UserInput
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+JUDGE_INSTRUCTIONS = (
+    "Given an actual answer and an expected answer, determine whether"
+    " the actual answer contains all of the information in the"
+    " expected answer. Respond with 'CORRECT' if the actual answer"
+    " does contain all of the expected information and 'INCORRECT'"
+    " otherwise. Do not include anything else in your response."
+)
+
+
+def _is_rate_limit(error: BaseException) -> bool:
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(
+        response, "status_code", None
+    )
+    return status == 429 or "RateLimit" in type(error).__name__
+
+
+def _is_transient(error: BaseException) -> bool:
+    name = type(error).__name__
+    return (
+        _is_rate_limit(error)
+        or isinstance(error, TimeoutError | ConnectionError)
+        or "Timeout" in name
+        or "Connection" in name
+    )
+
+
+def _retry_after(error: BaseException) -> float | None:
+    """
+    Seconds to wait asked by the provider with a `Retry-After` header, if any.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+async def with_retries(
+    call: Callable[[], Awaitable[T]],
+    max_retries: int = 5,
+    base_delay: float = 1,
+    max_delay: float = 60,
+) -> tuple[T, int]:
+    """
+    Await a call, retrying on rate limits, timeouts and connection errors with an
+    exponential backoff with jitter, or after the delay asked by the provider.
+
+    :param call: The coroutine function to call.
+    :param max_retries: Retries before giving up and raising the last error.
+    :param base_delay: Seconds before the first retry, doubled at each retry.
+    :param max_delay: Maximum seconds between two attempts.
+    :return: The result of the call, and the attempts it took.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return await call(), attempt
+        except Exception as e:
+            if attempt > max_retries or not _is_transient(e):
+                raise
+            delay = _retry_after(e) or min(base_delay * 2 ** (attempt - 1), max_delay)
+            delay *= 1 + random.random() / 2
+            logger.warning(
+                "Attempt %d failed (%r), retrying in %.1fs", attempt, e, delay
+            )
+            await asyncio.sleep(delay)
+
+
+class Checkpoint:
+    """
+    JSONL file of the results of an evaluation run, appended to as each question
+    completes, so that an interrupted run resumes where it stopped.
+    When a question has several lines, the last one wins.
+    """
+
+    path: Path
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = asyncio.Lock()
+
+    def load(self) -> dict[str, dict]:
+        """
+        :return: The latest result of each question, by question id.
+        """
+        if not self.path.exists():
+            return {}
+        content = self.path.read_text(encoding="utf-8")
+        if content and not content.endswith("\n"):
+            # Terminate a torn last line, so that the next record starts on its own
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write("\n")
+        results = {}
+        for line in content.splitlines():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Torn last line of an interrupted run
+                logger.warning("Skipping a corrupted line of %s", self.path)
+                continue
+            results[record["id"]] = record
+        return results
+
+    async def append(self, record: dict):
+        async with self._lock:
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+class EvaluationRunner:
+    """
+    Answer the questions of a golden set with an agent and grade the answers with an
+    LLM judge, a bounded number of questions at a time.
+
+    Each question goes through `invoke_chatbot` on a new chat, then to the judge: the
+    answering and the grading have their own concurrency limits, so the judge grades
+    the first answers while the next questions are answered. Every result is appended
+    to the checkpoint, and the questions already answered (or graded, with a judge)
+    are skipped when the run resumes.
+    """
+
+    agent_id: str
+    checkpoint: Checkpoint
+    judge: BaseChatModel | None
+    concurrency: int
+    judge_concurrency: int
+    max_retries: int
+
+    def __init__(
+        self,
+        agent_id: str,
+        checkpoint: Checkpoint,
+        judge: BaseChatModel | None = None,
+        concurrency: int = 4,
+        judge_concurrency: int = 4,
+        max_retries: int = 5,
+    ):
+        """
+        :param agent_id: The agent answering the questions.
+        :param checkpoint: Where the results are appended and resumed from.
+        :param judge: The LLM grading the answers, None to only answer.
+        :param concurrency: Questions answered at the same time.
+        :param judge_concurrency: Answers graded at the same time.
+        :param max_retries: Retries of an answer or a grading on rate limits and transient errors.
+        """
+        self.agent_id = agent_id
+        self.checkpoint = checkpoint
+        self.judge = judge
+        self.concurrency = concurrency
+        self.judge_concurrency = judge_concurrency
+        self.max_retries = max_retries
+        self._answering = asyncio.Semaphore(concurrency)
+        self._grading = asyncio.Semaphore(judge_concurrency)
+        self._completed = 0
+
+    def _is_done(self, record: dict | None) -> bool:
+        if record is None or record.get("error") or record.get("answer") is None:
+            return False
+        return self.judge is None or record.get("correct") is not None
+
+    async def _answer(self, question: GoldenQuestion) -> tuple[str, int]:
+        async def call() -> str:
+            user_input = UserInput(message=question.question, chat_id=str(uuid4()))
+            return (await invoke_chatbot(user_input, self.agent_id)).content
+
+        return await with_retries(call, self.max_retries)
+
+    async def _grade(self, answer: str, expected: str) -> bool:
+        async def call() -> bool:
+            response = await self.judge.ainvoke(  # type: ignore[union-attr]
+                [
+                    {"role": "system", "content": JUDGE_INSTRUCTIONS},
+                    {
+                        "role": "user",
+                        "content": f"ACTUAL ANSWER: {answer}\n\nEXPECTED ANSWER: {expected}",
+                    },
+                ]
+            )
+            return str(response.content).strip().upper() == "CORRECT"
+
+        correct, _ = await with_retries(call, self.max_retries)
+        return correct
+
+    async def _evaluate(
+        self, question: GoldenQuestion, previous: dict | None, total: int
+    ) -> dict:
+        # An answer of a previous run is kept, only its grading is redone
+        record = previous if previous and previous.get("answer") is not None else None
+        if record is None:
+            record = {
+                "id": question.id,
+                "question": question.question,
+                "expected": question.answer,
+                "answer": None,
+                "correct": None,
+                "latency_s": None,
+                "attempts": 0,
+                "error": None,
+            }
+            async with self._answering:
+                start = time.perf_counter()
+                try:
+                    record["answer"], record["attempts"] = await self._answer(question)
+                    record["latency_s"] = round(time.perf_counter() - start, 3)
+                except Exception as e:
+                    logger.error("Question %s failed: %r", question.id, e)
+                    record["error"] = repr(e)
+            await self.checkpoint.append(record)
+
+        if self.judge is not None and record["answer"] is not None:
+            async with self._grading:
+                try:
+                    record["correct"] = await self._grade(
+                        record["answer"], question.answer
+                    )
+                    record["error"] = None
+                except Exception as e:
+                    logger.error("Grading of question %s failed: %r", question.id, e)
+                    record["error"] = f"judge: {e!r}"
+            await self.checkpoint.append(record)
+
+        self._completed += 1
+        logger.info("%d/%d questions evaluated", self._completed, total)
+        return record
+
+    async def run(self, questions: list[GoldenQuestion]) -> list[dict]:
+        """
+        Evaluate the questions not completed by a previous run.
+
+        :param questions: The golden set.
+        :return: The results of all the questions, resumed ones included, in order.
+        """
+        previous = self.checkpoint.load()
+        pending = [q for q in questions if not self._is_done(previous.get(q.id))]
+        if len(pending) < len(questions):
+            logger.info(
+                "Resuming from %s: %d questions already evaluated",
+                self.checkpoint.path,
+                len(questions) - len(pending),
+            )
+        self._completed = 0
+        records = await asyncio.gather(
+            *(self._evaluate(q, previous.get(q.id), len(pending)) for q in pending)
+        )
+        results = previous | {record["id"]: record for record in records}
+        return [results[q.id] for q in questions]
+
+
+def summarize(results: list[dict]) -> dict:
+    """
+    Accuracy over the graded answers, error count and answer latency percentiles.
+    """
+    graded = [r["correct"] for r in results if r.get("correct") is not None]
+    latencies = sorted(
+        r["latency_s"] for r in results if r.get("latency_s") is not None
+    )
+
+    def percentile(q: float) -> float | None:
+        if not latencies:
+            return None
+        return latencies[min(int(len(latencies) * q / 100), len(latencies) - 1)]
+
+    return {
+        "questions": len(results),
+        "answered": sum(r.get("answer") is not None for r in results),
+        "errors": sum(bool(r.get("error")) for r in results),
+        "graded": len(graded),
+        "accuracy": sum(graded) / len(graded) if graded else None,
+        "latency_s": {
+            "p50": percentile(50),
+            "p95": percentile(95),
+            "max": percentile(100),
+        },
+    }
@@ -0,0 +1,3 @@
+from plum_chatbot.ingestion.cli import main
+
+main()
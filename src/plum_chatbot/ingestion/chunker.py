@@ -0,0 +1,116 @@
+import hashlib
+import re
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+
+IMAGE_PATTERN = re.compile(r"!\[Image\]\((.*?)\)")
+INDEXED_IMAGE_PATTERN = re.compile(r"!\[Image\]\((\d+)\)")
+_IMAGE_ONLY_PATTERN = re.compile(r"^\s*!\[Image\]\(\d+\)\s*$")
+_SEPARATOR = "[###SEPARATOR###]"
+
+# Namespace of the point ids: the same chunk always gets the same id
+CHUNK_NAMESPACE = uuid.UUID("6f1c5e0e-3b8a-4a53-9c1e-2f0d3b7a9e41")
+
+
+@dataclass
+class Chunk:
+    content: str
+    split_index: int
+    source: str
+    title: str
+    images: dict[int, str] = field(default_factory=dict)
+    # Deterministic point id, derived from the document title, the chunk content and
+    # its images: the content only holds the indices of the images
+    id: str = field(init=False)
+
+    def __post_init__(self):
+        # Computed once, from the images as extracted: the pipeline then replaces them
+        # with references to the image store
+        images_hash = hashlib.sha256(
+            "".join(
+                hashlib.sha256(image.encode("utf-8")).hexdigest()
+                for _, image in sorted(self.images.items())
+            ).encode("utf-8")
+        ).hexdigest()
+        self.id = str(
+            uuid.uuid5(
+                CHUNK_NAMESPACE, f"{self.title}:{self.content_hash}:{images_hash}"
+            )
+        )
+
+    @property
+    def content_hash(self) -> str:
+        return hashlib.sha256(self.content.encode("utf-8")).hexdigest()
+
+    def payload(self) -> dict:
+        return {
+            "id": self.id,
+            "content": self.content,
+            "split_index": self.split_index,
+            "metadata": {
+                "source": self.source,
+                "title": self.title,
+                "images": self.images,
+            },
+        }
+
+
+def extract_images(content: str) -> tuple[str, dict[int, str]]:
+    """
+    Replace every inline image of a Markdown text with its index.
+
+    :param content: The Markdown text.
+    :return: The text with `![Image](<index>)` references and the images by index.
+    """
+    images: list[str] = []
+
+    def replace_with_index(match: re.Match) -> str:
+        image = match.group(1)
+        if image not in images:
+            images.append(image)
+        return f"![Image]({images.index(image)})"
+
+    content_indexed = IMAGE_PATTERN.sub(replace_with_index, content)
+    return content_indexed, dict(enumerate(images))
+
+
+def chunk_markdown(markdown_path: Path) -> list[Chunk]:
+    """
+    Split a Markdown extraction into chunks, one per image-delimited section.
+    Sections made only of an image are merged into the preceding one.
+
+    :param markdown_path: The Markdown extraction of a document.
+    :return: The chunks of the document.
+    """
+    content, images = extract_images(markdown_path.read_text(encoding="utf-8"))
+
+    new_content = re.sub(r"(!\[Image\]\(\d+\))", f"\\1{_SEPARATOR}", content)
+    splits = [
+        split.replace("\n", " ").strip()
+        for split in new_content.split(_SEPARATOR)
+        if split.strip()
+    ]
+
+    merged_splits: list[str] = []
+    for split in splits:
+        if _IMAGE_ONLY_PATTERN.match(split) and merged_splits:
+            merged_splits[-1] += " " + split
+        else:
+            merged_splits.append(split)
+
+    chunks = []
+    for i, split in enumerate(merged_splits):
+        image_indices = {int(num) for num in INDEXED_IMAGE_PATTERN.findall(split)}
+        chunks.append(
+            Chunk(
+                content=split,
+                split_index=i,
+                source=str(markdown_path),
+                title=markdown_path.name,
+                images={
+                    idx: images[idx] for idx in sorted(image_indices) if idx in images
+                },
+            )
+        )
+    return chunks
@@ -0,0 +1,71 @@
+import argparse
+import asyncio
+import logging
+from pathlib import Path
+
+from plum_chatbot.configs.folders import EXTRACTIONS_DIR, PDF_DIR
+from plum_chatbot.configs.logger import setup_global_logging
+from plum_chatbot.di_containers.datasources_containers import get_qdrant_datasource
+from plum_chatbot.ingestion.pipeline import MANIFEST_PATH, IngestionPipeline
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="plum-ingest",
+        description="Convert, chunk, embed and index the PDFs into the Qdrant collection.",
+    )
+    parser.add_argument("--pdf-dir", type=Path, default=PDF_DIR)
+    parser.add_argument("--extractions-dir", type=Path, default=EXTRACTIONS_DIR)
+    parser.add_argument("--manifest", type=Path, default=MANIFEST_PATH)
+    parser.add_argument(
+        "--workers", type=int, default=2, help="Processes converting the PDFs"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=32,
+        help="Chunks per embedding pass and upsert",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Reprocess every PDF and upsert all its chunks, ignoring the manifest",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Only list the PDFs to (re)process"
+    )
+    return parser.parse_args(argv)
+
+
+async def ingest(args: argparse.Namespace):
+    datasource = get_qdrant_datasource()
+    await datasource.setup()
+    try:
+        pipeline = IngestionPipeline(
+            datasource,
+            pdf_dir=args.pdf_dir,
+            extractions_dir=args.extractions_dir,
+            manifest_path=args.manifest,
+            workers=args.workers,
+            batch_size=args.batch_size,
+        )
+        report = pipeline.run(force=args.force, dry_run=args.dry_run)
+        if args.dry_run:
+            logger.info(
+                "To process: %s, to remove: %s", report.converted, report.removed
+            )
+        else:
+            logger.info("Ingestion completed: %s", report)
+    finally:
+        await datasource.shutdown()
+
+
+def main(argv: list[str] | None = None):
+    setup_global_logging()
+    asyncio.run(ingest(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from docling.document_converter import DocumentConverter
+
+logger = logging.getLogger(__name__)
+
+# One converter per worker process, built on the first conversion
+_converter: "DocumentConverter | None" = None
+
+
+def _get_converter() -> "DocumentConverter":
+    global _converter
+    if _converter is None:
+        # Imported lazily: docling loads its layout models on import
+        from docling.datamodel.base_models import InputFormat
+        from docling.datamodel.pipeline_options import PdfPipelineOptions
+        from docling.document_converter import DocumentConverter, PdfFormatOption
+
+        pipeline_options = PdfPipelineOptions(
+            do_table_structure=False,
+            do_ocr=False,
+            images_scale=1,
+            generate_page_images=True,
+            generate_picture_images=True,
+        )
+        _converter = DocumentConverter(
+            format_options={
+                InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
+            }
+        )
+    return _converter
+
+
+def convert_pdf(pdf_path: Path, output_dir: Path) -> Path:
+    """
+    Convert a PDF to Markdown with docling, embedding the images as base64 data URIs.
+
+    :param pdf_path: The PDF to convert.
+    :param output_dir: Directory where the Markdown file is written.
+    :return: The path of the Markdown file.
+    """
+    from docling_core.types.doc.base import ImageRefMode
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    markdown_path = output_dir / f"{pdf_path.name}.md"
+    result = _get_converter().convert(pdf_path)
+    result.document.save_as_markdown(markdown_path, image_mode=ImageRefMode.EMBEDDED)
+    return markdown_path
+
+
+def convert_pdfs(
+    pdf_paths: list[Path], output_dir: Path, workers: int = 2
+) -> dict[Path, Path]:
+    """
+    Convert several PDFs in a process pool, one file per task.
+
+    :param pdf_paths: The PDFs to convert.
+    :param output_dir: Directory where the Markdown files are written.
+    :param workers: Number of worker processes.
+    :return: Mapping of each PDF to its Markdown file.
+    """
+    if not pdf_paths:
+        return {}
+    if workers <= 1 or len(pdf_paths) == 1:
+        return {pdf_path: convert_pdf(pdf_path, output_dir) for pdf_path in pdf_paths}
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(pdf_paths))) as executor:
+        futures = {
+            pdf_path: executor.submit(convert_pdf, pdf_path, output_dir)
+            for pdf_path in pdf_paths
+        }
+        markdowns = {}
+        for pdf_path, future in futures.items():
+            markdowns[pdf_path] = future.result()
+            logger.info("Converted %s", pdf_path.name)
+        return markdowns
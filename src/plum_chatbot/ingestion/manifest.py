@@ -0,0 +1,75 @@
+import hashlib
+import json
+from pathlib import Path
+
+# Bumped when the indexed vectors change, to re-upsert the chunks indexed before:
+# 2 adds the bm25 sparse vector
+INDEX_VERSION = 2
+
+
+def file_hash(path: Path) -> str:
+    """
+    SHA-256 of a file's content.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestionManifest:
+    """
+    Record of the ingested files: the hash of each PDF and the ids of its chunks,
+    so that a new run only reprocesses what changed.
+    """
+
+    path: Path
+    collection_name: str
+    files: dict[str, dict]
+
+    def __init__(self, path: Path, collection_name: str):
+        self.path = path
+        self.collection_name = collection_name
+        self.files = {}
+        if path.exists():
+            data = json.loads(path.read_text(encoding="utf-8"))
+            # A manifest written for another collection says nothing about this one
+            if data.get("collection") == collection_name:
+                self.files = data.get("files", {})
+
+    def file_changed(self, name: str, sha256: str) -> bool:
+        entry = self.files.get(name)
+        return entry is None or entry["sha256"] != sha256 or self.outdated(name)
+
+    def outdated(self, name: str) -> bool:
+        """
+        Whether the chunks of a file were indexed by an older version of the pipeline.
+        """
+        return self.files.get(name, {}).get("index_version", 1) != INDEX_VERSION
+
+    def chunk_ids(self, name: str) -> set[str]:
+        return set(self.files.get(name, {}).get("chunks", []))
+
+    def update(self, name: str, sha256: str, chunk_ids: list[str]):
+        self.files[name] = {
+            "sha256": sha256,
+            "chunks": chunk_ids,
+            "index_version": INDEX_VERSION,
+        }
+
+    def remove(self, name: str):
+        self.files.pop(name, None)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(
+            json.dumps(
+                {"collection": self.collection_name, "files": self.files},
+                ensure_ascii=False,
+                indent=2,
+            ),
+            encoding="utf-8",
+        )
+        tmp_path.replace(self.path)
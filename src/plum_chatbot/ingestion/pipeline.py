@@ -0,0 +1,181 @@
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from qdrant_client import models
+
+from plum_chatbot.configs.folders import DATA_DIR, EXTRACTIONS_DIR, PDF_DIR
+from plum_chatbot.datasources.image_store import ImageStore
+from plum_chatbot.datasources.qdrant_datasource import QdrantDatasource
+from plum_chatbot.datasources.sparse_encoder import SPARSE_VECTOR_NAME
+from plum_chatbot.ingestion.chunker import Chunk, chunk_markdown
+from plum_chatbot.ingestion.converter import convert_pdfs
+from plum_chatbot.ingestion.manifest import IngestionManifest, file_hash
+
+MANIFEST_PATH = DATA_DIR / "ingestion_manifest.json"
+
+
+@dataclass
+class IngestionReport:
+    converted: list[str] = field(default_factory=list)
+    unchanged: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    upserted: int = 0
+    deleted: int = 0
+    kept: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{len(self.converted)} converted, {len(self.unchanged)} unchanged, "
+            f"{len(self.removed)} removed PDFs; "
+            f"{self.upserted} upserted, {self.kept} kept, {self.deleted} deleted chunks"
+        )
+
+
+class IngestionPipeline:
+    """
+    Incremental ingestion of the PDFs into the Qdrant collection.
+
+    PDFs are compared with the manifest by content hash: only new or modified files
+    are converted and chunked. Chunk ids are derived from their content, so only the
+    chunks which actually changed are embedded and upserted, and the chunks which
+    disappeared are deleted.
+    """
+
+    datasource: QdrantDatasource
+    pdf_dir: Path
+    extractions_dir: Path
+    manifest: IngestionManifest
+    image_store: ImageStore
+    workers: int
+    batch_size: int
+    logger: logging.Logger
+
+    def __init__(
+        self,
+        datasource: QdrantDatasource,
+        pdf_dir: Path = PDF_DIR,
+        extractions_dir: Path = EXTRACTIONS_DIR,
+        manifest_path: Path = MANIFEST_PATH,
+        image_store: ImageStore | None = None,
+        workers: int = 2,
+        batch_size: int = 32,
+    ):
+        """
+        Initialize the ingestion pipeline.
+
+        :param datasource: The Qdrant datasource, already set up.
+        :param pdf_dir: Directory of the PDFs to ingest.
+        :param extractions_dir: Directory where the Markdown extractions are written.
+        :param manifest_path: Path of the ingestion manifest.
+        :param image_store: Store of the extracted images.
+        :param workers: Number of processes converting the PDFs.
+        :param batch_size: Number of chunks per embedding pass and per upsert.
+        """
+        self.datasource = datasource
+        self.pdf_dir = pdf_dir
+        self.extractions_dir = extractions_dir
+        self.manifest = IngestionManifest(manifest_path, datasource.collection_name)
+        self.image_store = image_store or ImageStore()
+        self.workers = workers
+        self.batch_size = batch_size
+        self.logger = logging.getLogger(__name__)
+
+    def run(self, force: bool = False, dry_run: bool = False) -> IngestionReport:
+        """
+        Ingest the new and modified PDFs and drop the removed ones.
+
+        :param force: Reprocess every PDF and upsert all their chunks, whatever the
+                      manifest says.
+        :param dry_run: Only report what would be converted and removed.
+        :return: The ingestion report.
+        """
+        report = IngestionReport()
+        if not dry_run and self.datasource.ensure_collection():
+            # A new, empty collection: whatever the manifest says, nothing is indexed
+            self.manifest.files.clear()
+
+        hashes = {
+            pdf.name: file_hash(pdf) for pdf in sorted(self.pdf_dir.glob("*.pdf"))
+        }
+        changed = [
+            name
+            for name, sha256 in hashes.items()
+            if force or self.manifest.file_changed(name, sha256)
+        ]
+        report.unchanged = [name for name in hashes if name not in changed]
+        report.removed = [name for name in self.manifest.files if name not in hashes]
+        if dry_run:
+            report.converted = changed
+            return report
+
+        for name in report.removed:
+            report.deleted += self._delete(self.manifest.chunk_ids(name))
+            self.manifest.remove(name)
+            self.manifest.save()
+
+        markdowns = convert_pdfs(
+            [self.pdf_dir / name for name in changed],
+            self.extractions_dir,
+            workers=self.workers,
+        )
+        for name in changed:
+            chunks = chunk_markdown(markdowns[self.pdf_dir / name])
+            previous_ids = self.manifest.chunk_ids(name)
+            current_ids = [chunk.id for chunk in chunks]
+
+            new_chunks = (
+                chunks
+                if force or self.manifest.outdated(name)
+                else [chunk for chunk in chunks if chunk.id not in previous_ids]
+            )
+            report.upserted += self._upsert(new_chunks)
+            report.kept += len(chunks) - len(new_chunks)
+            report.deleted += self._delete(previous_ids - set(current_ids))
+
+            # Saved after each file, so an interrupted run resumes where it stopped
+            self.manifest.update(name, hashes[name], current_ids)
+            self.manifest.save()
+            report.converted.append(name)
+            self.logger.info(
+                "Ingested %s: %d/%d new chunks", name, len(new_chunks), len(chunks)
+            )
+        return report
+
+    def _upsert(self, chunks: list[Chunk]) -> int:
+        # Chunks repeated within a document share their id: index them once
+        chunks = list({chunk.id: chunk for chunk in chunks}.values())
+        for start in range(0, len(chunks), self.batch_size):
+            batch = chunks[start : start + self.batch_size]
+            for chunk in batch:
+                chunk.images = self.image_store.externalize(chunk.images)
+            contents = [chunk.content for chunk in batch]
+            embeddings = self.datasource.embed_documents(
+                contents, batch_size=self.batch_size
+            )
+            sparse_vectors = self.datasource.embed_sparse_documents(contents)
+            self.datasource.client.upsert(
+                self.datasource.collection_name,
+                points=[
+                    models.PointStruct(
+                        id=chunk.id,
+                        vector={
+                            "": embedding.tolist(),
+                            SPARSE_VECTOR_NAME: sparse_vector,
+                        },
+                        payload=chunk.payload(),
+                    )
+                    for chunk, embedding, sparse_vector in zip(
+                        batch, embeddings, sparse_vectors
+                    )
+                ],
+            )
+        return len(chunks)
+
+    def _delete(self, ids: set[str]) -> int:
+        if ids:
+            self.datasource.client.delete(
+                self.datasource.collection_name,
+                points_selector=models.PointIdsList(points=sorted(ids)),
+            )
+        return len(ids)
@@ -15,11 +15,11 @@ qa_pairs = {
 
 
 def chatbot_response(message):
-    logger.info(f"Received message: {message}")
+    logger.info("Received message: %s", message)
     response = qa_pairs.get(
         message.strip().lower(), "Sorry, I don't understand that question."
     )
-    logger.info(f"Response: {response}")
+    logger.info("Response: %s", response)
 
     return {"role": "assistant", "content": response}
 
@@ -16,6 +16,8 @@ class Agent(BaseModel):
     llm: BaseChatModel = Field(exclude=True)
     tools: list[BaseTool] = Field(default_factory=list, exclude=True)
     prompt: str | None = Field(default=None, exclude=True)
+    # Whether the graph may stop on interrupts, to be resumed by the next user message
+    uses_interrupts: bool = Field(default=False, exclude=True)
 
     class Config:
         arbitrary_types_allowed = True
@@ -32,7 +32,7 @@ async def ask_chatbot(message, history, state):
     # Always respond with "yes" as a message tuple (user, bot)
     # history = history or []
     # history.append((message, "yes"))
-    logger.info(f"Received message: {message}")
+    logger.info("Received message: %s", message)
     response: ChatMessage = await invoke_chatbot(
         UserInput(message=message), Settings().DEFAULT_AGENT
     )
@@ -41,7 +41,9 @@ async def ask_chatbot(message, history, state):
         question=message,
         answer=response.content,
     )
-    get_postgres_datasource().insert(db_message)
+    datasource = get_postgres_datasource()
+    async with datasource.session() as session:
+        await datasource.insert(session, db_message)
     # if not state("thread_id", None):
     #     logger.info("No thread_id found in state, setting it now.")
     #     state["thread_id"] = response.thread_id
@@ -0,0 +1,18 @@
+import subprocess
+
+
+def git_commit() -> str | None:
+    """
+    Short hash of the checked-out commit, recorded with the benchmark results.
+
+    :return: The hash, or None outside of a git checkout.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
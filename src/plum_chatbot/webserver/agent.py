@@ -1,11 +1,18 @@
+import json
 import logging
-from typing import Annotated
-from uuid import UUID
+from collections.abc import AsyncGenerator
+from typing import Annotated, Any
+from uuid import UUID, uuid4
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
 
-from plum_chatbot.agents.agents import invoke_chatbot
+from plum_chatbot.agents.agents import invoke_chatbot, stream_chatbot
+from plum_chatbot.configs.request_log import request_log
 from plum_chatbot.configs.settings import Settings
+from plum_chatbot.configs.tracing import tracer
 from plum_chatbot.datasources.models.chat_message import (
     Chat,
 )
@@ -13,17 +20,32 @@ from plum_chatbot.datasources.models.chat_message import (
     ChatMessage as DBChatMessage,
 )
 from plum_chatbot.datasources.postgres_datasource import PostgresDatasource
-from plum_chatbot.di_containers.datasources_containers import get_postgres_datasource
-from plum_chatbot.schemas.schema import ChatMessage, UserInput
+from plum_chatbot.di_containers.datasources_containers import (
+    get_postgres_datasource,
+    get_postgres_session,
+)
+from plum_chatbot.schemas.schema import ChatMessage, StreamInput, UserInput
+from plum_chatbot.webserver.rate_limit import rate_limit
 
-router = APIRouter(prefix="/agent", tags=["agent"])
+router = APIRouter(prefix="/agent", tags=["agent"], dependencies=[Depends(rate_limit)])
 logger = logging.getLogger(__name__)
 
 
+def _chat_uuid(chat_id: str | None) -> UUID | None:
+    """
+    The chat id of a request, None if missing or malformed: both are a chat not found.
+    """
+    try:
+        return UUID(chat_id) if chat_id else None
+    except ValueError:
+        return None
+
+
 @router.post("/{agent_id}/invoke")
 @router.post("/invoke")
 async def invoke(
     datasource: Annotated[PostgresDatasource, Depends(get_postgres_datasource)],
+    session: Annotated[AsyncSession, Depends(get_postgres_session)],
     user_input: UserInput,
     agent_id: str = Settings().DEFAULT_AGENT,
 ) -> ChatMessage:
@@ -34,6 +56,9 @@ async def invoke(
     Use `chat_id` to persist and continue a multi-turn conversation. `run_id` kwarg
     is also attached to messages for recording feedback.
     Use `user_id` to persist and continue a conversation across multiple threads.
+    With `TRACING_DEBUG` set, the timings of the request are attached to the
+    `timings` field of the response metadata. With `REQUEST_LOG_PATH` set, the request
+    is recorded to the request log.
     """
     # NOTE: Currently this only returns the last message or interrupt.
     # In the case of an agent outputting multiple AIMessages (such as the background step
@@ -42,24 +67,132 @@ async def invoke(
     # in that case.
 
     try:
-        if (
-            not user_input.chat_id
-            or datasource.find(Chat, UUID(user_input.chat_id)) is None
+        with (
+            tracer.start_as_current_span("agent.invoke", {"agent.id": agent_id}),
+            request_log.track(
+                "invoke",
+                agent_id,
+                user_input.message,
+                chat_id=user_input.chat_id,
+                user_id=user_input.user_id,
+            ),
         ):
-            raise HTTPException(
-                status_code=404, detail="Chat session not found or not provided."
+            with tracer.start_as_current_span("chat.lookup"):
+                chat_uuid = _chat_uuid(user_input.chat_id)
+                chat = (
+                    await datasource.find(session, Chat, chat_uuid)
+                    if chat_uuid is not None
+                    else None
+                )
+            if chat is None:
+                raise HTTPException(
+                    status_code=404, detail="Chat session not found or not provided."
+                )
+            answer: ChatMessage = await invoke_chatbot(user_input, agent_id)
+            db_message: DBChatMessage = DBChatMessage(
+                chat_id=answer.thread_id,
+                question=user_input.message,
+                answer=answer.content,
             )
-        answer: ChatMessage = await invoke_chatbot(user_input, agent_id)
-        db_message: DBChatMessage = DBChatMessage(
-            chat_id=answer.thread_id,
-            question=user_input.message,
-            answer=answer.content,
-        )
-        datasource.insert(db_message)
-        answer.message_id = str(db_message.id)
+            with tracer.start_as_current_span("chat.insert"):
+                await datasource.insert(session, db_message)
+            answer.message_id = str(db_message.id)
+            if (timings := tracer.current_breakdown()) is not None:
+                answer.response_metadata = {
+                    **answer.response_metadata,
+                    "timings": timings,
+                }
         return answer
     except Exception as e:
-        logger.error(f"An exception occurred: {e}")
+        logger.error("An exception occurred: %s", e)
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=500, detail=f"Unexpected error: {e}")
+
+
+def _sse_event(event_type: str, content: Any) -> str:
+    return (
+        f"data: {json.dumps({'type': event_type, 'content': content}, default=str)}\n\n"
+    )
+
+
+@router.post(
+    "/{agent_id}/stream",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {}}}},
+)
+@router.post(
+    "/stream",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {}}}},
+)
+async def stream(
+    datasource: Annotated[PostgresDatasource, Depends(get_postgres_datasource)],
+    session: Annotated[AsyncSession, Depends(get_postgres_session)],
+    user_input: StreamInput,
+    agent_id: str = Settings().DEFAULT_AGENT,
+) -> StreamingResponse:
+    """
+    Stream an agent's response to user input as server-sent events.
+
+    Each event is a `data:` line holding a JSON object with a `type` and a `content`:
+    - `token`: a token of the answer, sent only if `stream_tokens` is set;
+    - `tool_start` / `tool_end`: a tool call starting or ending;
+    - `message`: the final `ChatMessage`;
+    - `error`: the run failed.
+    The stream ends with `data: [DONE]`. The message is saved once the stream is closed.
+    With `TRACING_DEBUG` set, the timings of the run are attached to the `timings`
+    field of the message response metadata.
+    """
+    chat_uuid = _chat_uuid(user_input.chat_id)
+    if chat_uuid is None or await datasource.find(session, Chat, chat_uuid) is None:
+        raise HTTPException(
+            status_code=404, detail="Chat session not found or not provided."
+        )
+
+    message_id = uuid4()
+    final: dict[str, ChatMessage] = {}
+
+    async def message_generator() -> AsyncGenerator[str, None]:
+        try:
+            with tracer.start_as_current_span("agent.stream", {"agent.id": agent_id}):
+                async for event_type, content in stream_chatbot(user_input, agent_id):
+                    if event_type == "message":
+                        content.message_id = str(message_id)
+                        if (timings := tracer.current_breakdown()) is not None:
+                            content.response_metadata = {
+                                **content.response_metadata,
+                                "timings": timings,
+                            }
+                        final["answer"] = content
+                        content = content.model_dump()
+                    yield _sse_event(event_type, content)
+        except Exception as e:
+            logger.error("An exception occurred while streaming: %s", e)
+            yield _sse_event("error", f"Unexpected error: {e}")
+        yield "data: [DONE]\n\n"
+
+    async def save_message():
+        answer = final.get("answer")
+        if answer is None:
+            return
+        try:
+            # The request session is already closed once the response is sent
+            async with datasource.session() as background_session:
+                await datasource.insert(
+                    background_session,
+                    DBChatMessage(
+                        id=message_id,
+                        chat_id=answer.thread_id,
+                        question=user_input.message,
+                        answer=answer.content,
+                    ),
+                )
+        except Exception as e:
+            logger.error("Could not save the streamed message: %s", e)
+
+    return StreamingResponse(
+        message_generator(),
+        media_type="text/event-stream",
+        background=BackgroundTask(save_message),
+    )
@@ -3,10 +3,17 @@ from typing import Annotated
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from plum_chatbot.datasources.checkpoint_datasource import CheckpointDatasource
 from plum_chatbot.datasources.models.chat_message import Chat
 from plum_chatbot.datasources.postgres_datasource import PostgresDatasource
-from plum_chatbot.di_containers.datasources_containers import get_postgres_datasource
+from plum_chatbot.di_containers.datasources_containers import (
+    get_checkpoint_datasource,
+    get_postgres_datasource,
+    get_postgres_session,
+    get_thread_status,
+)
 from plum_chatbot.schemas.schema import ChatMessage
 from plum_chatbot.webserver.dtos.chat_dto import (
     CloseChatOutput,
@@ -22,6 +29,7 @@ logger = logging.getLogger(__name__)
 @router.post("/new")
 async def new_chat(
     datasource: Annotated[PostgresDatasource, Depends(get_postgres_datasource)],
+    session: Annotated[AsyncSession, Depends(get_postgres_session)],
     chat_input: NewChatInput,
 ) -> NewChatOutput:
     """
@@ -31,7 +39,7 @@ async def new_chat(
         chat: Chat = Chat(
             user_id=chat_input.user_id,
         )
-        datasource.insert(chat)
+        await datasource.insert(session, chat)
         return NewChatOutput(
             chat_id=UUID(str(chat.id)),
             message=ChatMessage(
@@ -40,49 +48,58 @@ async def new_chat(
             ),
         )
     except Exception as e:
-        logger.error(f"An exception occurred: {e}")
+        logger.error("An exception occurred: %s", e)
         raise HTTPException(status_code=500, detail=f"Unexpected error: {e}")
 
 
 @router.get("/{chat_id}/close")
 async def close_chat(
     datasource: Annotated[PostgresDatasource, Depends(get_postgres_datasource)],
+    session: Annotated[AsyncSession, Depends(get_postgres_session)],
+    checkpoints: Annotated[CheckpointDatasource, Depends(get_checkpoint_datasource)],
     chat_id: UUID,
 ) -> CloseChatOutput:
     """
     Close an existing chat session.
     """
     try:
-        chat = datasource.find(Chat, chat_id)
+        chat = await datasource.find(session, Chat, chat_id)
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
 
-        datasource.update(chat, is_closed=True)
+        await datasource.update(session, chat, is_closed=True)
+        # The conversation state is not needed anymore once the chat is closed
+        await checkpoints.evict_thread(str(chat_id))
+        await get_thread_status().aforget(str(chat_id))
         return CloseChatOutput(
             success=True, message="Chat session closed successfully."
         )
     except Exception as e:
-        logger.error(f"An exception occurred: {e}")
+        logger.error("An exception occurred: %s", e)
         raise HTTPException(status_code=500, detail=f"Unexpected error: {e}")
 
 
 @router.delete("/{chat_id}")
 async def delete_chat(
     datasource: Annotated[PostgresDatasource, Depends(get_postgres_datasource)],
+    session: Annotated[AsyncSession, Depends(get_postgres_session)],
+    checkpoints: Annotated[CheckpointDatasource, Depends(get_checkpoint_datasource)],
     chat_id: UUID,
 ) -> DeleteChatOutput:
     """
     Delete an existing chat session.
     """
     try:
-        chat = datasource.find(Chat, chat_id)
+        chat = await datasource.find(session, Chat, chat_id)
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
 
-        datasource.delete(chat)
+        await datasource.delete(session, chat)
+        await checkpoints.evict_thread(str(chat_id))
+        await get_thread_status().aforget(str(chat_id))
         return DeleteChatOutput(
             success=True, message="Chat session deleted successfully."
         )
     except Exception as e:
-        logger.error(f"An exception occurred: {e}")
+        logger.error("An exception occurred: %s", e)
         raise HTTPException(status_code=500, detail=f"Unexpected error: {e}")
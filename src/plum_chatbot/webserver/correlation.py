@@ -0,0 +1,57 @@
+import os
+from uuid import uuid4
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from plum_chatbot.configs.logger import request_id_var
+
+REQUEST_ID_HEADER = b"x-request-id"
+WORKER_PID_HEADER = b"x-worker-pid"
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware giving each HTTP request an id, taken from its `X-Request-ID`
+    header or generated, that the log records of the request carry and that is
+    returned in the `X-Request-ID` header of the response.
+
+    With several workers, the `X-Worker-Pid` header of the response tells the worker
+    which served the request, whose log file (`application.<pid>.log`) holds its records.
+    """
+
+    def __init__(self, app: ASGIApp, worker_header: bool = False):
+        """
+        :param app: The wrapped application.
+        :param worker_header: Whether to add the `X-Worker-Pid` header to the responses.
+        """
+        self.app = app
+        self.response_headers = (
+            [(WORKER_PID_HEADER, str(os.getpid()).encode("latin-1"))]
+            if worker_header
+            else []
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        request_id = (
+            headers.get(REQUEST_ID_HEADER, b"").decode("latin-1")[:64] or uuid4().hex
+        )
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (REQUEST_ID_HEADER, request_id.encode("latin-1")),
+                    *self.response_headers,
+                ]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
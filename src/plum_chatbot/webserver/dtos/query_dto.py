@@ -0,0 +1,43 @@
+from pydantic import BaseModel, Field
+
+from plum_chatbot.datasources.models.qdrant_models import QdrantDocument
+
+
+class BatchQueryInput(BaseModel):
+    """
+    Represents the input of a batch query against the vector database.
+    """
+
+    queries: list[str] = Field(
+        description="Query strings to search for.",
+        min_length=1,
+        examples=[["Come cambio la mail?", "Come aggiorno la pec?"]],
+    )
+    limit: int = Field(
+        description="Maximum number of documents returned per query.",
+        default=2,
+        ge=1,
+        examples=[2],
+    )
+
+
+class QueryResult(BaseModel):
+    """
+    Represents the documents retrieved for one query.
+    """
+
+    query: str = Field(
+        description="The query string.",
+        examples=["Come cambio la mail?"],
+    )
+    results: list[QdrantDocument] = Field(
+        description="The retrieved documents.",
+    )
+
+
+class BatchQueryOutput(BaseModel):
+    """
+    Represents the output of a batch query, one result per query, in order.
+    """
+
+    results: list[QueryResult]
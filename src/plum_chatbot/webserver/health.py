@@ -0,0 +1,60 @@
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class DependencyHealth:
+    """
+    Health of the external dependencies (Qdrant, Postgres), probed with a round trip
+    each and cached for `ttl` seconds, so that frequent health checks stay cheap.
+    Concurrent checks wait for the same probe instead of starting their own.
+    """
+
+    probes: dict[str, Callable[[], Awaitable[None]]]
+    ttl: float
+    timeout: float
+
+    def __init__(
+        self,
+        probes: dict[str, Callable[[], Awaitable[None]]],
+        ttl: float = 5,
+        timeout: float = 2,
+    ):
+        """
+        :param probes: Coroutine functions by dependency name, raising if it is down.
+        :param ttl: Seconds a probe result is reused for.
+        :param timeout: Seconds after which a probe counts as failed.
+        """
+        self.probes = probes
+        self.ttl = ttl
+        self.timeout = timeout
+        self._results: dict[str, dict] = {}
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _probe(self, name: str) -> dict:
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.probes[name](), self.timeout)
+            status = {"status": "ok"}
+        except Exception as e:
+            logger.warning("Health probe of %s failed: %r", name, e)
+            status = {"status": "down", "error": repr(e)}
+        status["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return status
+
+    async def check(self) -> tuple[bool, dict[str, dict]]:
+        """
+        :return: Whether all the dependencies are up, and the result of each probe.
+        """
+        async with self._lock:
+            if time.monotonic() - self._checked_at > self.ttl:
+                names = list(self.probes)
+                results = await asyncio.gather(*(self._probe(name) for name in names))
+                self._results = dict(zip(names, results))
+                self._checked_at = time.monotonic()
+        healthy = all(result["status"] == "ok" for result in self._results.values())
+        return healthy, self._results
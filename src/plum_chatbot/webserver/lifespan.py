@@ -1,12 +1,24 @@
 import logging
-from asyncio import gather
+from asyncio import create_task, gather, to_thread
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
+from plum_chatbot.agents.agents import agents
+from plum_chatbot.agents.tools.context import load_tokenizer
 from plum_chatbot.configs.logger import setup_global_logging
+from plum_chatbot.configs.request_log import request_log
+from plum_chatbot.configs.settings import Settings
+from plum_chatbot.configs.startup import startup_report
+from plum_chatbot.configs.tracing import tracer
+from plum_chatbot.datasources.base_datasource import BaseDatasource
 from plum_chatbot.di_containers.datasources_containers import container
+from plum_chatbot.webserver.metrics import (
+    EventLoopLagMonitor,
+    mark_process_dead,
+    register_datasource_collector,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -22,13 +34,56 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
         logger.info("Starting up the webserver...")
         yield
     except Exception as e:
-        logger.error(f"Error during startup: {e}")
+        logger.error("Error during startup: %s", e)
         raise
     finally:
         await shutdown(app)
         logger.info("Shutting down the webserver...")
 
 
+async def _timed_setup(name: str, datasource: BaseDatasource):
+    with startup_report.measure(f"setup:{name}"):
+        await datasource.setup()
+
+
+async def warm_up(app: FastAPI):
+    """
+    Load the embedding model and the tokenizer and build the agents in the background,
+    so that the server accepts traffic while they are not ready yet.
+    The readiness endpoint reports when this is done.
+    """
+    try:
+        await gather(
+            container.qdrant().await_model(),
+            to_thread(load_tokenizer, Settings().CONTEXT_TOKENIZER_MODEL),
+            agents.awarm_up(),
+        )
+        app.state.ready = True
+        startup_report.log()
+    except Exception as e:
+        logger.error("Error during warm-up: %s", e, exc_info=True)
+
+
+def check_deployment():
+    """
+    Refuse to start several workers with state they would not share: each worker would
+    only know the threads and counters of the requests it served.
+    """
+    settings = Settings()
+    if settings.WORKERS <= 1:
+        return
+    if settings.CHECKPOINTER_BACKEND == "memory":
+        raise ValueError(
+            f"WORKERS={settings.WORKERS} requires CHECKPOINTER_BACKEND=postgres, "
+            "the memory checkpointer is not shared between the workers"
+        )
+    if not container.shared_store().shared:
+        raise ValueError(
+            f"WORKERS={settings.WORKERS} requires a shared store, "
+            "set SHARED_STORE_URL to a sqlite:/// or redis:// URL"
+        )
+
+
 async def setup(app: FastAPI):
     """
     Placeholder for any asynchronous startup tasks.
@@ -37,17 +92,32 @@ async def setup(app: FastAPI):
     # Setup global logging configuration first
     setup_global_logging()
     logger.info("Initializing dependencies...")
+    app.state.ready = False
     try:
+        check_deployment()
         container.init_resources()
 
         # Initialize datasources by calling setup on the singleton instances
         qdrant_datasource = container.qdrant()
         postgres_datasource = container.postgres()
+        checkpoint_datasource = container.checkpointer()
+        shared_store = container.shared_store()
 
-        await gather(qdrant_datasource.setup(), postgres_datasource.setup())
+        await gather(
+            _timed_setup("qdrant", qdrant_datasource),
+            _timed_setup("postgres", postgres_datasource),
+            _timed_setup("shared_store", shared_store),
+        )
+        # The checkpoint sweep joins the chat tables, created by the postgres setup
+        await _timed_setup("checkpointer", checkpoint_datasource)
+        register_datasource_collector()
     except Exception as e:
-        logger.error(f"Error during startup: {e}", exc_info=True)
+        logger.error("Error during startup: %s", e, exc_info=True)
         raise
+    app.state.warm_up = create_task(warm_up(app))
+    app.state.loop_lag = EventLoopLagMonitor(Settings().EVENT_LOOP_LAG_INTERVAL)
+    app.state.loop_lag.start()
+    request_log.start()
     logger.info("All dependencies initialized successfully.")
 
 
@@ -58,13 +128,28 @@ async def shutdown(app: FastAPI):
     """
     logger.info("Cleaning up dependencies...")
     try:
+        if (task := getattr(app.state, "warm_up", None)) is not None:
+            task.cancel()
+        if (loop_lag := getattr(app.state, "loop_lag", None)) is not None:
+            loop_lag.stop()
+
         # Shutdown datasources by calling shutdown on the singleton instances
         qdrant_datasource = container.qdrant()
         postgres_datasource = container.postgres()
+        checkpoint_datasource = container.checkpointer()
+        shared_store = container.shared_store()
 
-        await gather(qdrant_datasource.shutdown(), postgres_datasource.shutdown())
+        await gather(
+            qdrant_datasource.shutdown(),
+            postgres_datasource.shutdown(),
+            checkpoint_datasource.shutdown(),
+            shared_store.shutdown(),
+        )
         container.shutdown_resources()
+        tracer.shutdown()
+        request_log.stop()
+        mark_process_dead()
     except Exception as e:
-        logger.error(f"Error during shutdown: {e}", exc_info=True)
+        logger.error("Error during shutdown: %s", e, exc_info=True)
         raise
     logger.info("All dependencies cleaned up successfully.")
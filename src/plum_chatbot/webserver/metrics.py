@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import os
+import time
+from collections.abc import Iterator
+
+from fastapi import APIRouter, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from plum_chatbot.configs.metrics import (
+    EVENT_LOOP_LAG,
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS,
+    HTTP_REQUESTS_IN_FLIGHT,
+)
+from plum_chatbot.di_containers.datasources_containers import container
+
+router = APIRouter(tags=["metrics"])
+logger = logging.getLogger(__name__)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """
+    Metrics of the webserver, in the Prometheus text format.
+
+    With several workers, `PROMETHEUS_MULTIPROC_DIR` is set by the entrypoint and the
+    metrics of every worker are aggregated from the files they write there. The cache
+    and pool statistics of the DatasourceCollector are per process, and left out.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+
+def mark_process_dead():
+    """
+    Drop the live gauges of this worker from the aggregated metrics, when it exits.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+class PrometheusMiddleware:
+    """
+    ASGI middleware counting and timing the HTTP requests by route template,
+    e.g. `/agent/{agent_id}/invoke`, so that path parameters do not explode the
+    label cardinality. Requests matching no route are labelled `unmatched`.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            # Set by the router on the scope once the request is matched
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUESTS.labels(scope["method"], route, str(status)).inc()
+            HTTP_REQUEST_DURATION.labels(scope["method"], route).observe(
+                time.perf_counter() - start
+            )
+
+
+class DatasourceCollector(Collector):
+    """
+    Collect, at scrape time, the counters the datasources keep for their own stats:
+    the hit rates of the caches and the saturation of the connection pools.
+    """
+
+    def collect(self) -> Iterator[GaugeMetricFamily | CounterMetricFamily]:
+        hits = CounterMetricFamily(
+            "plum_cache_hits",
+            "Cache hits, by cache and tier.",
+            labels=["cache", "tier"],
+        )
+        misses = CounterMetricFamily(
+            "plum_cache_misses", "Cache misses, by cache.", labels=["cache"]
+        )
+        size = GaugeMetricFamily(
+            "plum_cache_entries", "Entries of the caches.", labels=["cache"]
+        )
+        embedding_cache = container.qdrant().embedding_cache.stats()
+        hits.add_metric(["embedding", "memory"], embedding_cache["hits"])
+        hits.add_metric(["embedding", "disk"], embedding_cache["disk_hits"])
+        misses.add_metric(["embedding"], embedding_cache["misses"])
+        size.add_metric(["embedding"], embedding_cache["size"])
+        answer_cache = container.answer_cache().stats()
+        hits.add_metric(["answer", "memory"], answer_cache["hits"])
+        hits.add_metric(["answer", "shared"], answer_cache["shared_hits"])
+        misses.add_metric(["answer"], answer_cache["misses"])
+        size.add_metric(["answer"], answer_cache["size"])
+        size.add_metric(["thread_status"], container.thread_status().stats()["size"])
+        yield from (hits, misses, size)
+
+        connections = GaugeMetricFamily(
+            "plum_db_pool_connections",
+            "Connections of the database pools, by state.",
+            labels=["pool", "state"],
+        )
+        saturation = GaugeMetricFamily(
+            "plum_db_pool_saturation",
+            "Share of the maximum connections of the database pools in use.",
+            labels=["pool"],
+        )
+        pools = {
+            "postgres": _pool_stats(container.postgres()),
+            "checkpointer": _pool_stats(container.checkpointer()),
+        }
+        for pool, stats in pools.items():
+            if stats is None:
+                continue
+            # The waiting requests are only known for the checkpointer pool
+            for state in ("checked_out", "idle", "overflow", "waiting"):
+                if state in stats:
+                    connections.add_metric([pool, state], stats[state])
+            saturation.add_metric(
+                [pool], stats["checked_out"] / stats["max"] if stats["max"] else 0.0
+            )
+        yield from (connections, saturation)
+
+
+def _pool_stats(datasource) -> dict[str, int] | None:
+    try:
+        return datasource.pool_stats()
+    except AttributeError:
+        # Not set up yet: the engine or the pool is created at startup
+        return None
+
+
+class EventLoopLagMonitor:
+    """
+    Measure how late the event loop wakes up a task sleeping for a fixed interval:
+    the time the loop spent blocked by synchronous work.
+    """
+
+    interval: float
+
+    def __init__(self, interval: float = 0.5):
+        """
+        :param interval: Seconds between two measurements.
+        """
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._measure_forever())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _measure_forever(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            EVENT_LOOP_LAG.observe(
+                max(time.perf_counter() - start - self.interval, 0.0)
+            )
+
+
+_datasource_collector: DatasourceCollector | None = None
+
+
+def register_datasource_collector():
+    """
+    Register the collector of the datasource stats, once the datasources are set up:
+    collecting instantiates them, so a scrape must not be the first to do it.
+    """
+    global _datasource_collector
+    if _datasource_collector is None:
+        _datasource_collector = DatasourceCollector()
+        REGISTRY.register(_datasource_collector)
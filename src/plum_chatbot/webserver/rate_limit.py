@@ -0,0 +1,59 @@
+import logging
+import math
+import time
+from typing import Annotated
+
+from fastapi import Depends, HTTPException, Request
+
+from plum_chatbot.configs.settings import Settings
+from plum_chatbot.datasources.shared_store import SharedStore
+from plum_chatbot.di_containers.datasources_containers import get_shared_store
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Fixed-window rate limit of the requests of each client, counted in the shared
+    store so that the limit holds across the workers: a client may send `requests`
+    requests every `window` seconds, and gets a 429 with a `Retry-After` header beyond.
+    Clients are told apart by their address, as resolved by uvicorn from the proxy
+    headers of the trusted proxies (`--forwarded-allow-ips`).
+    """
+
+    requests: int
+    window: float
+
+    def __init__(self, requests: int, window: float = 60):
+        """
+        :param requests: Requests allowed per client and window, 0 to disable the limit.
+        :param window: Length of the window, in seconds.
+        """
+        self.requests = requests
+        self.window = window
+
+    async def __call__(
+        self,
+        request: Request,
+        store: Annotated[SharedStore, Depends(get_shared_store)],
+    ):
+        if self.requests <= 0:
+            return
+        now = time.time()
+        window = int(now // self.window)
+        client = request.client.host if request.client else "unknown"
+        count = await store.incr(f"rate_limit:{client}:{window}", self.window)
+        if count > self.requests:
+            retry_after = max(math.ceil((window + 1) * self.window - now), 1)
+            if count == self.requests + 1:
+                logger.warning(
+                    "Rate limit of %d requests reached by %s", self.requests, client
+                )
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+
+rate_limit = RateLimiter(Settings().RATE_LIMIT_REQUESTS, Settings().RATE_LIMIT_WINDOW)
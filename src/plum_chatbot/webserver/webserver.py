@@ -1,18 +1,40 @@
 import logging
 from typing import Annotated
 
-import uvicorn
-from fastapi import APIRouter, Depends, FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-
-from plum_chatbot.datasources.qdrant_datasource import QdrantDatasource
-from plum_chatbot.di_containers.datasources_containers import get_qdrant_datasource
-
-# from plum_chatbot.ui.main import mount_gradio
-from plum_chatbot.webserver.agent import router as agent_router
-from plum_chatbot.webserver.chat import router as chat_router
-from plum_chatbot.webserver.feedbacks import router as feedback_router
-from plum_chatbot.webserver.lifespan import lifespan
+from plum_chatbot.configs.startup import startup_report
+
+with startup_report.measure("import"):
+    import uvicorn
+    from fastapi import APIRouter, Depends, FastAPI, Request
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse
+
+    from plum_chatbot.agents.agents import agents
+    from plum_chatbot.agents.answer_cache import SemanticAnswerCache
+    from plum_chatbot.agents.thread_status import ThreadStatusRegistry
+    from plum_chatbot.configs.settings import Settings
+    from plum_chatbot.datasources.qdrant_datasource import QdrantDatasource
+    from plum_chatbot.di_containers.datasources_containers import (
+        container,
+        get_answer_cache,
+        get_qdrant_datasource,
+        get_thread_status,
+    )
+
+    # from plum_chatbot.ui.main import mount_gradio
+    from plum_chatbot.webserver.agent import router as agent_router
+    from plum_chatbot.webserver.chat import router as chat_router
+    from plum_chatbot.webserver.correlation import RequestIdMiddleware
+    from plum_chatbot.webserver.dtos.query_dto import (
+        BatchQueryInput,
+        BatchQueryOutput,
+        QueryResult,
+    )
+    from plum_chatbot.webserver.feedbacks import router as feedback_router
+    from plum_chatbot.webserver.health import DependencyHealth
+    from plum_chatbot.webserver.lifespan import lifespan
+    from plum_chatbot.webserver.metrics import PrometheusMiddleware
+    from plum_chatbot.webserver.metrics import router as metrics_router
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +55,21 @@ app.add_middleware(
     allow_methods=["*"],  # Allow all methods (GET, POST, PUT, DELETE, etc.)
     allow_headers=["*"],  # Allow all headers
 )
+settings = Settings()
+app.add_middleware(PrometheusMiddleware)
+app.add_middleware(RequestIdMiddleware, worker_header=settings.WORKERS > 1)
+
+probes = {
+    "qdrant": lambda: container.qdrant().aping(),
+    "postgres": lambda: container.postgres().aping(),
+}
+if settings.SHARED_STORE_URL.partition("://")[0] != "memory":
+    probes["shared_store"] = lambda: container.shared_store().aping()
+dependency_health = DependencyHealth(
+    probes=probes,
+    ttl=settings.HEALTH_CACHE_TTL,
+    timeout=settings.HEALTH_PROBE_TIMEOUT,
+)
 
 router = APIRouter(prefix="/plum_chatbot", tags=["plum_chatbot"])
 
@@ -40,9 +77,72 @@ router = APIRouter(prefix="/plum_chatbot", tags=["plum_chatbot"])
 @router.get("/health")
 async def health_check():
     """
-    Health check endpoint to verify if the server is running.
+    Liveness endpoint: always 200 while the process answers, with the probes of Qdrant
+    and Postgres in the body for information. An unreachable dependency only makes
+    `/ready` fail, so that the process is not restarted for an outage it cannot fix.
+    The probes are cached for a few seconds, so the check stays cheap.
+    """
+    healthy, dependencies = await dependency_health.check()
+    return {"status": "ok" if healthy else "degraded", "dependencies": dependencies}
+
+
+@router.get("/ready")
+async def readiness_check(
+    request: Request,
+    datasource: Annotated[QdrantDatasource, Depends(get_qdrant_datasource)],
+):
+    """
+    Readiness endpoint: the server only answers with 200 once the embedding model
+    is loaded and the agents are built, and while Qdrant and Postgres are reachable,
+    503 otherwise.
+    """
+    healthy, dependencies = await dependency_health.check()
+    components = {
+        "embedding_model": datasource.model_ready,
+        "agents": {key: agents.is_built(key) for key in agents.keys()},
+        "dependencies": dependencies,
+    }
+    ready = getattr(request.app.state, "ready", False) and healthy
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "starting", "components": components},
+    )
+
+
+@router.get("/startup")
+async def startup_times():
+    """
+    Durations of the startup phases, in seconds.
     """
-    return {"status": "ok"}
+    return startup_report.as_dict()
+
+
+@router.get("/stats")
+async def cache_stats(
+    datasource: Annotated[QdrantDatasource, Depends(get_qdrant_datasource)],
+    answer_cache: Annotated[SemanticAnswerCache, Depends(get_answer_cache)],
+    thread_status: Annotated[ThreadStatusRegistry, Depends(get_thread_status)],
+):
+    """
+    Counters of the embedding cache, the encode batcher, the answer cache, the thread
+    status registry and the history compaction of each built agent.
+    """
+    return {
+        "embedding_cache": datasource.embedding_cache.stats(),
+        "encode_batcher": (
+            datasource.encode_batcher.stats()
+            if datasource.encode_batcher is not None
+            else None
+        ),
+        "answer_cache": answer_cache.stats(),
+        "thread_status": thread_status.stats(),
+        "history": {
+            key: history.metrics.as_dict()
+            for key in agents.keys()
+            if agents.is_built(key)
+            and (history := getattr(agents.get(key), "history", None)) is not None
+        },
+    }
 
 
 @router.get("/query")
@@ -55,14 +155,34 @@ async def get_query(
     """
     return {
         "query": query,
-        "results": datasource.query(query=query),
+        "results": await datasource.aquery(query=query),
     }
 
 
+@router.post("/query/batch")
+async def post_query_batch(
+    datasource: Annotated[QdrantDatasource, Depends(get_qdrant_datasource)],
+    batch_input: BatchQueryInput,
+) -> BatchQueryOutput:
+    """
+    Endpoint to run several queries with one embedding pass and one Qdrant round trip.
+    """
+    results = await datasource.aquery_batch(
+        queries=batch_input.queries, limit=batch_input.limit
+    )
+    return BatchQueryOutput(
+        results=[
+            QueryResult(query=query, results=docs)
+            for query, docs in zip(batch_input.queries, results)
+        ]
+    )
+
+
 app.include_router(router)
 app.include_router(agent_router)
 app.include_router(chat_router)
 app.include_router(feedback_router)
+app.include_router(metrics_router)
 
 # app = mount_gradio(app)
 
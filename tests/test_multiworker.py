@@ -0,0 +1,67 @@
+"""
+Two webserver workers serving the turns of the same chats, as checked by
+`api_tester/multiworker.py`. Needs Postgres, for the chats and the checkpointer:
+skipped when it is not reachable.
+"""
+
+import asyncio
+
+import psycopg
+import pytest
+from loadtest import DEFAULT_QUESTIONS, load_questions
+from multiworker import ROOT, MultiWorkerCheck, free_port, start_server, wait_ready
+
+from plum_chatbot.configs.settings import Settings
+
+
+def postgres_reachable(url: str) -> bool:
+    try:
+        with psycopg.connect(url, connect_timeout=2):
+            return True
+    except psycopg.Error:
+        return False
+
+
+@pytest.fixture
+def offline_env(monkeypatch: pytest.MonkeyPatch, tmp_path):
+    """
+    The environment of the webserver started: the stub model, the hashing encoder and
+    the in-process vector store, with the state shared through Postgres and SQLite.
+    """
+    environment = {
+        "CHECKPOINTER_BACKEND": "postgres",
+        "SHARED_STORE_URL": f"sqlite:///{tmp_path / 'shared_state.db'}",
+        "FAQ_AGENT_MODEL": "stub",
+        "HISTORY_SUMMARY_MODEL": "stub",
+        "ENCODER_BACKEND": "hash",
+        "VECTOR_BACKEND": "memory",
+        "VECTOR_SEED_DIR": str(ROOT / "data" / "extractions"),
+    }
+    for name, value in environment.items():
+        monkeypatch.setenv(name, value)
+
+
+@pytest.mark.skipif(
+    not postgres_reachable(Settings().CHECKPOINTER_POSTGRES_URL),
+    reason="Postgres is not reachable",
+)
+def test_chats_across_two_workers(offline_env):
+    port = free_port()
+    server = start_server(workers=2, port=port)
+    base_url = f"http://127.0.0.1:{port}/api"
+    try:
+        asyncio.run(wait_ready(base_url, timeout=180, server=server))
+        check = MultiWorkerCheck(
+            base_url=base_url,
+            questions=load_questions(DEFAULT_QUESTIONS),
+            chats=4,
+            turns=6,
+            agent=None,
+            timeout=120,
+        )
+        assert asyncio.run(check.run(Settings().CHECKPOINTER_POSTGRES_URL)), (
+            check.failures
+        )
+    finally:
+        server.terminate()
+        server.wait(timeout=30)